@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for hot helpers on the request path
+
+Covers AnthropicService._sanitize_html, split_long_message,
+RateLimiterService, MetricsService.track_event, the /stats rendering
+over `--months` of history and the caller-side cost of a log call. JSON-backed services run
+against a temporary data directory pre-filled with `--users` users.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Callable
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+
+from loguru import logger
+
+from handlers.stats import create_months_keyboard, get_stats_message
+
+from models.metrics import MetricsEvent
+from services.anthropic import AnthropicService
+from services.logs import setup_logging, stop_logging
+from services.metrics import MetricsService
+from services.rate_limiter import RateLimiterService
+from utils.telegram_formatting import split_long_message
+
+SENTENCE = "Это <b>предложение</b> из <i>длинной</i> транскрипции & <u>голосового</u> сообщения. "
+
+
+def bench(label: str, func: Callable[[int], object], number: int, repeat: int = 5) -> None:
+    """Report the best per-call time over `repeat` runs of `number` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for i in range(number):
+            func(i)
+        best = min(best, (time.perf_counter() - started) / number)
+    print(f"{label:<40} {best * 1e6:>12.1f} µs/call")
+
+
+def main(users: int, months: int) -> None:
+    # Debug logging in the services would dominate the measurements
+    logger.remove()
+
+    anthropic_service = AnthropicService(api_key="bench")
+    for size in (1_000, 10_000, 100_000):
+        text = (SENTENCE * (size // len(SENTENCE) + 1))[:size]
+        bench(f"_sanitize_html {size:,} chars", lambda _, t=text: anthropic_service._sanitize_html(t), 20)
+
+    for size in (10_000, 100_000, 1_000_000):
+        text = "\n\n".join([SENTENCE * 12] * (size // (len(SENTENCE) * 12) + 1))[:size]
+        bench(f"split_long_message {size:,} chars", lambda _, t=text: split_long_message(t), 5)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        limiter = RateLimiterService(data_dir=data_dir, max_requests_per_hour=10 ** 9)
+        for user in range(users):
+            limiter.record_request(str(user))
+        bench(f"rate limiter check ({users} users)", lambda i: limiter.can_make_request(str(i % users)), 200)
+        bench(f"rate limiter record ({users} users)", lambda i: limiter.record_request(str(i % users)), 200)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        metrics = MetricsService(data_dir=data_dir)
+        for user in range(users):
+            metrics.track_event(MetricsEvent(user_id=str(user), event_type="transcription"))
+        bench(
+            f"metrics track_event ({users} users)",
+            lambda i: metrics.track_event(MetricsEvent(user_id=str(i % users), event_type="llm_call", event_subtype="brief")),
+            200,
+        )
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        metrics = MetricsService(data_dir=data_dir)
+        for month in range(months):
+            timestamp = datetime(2020 + month // 12, month % 12 + 1, 1)
+            for user in range(0, users, 10):
+                metrics.track_event(MetricsEvent(user_id=str(user), event_type="transcription", timestamp=timestamp))
+        bench(f"/stats keyboard ({months} months)", lambda _: create_months_keyboard(metrics), 200)
+        bench(f"/stats all-time message ({months} months)", lambda _: get_stats_message(metrics, "all"), 200)
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        # The previous setup: a synchronous loguru file sink
+        logger.add(os.path.join(log_dir, "sync.log"), rotation="1 day")
+        bench("log info, sync file sink", lambda i: logger.info("Processing {} message", i), 2000)
+        logger.remove()
+
+        setup_logging(log_file=os.path.join(log_dir, "bot.log"), console=False)
+        bench("log info, background JSON sink", lambda i: logger.info("Processing {} message", i), 2000)
+        bench("log debug, below LOG_LEVEL", lambda i: logger.debug("Chunk {}", i), 2000)
+        setup_logging(level="DEBUG", log_file=os.path.join(log_dir, "bot.log"), console=False, debug_per_second=10)
+        bench("log debug, sampled out", lambda i: logger.debug("Chunk {}", i), 2000)
+        logger.remove()
+        stop_logging()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for hot helpers")
+    parser.add_argument("--users", type=int, default=1000, help="users pre-filled into JSON-backed services")
+    parser.add_argument("--months", type=int, default=36, help="months of metrics history for /stats")
+    args = parser.parse_args()
+    print("🧪 Micro-benchmarks")
+    main(args.users, args.months)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Update-processing throughput with and without the performance runtime
+
+Feeds `--updates` raw getUpdates payloads through an aiogram Dispatcher
+(decode, validate, dispatch to a no-op voice handler, `--concurrency` at a
+time as polling does), then decodes a Deepgram response of `--words` words
+and round-trips a state file. Runs every available combination of event
+loop (asyncio, uvloop) and JSON codec (json, orjson); "uvloop + orjson" is
+what PERFORMANCE_RUNTIME=true installs.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Callable, List
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import Message, Update
+
+from utils import json_codec
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+def voice_update(update_id: int) -> dict:
+    user = {"id": 10_000 + update_id % 500, "is_bot": False, "first_name": "Пользователь", "language_code": "ru"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1_700_000_000,
+            "chat": {"id": user["id"], "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "voice": {
+                "file_id": f"AwACAgIAAxkBAAI{update_id:012d}",
+                "file_unique_id": f"AgAD{update_id:08d}",
+                "duration": 42,
+                "mime_type": "audio/ogg",
+                "file_size": 123_456,
+            },
+        },
+    }
+
+
+def deepgram_response(words: int) -> dict:
+    return {"results": {"channels": [{"alternatives": [{
+        "transcript": " ".join("слово" for _ in range(words)),
+        "confidence": 0.97,
+        "words": [
+            {"word": "слово", "start": i * 0.4, "end": i * 0.4 + 0.3, "confidence": 0.97, "speaker": 0}
+            for i in range(words)
+        ],
+    }]}]}}
+
+
+async def feed_updates(raw_batches: List[str], concurrency: int) -> float:
+    """Seconds to decode and dispatch every update in `raw_batches` (getUpdates response bodies)."""
+    router = Router()
+
+    @router.message(F.voice)
+    async def handle_voice(message: Message) -> None:
+        await asyncio.sleep(0)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot("123456:bench-token")
+    started = time.perf_counter()
+    for raw in raw_batches:
+        updates = [Update.model_validate(update, context={"bot": bot}) for update in json_codec.loads(raw)["result"]]
+        for offset in range(0, len(updates), concurrency):
+            await asyncio.gather(*(dp.feed_update(bot, update) for update in updates[offset:offset + concurrency]))
+    elapsed = time.perf_counter() - started
+    await bot.session.close()
+    return elapsed
+
+
+def best_of(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(updates: int, concurrency: int, words: int, repeat: int) -> None:
+    # Built once with the json module so every codec decodes the same bytes
+    json_codec.use_orjson(False)
+    raw_batches = [
+        json_codec.dumps({"ok": True, "result": [voice_update(i) for i in range(start, min(start + 100, updates))]})
+        for start in range(0, updates, 100)
+    ]
+    response = json_codec.dumps(deepgram_response(words))
+    state = {f"2024-{month:02d}": {"unique_users": list(range(1000)), "llm_calls": {"brief": month}} for month in range(1, 13)}
+
+    loops = [("asyncio", None)] + ([("uvloop", uvloop.EventLoopPolicy)] if uvloop else [])
+    codecs = ["json"] + (["orjson"] if json_codec.orjson is not None else [])
+    missing = [name for name, module in (("uvloop", uvloop), ("orjson", json_codec.orjson)) if module is None]
+    if missing:
+        print(f"Not installed, skipped: {', '.join(missing)} (pip install -r requirements-perf.txt)")
+
+    # Warm up aiogram's caches so the first row is not penalized
+    asyncio.run(feed_updates(raw_batches[:1], concurrency))
+
+    print(f"{'runtime':<18}{'updates/s':>12}{'deepgram ms':>13}{'state file ms':>15}")
+    for loop_name, policy in loops:
+        for codec in codecs:
+            asyncio.set_event_loop_policy(policy() if policy else None)
+            json_codec.use_orjson(codec == "orjson")
+            elapsed = min(asyncio.run(feed_updates(raw_batches, concurrency)) for _ in range(repeat))
+            decode = best_of(lambda: json_codec.loads(response), repeat)
+            round_trip = best_of(lambda: json_codec.loads(json_codec.dumps(state, indent=True)), repeat)
+            print(f"{loop_name + ' + ' + codec:<18}{updates / elapsed:>12.0f}{decode * 1000:>13.2f}{round_trip * 1000:>15.2f}")
+    asyncio.set_event_loop_policy(None)
+    json_codec.use_orjson(False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update-processing throughput with and without the performance runtime")
+    parser.add_argument("--updates", type=int, default=5000, help="voice updates fed through the dispatcher")
+    parser.add_argument("--concurrency", type=int, default=100, help="updates handled at once")
+    parser.add_argument("--words", type=int, default=5000, help="words in the Deepgram response")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.updates, args.concurrency, args.words, args.repeat)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Upload size, audio duration and latency saved by silence trimming
+
+Runs SilenceTrimmer over a corpus and reports, per file and in total, the
+audio seconds and bytes before and after trimming and the time trimming
+took. End-to-end latency is estimated from a simple model of the upload
+(bytes over `--uplink-mbps`) and of Deepgram (`--deepgram-base` seconds plus
+`--deepgram-rtf` seconds per audio second), since both scale with what is
+sent; the trimming time is added to the trimmed side.
+
+The corpus is `--corpus DIR` (any media ffmpeg reads, e.g. exported voice
+notes) or, by default, synthetic voice notes: harmonic "syllables" in
+phrases separated by short and long pauses, with dead air at both ends and
+a -60 dBFS noise floor, encoded as Opus like Telegram does.
+
+Needs NumPy and ffmpeg (requirements-audio.txt); `--ffmpeg` points at a
+binary outside PATH.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+from typing import List
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.silence import SAMPLE_RATE, SilenceTrimmer, np
+
+
+def syllable(rng, seconds: float) -> "np.ndarray":
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = rng.uniform(110, 220)
+    voice = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 12))
+    return (voice * np.hanning(len(t)) * 0.1).astype(np.float32)
+
+
+def synthetic_clip(rng) -> "np.ndarray":
+    parts = [np.zeros(int(rng.uniform(0.5, 3) * SAMPLE_RATE), dtype=np.float32)]
+    for _ in range(rng.integers(3, 10)):
+        for _ in range(rng.integers(4, 16)):
+            parts.append(syllable(rng, rng.uniform(0.12, 0.3)))
+            parts.append(np.zeros(int(rng.uniform(0.02, 0.08) * SAMPLE_RATE), dtype=np.float32))
+        long_pause = rng.random() < 0.35
+        pause = rng.uniform(1.5, 5) if long_pause else rng.uniform(0.2, 0.6)
+        parts.append(np.zeros(int(pause * SAMPLE_RATE), dtype=np.float32))
+    parts.append(np.zeros(int(rng.uniform(0.5, 3) * SAMPLE_RATE), dtype=np.float32))
+    audio = np.concatenate(parts)
+    return audio + rng.normal(0, 10 ** (-60 / 20), len(audio)).astype(np.float32)
+
+
+def build_corpus(directory: Path, clips: int, ffmpeg: str) -> List[Path]:
+    rng = np.random.default_rng(7)
+    paths = []
+    for index in range(clips):
+        wav_path = directory / f"clip{index:03d}.wav"
+        with wave.open(str(wav_path), "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(SAMPLE_RATE)
+            wav.writeframes((np.clip(synthetic_clip(rng), -1, 1) * 32767).astype("<i2").tobytes())
+        path = directory / f"clip{index:03d}.oga"
+        subprocess.run(
+            [ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-y", "-i", str(wav_path),
+             "-c:a", "libopus", "-b:a", "32k", str(path)],
+            check=True,
+        )
+        wav_path.unlink()
+        paths.append(path)
+    return paths
+
+
+def duration_of(path: Path, ffmpeg: str) -> float:
+    """Audio seconds, by decoding (ffprobe may not be installed next to ffmpeg)."""
+    pcm = subprocess.run(
+        [ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-i", str(path), "-vn", "-ac", "1",
+         "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1"],
+        check=True, capture_output=True,
+    ).stdout
+    return len(pcm) / 2 / SAMPLE_RATE
+
+
+async def measure(paths: List[Path], trimmer: SilenceTrimmer, args: argparse.Namespace) -> None:
+    def latency(size: int, seconds: float) -> float:
+        return size * 8 / (args.uplink_mbps * 1e6) + args.deepgram_base + seconds * args.deepgram_rtf
+
+    totals = np.zeros(6)
+    print(f"{'file':<16}{'audio s':>9}{'trimmed s':>11}{'KB':>8}{'trimmed KB':>12}{'trim ms':>9}{'e2e s':>8}{'trimmed e2e s':>15}")
+    for path in paths:
+        seconds = duration_of(path, args.ffmpeg)
+        size = path.stat().st_size
+        started = time.perf_counter()
+        trimmed = await trimmer.trim(path, "voice")
+        trim_time = time.perf_counter() - started
+        if trimmed is None:
+            new_seconds, new_size = seconds, size
+        else:
+            spool, time_map = trimmed
+            new_seconds, new_size = time_map.duration, spool.size
+            spool.close()
+        before = latency(size, seconds)
+        after = latency(new_size, new_seconds) + trim_time
+        totals += (seconds, new_seconds, size, new_size, before, after)
+        print(
+            f"{path.name[:15]:<16}{seconds:>9.1f}{new_seconds:>11.1f}{size / 1024:>8.1f}{new_size / 1024:>12.1f}"
+            f"{trim_time * 1000:>9.0f}{before:>8.2f}{after:>15.2f}"
+        )
+
+    seconds, new_seconds, size, new_size, before, after = totals
+    print()
+    print(f"Audio sent to Deepgram: {seconds:.0f} s -> {new_seconds:.0f} s ({1 - new_seconds / seconds:.0%} less)")
+    print(f"Bytes uploaded: {size / 1024:.0f} KB -> {new_size / 1024:.0f} KB ({1 - new_size / size:.0%} less)")
+    print(f"Estimated end-to-end: {before:.1f} s -> {after:.1f} s ({1 - after / before:.0%} less, trimming included)")
+
+
+def main(args: argparse.Namespace) -> None:
+    if np is None:
+        sys.exit("NumPy is not installed (pip install -r requirements-audio.txt)")
+    trimmer = SilenceTrimmer(
+        ffmpeg=args.ffmpeg, margin_db=args.margin_db, max_pause=args.max_pause_ms / 1000, min_saved_seconds=0,
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        if args.corpus:
+            paths = sorted(path for path in Path(args.corpus).iterdir() if path.is_file())
+        else:
+            paths = build_corpus(Path(directory), args.clips, trimmer.ffmpeg)
+        asyncio.run(measure(paths, trimmer, args))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload size, audio duration and latency saved by silence trimming")
+    parser.add_argument("--corpus", help="directory of media files; synthetic voice notes when omitted")
+    parser.add_argument("--clips", type=int, default=20, help="synthetic voice notes to generate")
+    parser.add_argument("--ffmpeg", default=os.getenv("FFMPEG_BINARY", "ffmpeg"))
+    parser.add_argument("--margin-db", type=float, default=10.0)
+    parser.add_argument("--max-pause-ms", type=int, default=700)
+    parser.add_argument("--uplink-mbps", type=float, default=10.0, help="upload bandwidth to Deepgram")
+    parser.add_argument("--deepgram-base", type=float, default=0.3, help="seconds Deepgram takes for any file")
+    parser.add_argument("--deepgram-rtf", type=float, default=0.03, help="Deepgram seconds per audio second")
+    main(parser.parse_args())
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Benchmark for split_long_message on long transcripts
+"""
+
+import os
+import sys
+import time
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.telegram_formatting import split_long_message
+
+SENTENCE = "Это предложение из длинной транскрипции голосового сообщения. "
+
+
+def make_transcript(size: int, markup: bool = False) -> str:
+    paragraph = SENTENCE * 12
+    if markup:
+        paragraph = f"<b>{paragraph}</b> &amp; 🎙️ "
+    text = "\n\n".join([paragraph.strip()] * (size // len(paragraph) + 1))
+    return text[:size]
+
+
+def bench(label: str, text: str, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parts = split_long_message(text)
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<28} {len(text):>10,} chars  {len(parts):>5} parts  {best * 1000:8.2f} ms")
+    return best
+
+
+if __name__ == "__main__":
+    print("🧪 split_long_message benchmark")
+    times = {size: bench("plain transcript", make_transcript(size)) for size in (10_000, 100_000, 500_000, 1_000_000)}
+    for size in (100_000, 1_000_000):
+        bench("html + emoji transcript", make_transcript(size, markup=True))
+    # Linear splitting costs about 10x for 10x the input; quadratic would be about 100x
+    print(f"1,000,000 / 100,000 chars time ratio: {times[1_000_000] / times[100_000]:.1f}x")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: time from process spawn to the first getUpdates
+
+Runs main.py as a subprocess against benchmarks/fake_servers.py and polls
+the fake Telegram until it has received a getUpdates request.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aiohttp
+
+from benchmarks.load_test import free_port, percentile, wait_for_port
+
+
+async def first_get_updates(session: aiohttp.ClientSession, base_url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        async with session.get(f"{base_url}/_control/config") as response:
+            requests = (await response.json())["requests"]
+        if requests.get("telegram.getUpdates"):
+            return
+        await asyncio.sleep(0.01)
+    raise RuntimeError("bot did not start polling")
+
+
+async def run(runs: int) -> None:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(
+        os.environ,
+        BOT_TOKEN="123456:bench-token",
+        DEEPGRAM_API_KEY="bench",
+        ANTHROPIC_API_KEY="bench",
+        TELEGRAM_API_BASE=base_url,
+        DEEPGRAM_BASE_URL=f"{base_url}/v1/listen",
+        ANTHROPIC_BASE_URL=base_url,
+        METRICS_PORT="0",
+        PYTHONPATH=ROOT,
+    )
+    timings = []
+    async with aiohttp.ClientSession() as session:
+        for _ in range(runs):
+            # A fresh fake per run so request counters start from zero
+            fake = subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, "benchmarks", "fake_servers.py"), "--port", str(port)],
+                stdout=subprocess.DEVNULL,
+            )
+            with tempfile.TemporaryDirectory(prefix="d-buddy-startup-") as workdir:
+                try:
+                    await wait_for_port(port)
+                    started = time.perf_counter()
+                    bot = subprocess.Popen(
+                        [sys.executable, os.path.join(ROOT, "main.py")],
+                        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                    )
+                    try:
+                        await first_get_updates(session, base_url)
+                        timings.append(time.perf_counter() - started)
+                    finally:
+                        bot.terminate()
+                        bot.wait()
+                finally:
+                    fake.terminate()
+                    fake.wait()
+            print(f"run {len(timings)}: {timings[-1] * 1000:.0f} ms")
+
+    print(f"\n🧪 Cold start to first getUpdates over {runs} runs: "
+          f"p50 {percentile(timings, 0.5) * 1000:.0f} ms, min {min(timings) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    asyncio.run(run(parser.parse_args().runs))
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the Telegram Bot API, Deepgram and Anthropic
+
+All three live on one aiohttp app since their paths do not overlap:
+
+    /bot{token}/{method}          Telegram Bot API methods
+    /file/bot{token}/{path}       Telegram file downloads
+    /v1/listen                    Deepgram prerecorded transcription
+    /v1/messages                  Anthropic Messages API
+
+The load generator drives the fake Telegram through a small control API:
+
+    POST /_control/updates        enqueue updates for getUpdates
+    GET  /_control/sent           long-poll messages the bot sent to a chat
+    POST /_control/config         change latency, payload size or error rates
+
+Run it standalone with `python benchmarks/fake_servers.py --port 8081`.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List
+
+from aiohttp import web
+
+WORD = "слово"
+
+
+@dataclass
+class FakeConfig:
+    telegram_latency: float = 0.005
+    deepgram_latency: float = 0.3
+    # Extra Deepgram time per MB uploaded, to mimic longer audio
+    deepgram_seconds_per_mb: float = 0.5
+    anthropic_latency: float = 0.8
+    payload_kb: int = 256
+    transcript_words: int = 120
+    deepgram_error_rate: float = 0.0
+    anthropic_error_rate: float = 0.0
+    telegram_429_rate: float = 0.0
+    # Act as a local Bot API server: store media here and return absolute paths from getFile
+    local_files_dir: str = ""
+
+
+class FakeUpstreams:
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.updates: List[Dict[str, Any]] = []
+        self.updates_changed = asyncio.Condition()
+        self.sent: Dict[int, List[Dict[str, Any]]] = {}
+        self.sent_changed = asyncio.Condition()
+        self.message_id = 1000
+        self.requests: Dict[str, int] = {}
+        self._payload = b""
+
+    # --- helpers -----------------------------------------------------------
+
+    def payload(self) -> bytes:
+        size = self.config.payload_kb * 1024
+        if len(self._payload) != size:
+            self._payload = random.randbytes(size)
+        return self._payload
+
+    def count(self, name: str) -> None:
+        self.requests[name] = self.requests.get(name, 0) + 1
+
+    @staticmethod
+    def ok(result: Any) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    def transcript(self) -> str:
+        sentence = " ".join([WORD] * 11) + ". "
+        sentences = max(1, self.config.transcript_words // 12)
+        return (sentence * sentences).strip()
+
+    # --- Telegram ----------------------------------------------------------
+
+    async def telegram(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.count(f"telegram.{method}")
+        params = dict(await request.post())
+        if self.config.telegram_latency:
+            await asyncio.sleep(self.config.telegram_latency)
+
+        if method == "getUpdates":
+            return self.ok(await self._get_updates(params))
+        if method == "getMe":
+            return self.ok({"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"})
+        if method == "getFile":
+            file_id = params.get("file_id", "file")
+            file_path = f"media/{file_id}.oga"
+            if self.config.local_files_dir:
+                local_path = Path(self.config.local_files_dir).resolve() / file_path
+                local_path.parent.mkdir(parents=True, exist_ok=True)
+                local_path.write_bytes(self.payload())
+                file_path = str(local_path)
+            return self.ok({
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "file_size": self.config.payload_kb * 1024,
+                "file_path": file_path,
+            })
+        if method in ("sendMessage", "editMessageText"):
+            if random.random() < self.config.telegram_429_rate:
+                return web.json_response(
+                    {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                     "parameters": {"retry_after": 1}},
+                    status=429,
+                )
+            return self.ok(await self._record_sent(method, params))
+        # sendChatAction, answerCallbackQuery, deleteWebhook, ...
+        return self.ok(True)
+
+    async def _get_updates(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        async with self.updates_changed:
+            self.updates = [update for update in self.updates if update["update_id"] >= offset]
+            if not self.updates and timeout:
+                try:
+                    await asyncio.wait_for(self.updates_changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            return self.updates[:100]
+
+    async def _record_sent(self, method: str, params: Dict[str, str]) -> Dict[str, Any]:
+        chat_id = int(params["chat_id"])
+        self.message_id += 1
+        message = {
+            "message_id": int(params.get("message_id") or self.message_id),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "Bench"},
+            "text": params.get("text", ""),
+        }
+        async with self.sent_changed:
+            self.sent.setdefault(chat_id, []).append({
+                "method": method,
+                "message_id": message["message_id"],
+                "text": message["text"],
+                "has_keyboard": "reply_markup" in params,
+                "at": time.time(),
+            })
+            self.sent_changed.notify_all()
+        return message
+
+    async def telegram_file(self, request: web.Request) -> web.StreamResponse:
+        self.count("telegram.file")
+        if self.config.telegram_latency:
+            await asyncio.sleep(self.config.telegram_latency)
+        return web.Response(body=self.payload(), content_type="audio/ogg")
+
+    # --- Deepgram ----------------------------------------------------------
+
+    async def deepgram(self, request: web.Request) -> web.Response:
+        self.count("deepgram.listen")
+        size = 0
+        async for chunk in request.content.iter_chunked(64 * 1024):
+            size += len(chunk)
+        await asyncio.sleep(self.config.deepgram_latency + size / 1_048_576 * self.config.deepgram_seconds_per_mb)
+        if random.random() < self.config.deepgram_error_rate:
+            return web.json_response({"err_code": "INTERNAL", "err_msg": "injected failure"}, status=503)
+
+        text = self.transcript()
+        words = [
+            {"word": WORD, "start": i * 0.4, "end": i * 0.4 + 0.3, "confidence": 0.98, "punctuated_word": word}
+            for i, word in enumerate(text.split())
+        ]
+        return web.json_response({
+            "metadata": {"duration": len(words) * 0.4},
+            "results": {"channels": [{"alternatives": [{
+                "transcript": text,
+                "confidence": 0.98,
+                "words": words,
+                "paragraphs": {"transcript": text, "paragraphs": [{
+                    "sentences": [{"text": text, "start": 0.0, "end": len(words) * 0.4}],
+                    "start": 0.0,
+                    "end": len(words) * 0.4,
+                    "num_words": len(words),
+                }]},
+            }]}]},
+        })
+
+    # --- Anthropic ---------------------------------------------------------
+
+    async def anthropic(self, request: web.Request) -> web.Response:
+        self.count("anthropic.messages")
+        body = await request.json()
+        await asyncio.sleep(self.config.anthropic_latency)
+        if random.random() < self.config.anthropic_error_rate:
+            return web.json_response(
+                {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}},
+                status=529,
+            )
+        prompt = "".join(
+            block.get("text", "") if isinstance(block, dict) else str(block)
+            for message in body.get("messages", [])
+            for block in (message["content"] if isinstance(message["content"], list) else [{"text": message["content"]}])
+        )
+        return web.json_response({
+            "id": f"msg_{random.getrandbits(48):012x}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "fake"),
+            "content": [{"type": "text", "text": self.transcript()}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": len(prompt) // 3 + 1,
+                "output_tokens": self.config.transcript_words * 2,
+                "cache_creation_input_tokens": 0,
+                "cache_read_input_tokens": 0,
+            },
+        })
+
+    # --- control API -------------------------------------------------------
+
+    async def control_updates(self, request: web.Request) -> web.Response:
+        updates = await request.json()
+        async with self.updates_changed:
+            self.updates.extend(updates)
+            self.updates_changed.notify_all()
+        return web.json_response({"queued": len(updates)})
+
+    async def control_sent(self, request: web.Request) -> web.Response:
+        chat_id = int(request.query["chat_id"])
+        after = int(request.query.get("after", 0))
+        timeout = float(request.query.get("timeout", 30))
+        deadline = time.monotonic() + timeout
+        async with self.sent_changed:
+            while len(self.sent.get(chat_id, [])) <= after:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self.sent_changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            return web.json_response(self.sent.get(chat_id, [])[after:])
+
+    async def control_config(self, request: web.Request) -> web.Response:
+        if request.method == "POST":
+            for key, value in (await request.json()).items():
+                if hasattr(self.config, key):
+                    setattr(self.config, key, type(getattr(self.config, key))(value))
+        return web.json_response({"config": asdict(self.config), "requests": self.requests})
+
+
+def create_app(config: FakeConfig | None = None) -> web.Application:
+    upstreams = FakeUpstreams(config or FakeConfig())
+    app = web.Application(client_max_size=1024 ** 3)
+    app["upstreams"] = upstreams
+    app.router.add_post("/bot{token}/{method}", upstreams.telegram)
+    app.router.add_get("/file/bot{token}/{path:.+}", upstreams.telegram_file)
+    app.router.add_post("/v1/listen", upstreams.deepgram)
+    app.router.add_post("/v1/messages", upstreams.anthropic)
+    app.router.add_post("/_control/updates", upstreams.control_updates)
+    app.router.add_get("/_control/sent", upstreams.control_sent)
+    app.router.add_route("*", "/_control/config", upstreams.control_config)
+    return app
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake Telegram, Deepgram and Anthropic servers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    defaults = FakeConfig()
+    for field, value in asdict(defaults).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(value), default=value)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    fake_config = FakeConfig(**{field: getattr(args, field) for field in asdict(FakeConfig())})
+    print(f"🧪 Fake upstreams on http://{args.host}:{args.port} {json.dumps(asdict(fake_config))}", flush=True)
+    web.run_app(create_app(fake_config), host=args.host, port=args.port, print=None)
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test against local fake upstreams
+
+Starts benchmarks/fake_servers.py in a child process, points the real bot
+(dispatcher, handlers, services) at it through TELEGRAM_API_BASE,
+DEEPGRAM_BASE_URL and ANTHROPIC_BASE_URL, and simulates users sending voice
+and video messages and pressing style buttons. Reports throughput, latency
+percentiles, peak RSS and event-loop lag of the bot process. With
+--log-level the bot keeps its production logging (file sink only) and the
+time the event loop spends inside log calls is reported too. Compare runs
+with and without --performance for the effect of the performance runtime.
+
+Example:
+    python benchmarks/load_test.py --users 50 --jobs-per-user 4 --payload-kb 1024
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import math
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aiohttp
+
+from benchmarks.fake_servers import FakeConfig, parse_args as parse_fake_args
+from utils.runtime import setup_runtime
+
+STYLES = ["proofread", "my", "business", "brief"]
+ERROR_PREFIX = "❌"
+
+
+@dataclass
+class Results:
+    transcription: List[float] = field(default_factory=list)
+    style: List[float] = field(default_factory=list)
+    errors: Dict[str, int] = field(default_factory=dict)
+    loop_lag: List[float] = field(default_factory=list)
+    log_calls: int = 0
+    log_seconds: float = 0.0
+
+    def error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+def percentile(values: List[float], quantile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered), max(1, math.ceil(quantile * len(ordered)))) - 1]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LoadGenerator:
+    def __init__(self, control_url: str, results: Results, timeout: float, file_size: int):
+        self.control_url = control_url
+        self.file_size = file_size
+        self.results = results
+        self.timeout = timeout
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "LoadGenerator":
+        self.session = aiohttp.ClientSession()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.session.close()
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    def _media_update(self, user_id: int, media_type: str) -> dict:
+        file_id = f"{media_type}_{user_id}_{next(self.message_ids)}"
+        media = {"file_id": file_id, "file_unique_id": file_id, "duration": 30, "file_size": self.file_size}
+        if media_type == "video":
+            media.update(width=640, height=360)
+        return {"update_id": next(self.update_ids), "message": {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            media_type: media,
+        }}
+
+    def _style_update(self, user_id: int, sent: dict, style: str) -> dict:
+        return {"update_id": next(self.update_ids), "callback_query": {
+            "id": str(next(self.message_ids)),
+            "from": self._user(user_id),
+            "chat_instance": str(user_id),
+            "data": f"style_{style}",
+            "message": {
+                "message_id": sent["message_id"],
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": sent["text"],
+            },
+        }}
+
+    async def _push(self, update: dict) -> None:
+        async with self.session.post(f"{self.control_url}/updates", json=[update]) as response:
+            response.raise_for_status()
+
+    async def _wait(self, chat_id: int, seen: int, done) -> tuple[Optional[dict], int]:
+        """Long-poll sent messages until `done(message)` is true for one of them."""
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            params = {"chat_id": chat_id, "after": seen, "timeout": deadline - time.monotonic()}
+            async with self.session.get(f"{self.control_url}/sent", params=params) as response:
+                messages = await response.json()
+            for message in messages:
+                seen += 1
+                if done(message):
+                    return message, seen
+        return None, seen
+
+    async def user(self, user_id: int, jobs: int, video_share: float, style_share: float, think_time: float) -> None:
+        seen = 0
+        for _ in range(jobs):
+            media_type = "video" if random.random() < video_share else "voice"
+            started = time.perf_counter()
+            await self._push(self._media_update(user_id, media_type))
+            transcript, seen = await self._wait(
+                user_id, seen, lambda m: m["has_keyboard"] or m["text"].startswith(ERROR_PREFIX)
+            )
+            if transcript is None:
+                self.results.error("transcription_timeout")
+                continue
+            if transcript["text"].startswith(ERROR_PREFIX):
+                self.results.error("transcription_failed")
+                continue
+            self.results.transcription.append(time.perf_counter() - started)
+
+            if random.random() < style_share:
+                await asyncio.sleep(think_time * random.random())
+                started = time.perf_counter()
+                await self._push(self._style_update(user_id, transcript, random.choice(STYLES)))
+                result, seen = await self._wait(user_id, seen, lambda m: m["method"] == "sendMessage")
+                if result is None:
+                    self.results.error("style_timeout")
+                elif result["text"].startswith(ERROR_PREFIX):
+                    self.results.error("style_failed")
+                else:
+                    self.results.style.append(time.perf_counter() - started)
+
+
+async def sample_loop_lag(results: Results, interval: float = 0.05) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        results.loop_lag.append(max(0.0, loop.time() - expected))
+
+
+def configure_environment(args: argparse.Namespace, base_url: str) -> None:
+    os.environ.update({
+        "BOT_TOKEN": "123456:bench-token",
+        "DEEPGRAM_API_KEY": "bench",
+        "ANTHROPIC_API_KEY": "bench",
+        "TELEGRAM_API_BASE": base_url,
+        "DEEPGRAM_BASE_URL": f"{base_url}/v1/listen",
+        "ANTHROPIC_BASE_URL": base_url,
+        "RATE_LIMIT_PER_HOUR": str(10 ** 9),
+        "METRICS_PORT": "0",
+        "OTLP_ENDPOINT": "",
+        "SPECULATIVE_STYLE_ENABLED": "true" if args.speculative else "false",
+        "OUTBOUND_GLOBAL_RATE": str(args.global_rate),
+        "TELEGRAM_API_LOCAL": "true" if args.local_files_dir else "false",
+        "LOG_LEVEL": args.log_level if args.log_level != "off" else "WARNING",
+        "LOG_CONSOLE": "false",
+        "PERFORMANCE_RUNTIME": "true" if args.performance else "false",
+    })
+
+
+async def wait_for_port(port: int, timeout: float = 15) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("fake upstreams did not start")
+
+
+async def run(args: argparse.Namespace, fake_argv: List[str]) -> Results:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    fake = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "fake_servers.py"), "--port", str(port), *fake_argv],
+        stdout=subprocess.DEVNULL,
+    )
+    workdir = tempfile.TemporaryDirectory(prefix="d-buddy-bench-")
+    results = Results()
+    try:
+        await wait_for_port(port)
+        configure_environment(args, base_url)
+        # Services keep their JSON state under ./data; keep it out of the repo
+        os.chdir(workdir.name)
+
+        from loguru import logger
+        import main as bot_main
+        if args.log_level == "off":
+            logger.remove()
+            logger.add(sys.stderr, level="WARNING")
+            logging.getLogger().setLevel(logging.WARNING)
+        else:
+            time_log_calls(logger, results)
+
+        bot = bot_main.create_bot()
+        dp = bot_main.create_dispatcher()
+        bot_main.track_startup(bot, dp["services"])
+        polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+        lag_sampler = asyncio.create_task(sample_loop_lag(results))
+        # Let the first poll land so heavy modules are preloaded as in production
+        await asyncio.sleep(args.warmup)
+
+        started = time.perf_counter()
+        async with LoadGenerator(f"{base_url}/_control", results, args.timeout, args.file_size) as generator:
+            await asyncio.gather(*(
+                generator.user(10_000 + i, args.jobs_per_user, args.video_share, args.style_share, args.think_time)
+                for i in range(args.users)
+            ))
+        elapsed = time.perf_counter() - started
+
+        lag_sampler.cancel()
+        await dp.stop_polling()
+        await polling
+        await dp["services"].close()
+        await bot.session.close()
+        report(args, results, elapsed)
+        return results
+    finally:
+        os.chdir(ROOT)
+        fake.terminate()
+        fake.wait()
+        workdir.cleanup()
+        if args.local_files_dir:
+            shutil.rmtree(args.local_files_dir, ignore_errors=True)
+
+
+def time_log_calls(logger, results: Results) -> None:
+    """Count the time the event loop thread spends inside loguru and stdlib logging calls."""
+    loop_thread = threading.get_ident()
+    depth = [0]
+
+    def timed(call):
+        def wrapper(self, *args, **kwargs):
+            # Only the outermost call counts: stdlib records are forwarded into loguru
+            if threading.get_ident() != loop_thread or depth[0]:
+                return call(self, *args, **kwargs)
+            depth[0] += 1
+            started = time.perf_counter()
+            try:
+                return call(self, *args, **kwargs)
+            finally:
+                depth[0] -= 1
+                results.log_calls += 1
+                results.log_seconds += time.perf_counter() - started
+        return wrapper
+
+    type(logger)._log = timed(type(logger)._log)
+    logging.Logger.handle = timed(logging.Logger.handle)
+
+
+def report(args: argparse.Namespace, results: Results, elapsed: float) -> None:
+    def row(label: str, values: List[float]) -> str:
+        return (
+            f"{label:<16} {len(values):>6} "
+            f"{percentile(values, 0.50) * 1000:>9.1f} {percentile(values, 0.95) * 1000:>9.1f} "
+            f"{percentile(values, 0.99) * 1000:>9.1f} {max(values, default=0) * 1000:>9.1f}"
+        )
+
+    jobs = len(results.transcription)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+    print(f"\n🧪 Load test: {args.users} users × {args.jobs_per_user} jobs in {elapsed:.1f} s")
+    print(f"Runtime:         {args.runtime['loop']} event loop, {args.runtime['json']} codec")
+    print(f"Throughput:      {jobs / elapsed:.2f} transcriptions/s")
+    print(f"{'':<16} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    print(row("transcription", results.transcription))
+    print(row("style", results.style))
+    print(row("loop lag", results.loop_lag))
+    if args.log_level != "off":
+        print(
+            f"Logging on loop: {results.log_calls} calls, {results.log_seconds * 1000:.1f} ms "
+            f"({results.log_seconds / elapsed:.2%} of the run)"
+        )
+    print(f"Peak RSS:        {rss_mb:.1f} MB")
+    print(f"Errors:          {results.errors or 'none'}")
+    if args.local_files_dir:
+        leftover = sum(len(files) for _, _, files in os.walk(args.local_files_dir))
+        print(f"Local files left: {leftover}")
+
+
+def parse_args() -> tuple[argparse.Namespace, List[str]]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1], add_help=False)
+    parser.add_argument("-h", "--help", action="store_true")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--jobs-per-user", type=int, default=3)
+    parser.add_argument("--video-share", type=float, default=0.3)
+    parser.add_argument("--style-share", type=float, default=0.5)
+    parser.add_argument("--think-time", type=float, default=1.0, help="max pause before pressing a style button")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-step timeout in seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds between startup and the first user")
+    parser.add_argument("--global-rate", type=float, default=30.0, help="OUTBOUND_GLOBAL_RATE for the bot")
+    parser.add_argument("--local-mode", action="store_true", help="serve media as local Bot API server file paths")
+    parser.add_argument("--speculative", action="store_true", help="enable speculative style precompute")
+    parser.add_argument("--log-level", default="off", help="keep the bot's logging at this level (default: off)")
+    parser.add_argument("--performance", action="store_true", help="run the bot with PERFORMANCE_RUNTIME (uvloop, orjson)")
+    args, fake_argv = parser.parse_known_args()
+    if args.help:
+        parser.print_help()
+        print("\nFake upstream options:", ", ".join(f"--{name.replace('_', '-')}" for name in vars(FakeConfig())))
+        sys.exit(0)
+    # Validate upstream options early instead of in the child process
+    args.file_size = parse_fake_args(fake_argv).payload_kb * 1024
+    args.local_files_dir = ""
+    if args.local_mode:
+        args.local_files_dir = tempfile.mkdtemp(prefix="d-buddy-local-api-")
+        fake_argv += ["--local-files-dir", args.local_files_dir]
+    return args, fake_argv
+
+
+if __name__ == "__main__":
+    cli_args, fake_cli_argv = parse_args()
+    cli_args.runtime = setup_runtime(cli_args.performance)
+    asyncio.run(run(cli_args, fake_cli_argv))
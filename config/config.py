@@ -1,7 +1,8 @@
-from typing import List
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 from dotenv import load_dotenv
+import json
 import os
 
 load_dotenv()
@@ -12,14 +13,267 @@ def _parse_unlimited_users(value: str | None) -> List[str]:
         return []
     return [user.strip() for user in value.split(',') if user.strip()]
 
+class ModelRoute(BaseModel):
+    """One row of the LLM routing table; the first matching row wins."""
+    model: str
+    styles: Optional[List[str]] = None  # None matches every style
+    max_input_tokens: Optional[int] = None  # None matches any length
+    fallbacks: List[str] = []
+    timeout: float = 60.0
+
+
+def _default_model_routes() -> List[ModelRoute]:
+    model = os.getenv("ANTHROPIC_MODEL", "claude-3-5-haiku-20241022")
+    fast_model = os.getenv("ANTHROPIC_FAST_MODEL", "claude-3-haiku-20240307")
+    fallback_model = os.getenv("ANTHROPIC_FALLBACK_MODEL", "claude-3-haiku-20240307")
+    fallbacks = [fallback_model] if fallback_model != model else []
+    return [
+        # Short clips: the fast tier is good enough and answers sooner
+        ModelRoute(model=fast_model, styles=["proofread", "my", "business"], max_input_tokens=300,
+                   fallbacks=[model] if fast_model != model else [], timeout=20.0),
+        ModelRoute(model=model, fallbacks=fallbacks, timeout=60.0),
+    ]
+
+
+# Largest max_tokens each model accepts; a request routed to a model is clamped to it
+_DEFAULT_MAX_OUTPUT_TOKENS = {
+    "claude-3-haiku-20240307": 4096,
+    "claude-3-opus-20240229": 4096,
+    "claude-3-5-haiku-20241022": 8192,
+    "claude-3-5-sonnet-20241022": 8192,
+}
+
+
+def _parse_max_output_tokens(value: str | None) -> Dict[str, int]:
+    return {**_DEFAULT_MAX_OUTPUT_TOKENS, **(json.loads(value) if value else {})}
+
+
+def _parse_model_routes(value: str | None) -> List[ModelRoute]:
+    if not value:
+        return _default_model_routes()
+    return [ModelRoute(**route) for route in json.loads(value)]
+
+class RateTier(BaseModel):
+    """One quota window: at most `limit` units (audio seconds) per `period` seconds, usable as a burst."""
+    name: str
+    period: float
+    limit: float
+
+
+def _rate_limit_seconds_per_request() -> int:
+    return int(os.getenv("RATE_LIMIT_SECONDS_PER_REQUEST", "600")) or 600
+
+
+def _default_rate_tiers() -> List[RateTier]:
+    # The hourly budget keeps the old meaning: RATE_LIMIT_PER_HOUR files of up to
+    # RATE_LIMIT_SECONDS_PER_REQUEST seconds each. Files are charged at least that
+    # much (RATE_LIMIT_MIN_SECONDS), so short clips are still RATE_LIMIT_PER_HOUR
+    # per hour; like the old limit, all of them may be sent back to back. There is
+    # no daily cap by default; add one with RATE_LIMIT_TIERS.
+    per_hour = int(os.getenv("RATE_LIMIT_PER_HOUR", "5"))
+    return [RateTier(name="hour", period=3600, limit=per_hour * _rate_limit_seconds_per_request())]
+
+
+def _parse_rate_tiers(value: str | None) -> List[RateTier]:
+    if not value:
+        return _default_rate_tiers()
+    return [RateTier(**tier) for tier in json.loads(value)]
+
+class PipelineStage(BaseModel):
+    """Worker count and per-job timeout for one media pipeline stage."""
+    concurrency: int
+    timeout: float
+
+
+# Account and render are cheap; fetch and transcribe are bounded by upstream I/O.
+# Admit includes waiting for the media byte budget, hence the long timeout.
+_DEFAULT_PIPELINE_STAGES = {
+    "admit": PipelineStage(concurrency=16, timeout=300.0),
+    "fetch": PipelineStage(concurrency=4, timeout=120.0),
+    "prepare": PipelineStage(concurrency=4, timeout=60.0),
+    "transcribe": PipelineStage(concurrency=4, timeout=300.0),
+    "account": PipelineStage(concurrency=2, timeout=10.0),
+    "render": PipelineStage(concurrency=4, timeout=30.0),
+    "deliver": PipelineStage(concurrency=8, timeout=300.0),
+}
+
+
+def _parse_pipeline_stages(value: str | None) -> Dict[str, PipelineStage]:
+    stages = dict(_DEFAULT_PIPELINE_STAGES)
+    if value:
+        for name, overrides in json.loads(value).items():
+            stages[name] = stages[name].model_copy(update=overrides)
+    return stages
+
+def _parse_transcriber_backends(value: str) -> List[str]:
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+class TenantBot(BaseModel):
+    """Another bot served by the same process; unset fields fall back to the main bot's settings."""
+    name: str
+    token: str
+    admin_user_id: Optional[int] = None
+    rate_limit_tiers: Optional[List[RateTier]] = None
+    unlimited_users: List[str] = []
+    # Metrics, rate limits and the job journal; defaults to <DATA_DIR>/<name>
+    data_dir: Optional[str] = None
+    # Defaults to <data_dir>/unlimited_users.json
+    unlimited_users_file: Optional[str] = None
+    # Transcription backends in order of preference, e.g. ["local", "deepgram"]
+    transcriber_backends: Optional[List[str]] = None
+
+
+def _parse_bots(value: str | None) -> List[TenantBot]:
+    if not value:
+        return []
+    return [TenantBot(**bot) for bot in json.loads(value)]
+
+_TELEGRAM_API_LOCAL = os.getenv("TELEGRAM_API_LOCAL", "false").lower() == "true"
+
 class Config(BaseModel):
     BOT_TOKEN: str = os.getenv("BOT_TOKEN")
+    # Tells per-bot metric series apart; bots in BOTS use their name
+    BOT_NAME: str = os.getenv("BOT_NAME", "main")
     DEEPGRAM_API_KEY: str = os.getenv("DEEPGRAM_API_KEY")
     ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY")
     ANTHROPIC_MODEL: str = os.getenv("ANTHROPIC_MODEL", "claude-3-5-haiku-20241022")
     ADMIN_USER_ID: int = int(os.getenv("ADMIN_USER_ID", "0"))
     RATE_LIMIT_PER_HOUR: int = int(os.getenv("RATE_LIMIT_PER_HOUR", "5"))
+    # Metrics and rate limit state
+    DATA_DIR: str = os.getenv("DATA_DIR", "data")
     UNLIMITED_USERS_FILE: str = os.getenv("UNLIMITED_USERS_FILE", "data/unlimited_users.json")
     UNLIMITED_USERS: List[str] = _parse_unlimited_users(os.getenv("UNLIMITED_USERS"))
+    # How often the whitelist file is checked for changes made by other processes
+    UNLIMITED_USERS_RELOAD_SECONDS: float = float(os.getenv("UNLIMITED_USERS_RELOAD_SECONDS", "5"))
+    # JSON list of ModelRoute rows, e.g. [{"model": "...", "styles": ["brief"], "fallbacks": ["..."]}]
+    LLM_ROUTES: List[ModelRoute] = _parse_model_routes(os.getenv("LLM_ROUTES"))
+    # JSON object of model -> largest max_tokens it accepts, added to the built-in table,
+    # e.g. {"claude-sonnet-4-20250514": 64000}; models in neither are not clamped
+    LLM_MAX_OUTPUT_TOKENS: Dict[str, int] = _parse_max_output_tokens(os.getenv("LLM_MAX_OUTPUT_TOKENS"))
+    # Models whose recent error rate exceeds this are tried last
+    LLM_MAX_ERROR_RATE: float = float(os.getenv("LLM_MAX_ERROR_RATE", "0.5"))
+    # Long transcripts are styled in chunks of about this many tokens
+    LLM_CHUNK_TOKENS: int = int(os.getenv("LLM_CHUNK_TOKENS", "3000"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    STYLE_CACHE_TTL_SECONDS: int = int(os.getenv("STYLE_CACHE_TTL_SECONDS", "3600"))
+    # Precompute the most likely style right after a transcription
+    SPECULATIVE_STYLE_ENABLED: bool = os.getenv("SPECULATIVE_STYLE_ENABLED", "false").lower() == "true"
+    SPECULATIVE_TOKENS_PER_HOUR: int = int(os.getenv("SPECULATIVE_TOKENS_PER_HOUR", "50000"))
+    SPECULATIVE_MAX_CONCURRENT: int = int(os.getenv("SPECULATIVE_MAX_CONCURRENT", "2"))
+    TRANSCRIPT_TTL_SECONDS: int = int(os.getenv("TRANSCRIPT_TTL_SECONDS", "3600"))
+    # JSON overrides per media pipeline stage, e.g. {"transcribe": {"concurrency": 8}}
+    PIPELINE_STAGES: Dict[str, PipelineStage] = _parse_pipeline_stages(os.getenv("PIPELINE_STAGES"))
+    # Jobs waiting between two stages; a full queue holds back the previous stage
+    PIPELINE_QUEUE_SIZE: int = int(os.getenv("PIPELINE_QUEUE_SIZE", "16"))
+    # Bot API download limit (20 MB on the cloud server, 2000 MB on a local one); larger media is rejected before get_file
+    MAX_DOWNLOAD_MB: int = int(os.getenv("MAX_DOWNLOAD_MB", "2000" if _TELEGRAM_API_LOCAL else "20"))
+    # Media bytes held in memory across all jobs; new jobs wait when it is used up
+    MEDIA_BYTES_BUDGET_MB: int = int(os.getenv("MEDIA_BYTES_BUDGET_MB", "128"))
+    # Media above this size is spooled to a temp file instead of kept in RAM
+    SPOOL_MEMORY_LIMIT_MB: int = int(os.getenv("SPOOL_MEMORY_LIMIT_MB", "8"))
+    # Directory for spooled media; empty uses the system temp directory
+    SPOOL_DIR: str = os.getenv("SPOOL_DIR", "")
+    # Transcription backends in order of preference: deepgram, local (faster-whisper on the CPU,
+    # requirements-local.txt) and fake (deterministic, for tests and load tests)
+    TRANSCRIBER_BACKENDS: List[str] = _parse_transcriber_backends(os.getenv("TRANSCRIBER_BACKENDS", "deepgram"))
+    # Backends whose recent error rate exceeds this are tried last
+    TRANSCRIBER_MAX_ERROR_RATE: float = float(os.getenv("TRANSCRIBER_MAX_ERROR_RATE", "0.5"))
+    # Clips up to this long go to whichever healthy backend answers them fastest
+    TRANSCRIBER_SHORT_CLIP_SECONDS: float = float(os.getenv("TRANSCRIBER_SHORT_CLIP_SECONDS", "30"))
+    # faster-whisper model size or path for the local backend, and the longest media it is offered
+    LOCAL_TRANSCRIBER_MODEL: str = os.getenv("LOCAL_TRANSCRIBER_MODEL", "small")
+    LOCAL_TRANSCRIBER_MAX_SECONDS: float = float(os.getenv("LOCAL_TRANSCRIBER_MAX_SECONDS", "300"))
+    # CPU threads per local recognition and how many files are recognized at once
+    LOCAL_TRANSCRIBER_THREADS: int = int(os.getenv("LOCAL_TRANSCRIBER_THREADS", "2"))
+    LOCAL_TRANSCRIBER_CONCURRENCY: int = int(os.getenv("LOCAL_TRANSCRIBER_CONCURRENCY", "1"))
+    # Shorten long pauses before upload (NumPy from requirements-audio.txt and ffmpeg); word times keep
+    # pointing at the original media
+    SILENCE_TRIM_ENABLED: bool = os.getenv("SILENCE_TRIM_ENABLED", "false").lower() == "true"
+    # Pauses longer than this are shortened to it
+    SILENCE_MAX_PAUSE_MS: int = int(os.getenv("SILENCE_MAX_PAUSE_MS", "700"))
+    # Frames this much louder than the recording's noise floor count as speech
+    SILENCE_MARGIN_DB: float = float(os.getenv("SILENCE_MARGIN_DB", "10"))
+    # The trimmed copy is uploaded only when it is at least this much shorter
+    SILENCE_MIN_SAVED_SECONDS: float = float(os.getenv("SILENCE_MIN_SAVED_SECONDS", "2"))
+    # Longer media is uploaded as is, as is media whose trimming takes longer than the timeout
+    SILENCE_TRIM_MAX_SECONDS: float = float(os.getenv("SILENCE_TRIM_MAX_SECONDS", "1800"))
+    SILENCE_TRIM_TIMEOUT: float = float(os.getenv("SILENCE_TRIM_TIMEOUT", "30"))
+    FFMPEG_BINARY: str = os.getenv("FFMPEG_BINARY", "ffmpeg")
+    # Upload attempts per file on 429/5xx or connection errors; retries reuse the spooled payload
+    DEEPGRAM_MAX_ATTEMPTS: int = int(os.getenv("DEEPGRAM_MAX_ATTEMPTS", "2"))
+    # Audio seconds one request of RATE_LIMIT_PER_HOUR is worth in the default quota tiers
+    RATE_LIMIT_SECONDS_PER_REQUEST: int = _rate_limit_seconds_per_request()
+    # JSON list of RateTier rows in audio seconds, e.g. [{"name": "hour", "period": 3600, "limit": 3000}];
+    # every tier must have room for a file; [] disables the limit
+    RATE_LIMIT_TIERS: List[RateTier] = _parse_rate_tiers(os.getenv("RATE_LIMIT_TIERS"))
+    # Shortest duration a file is charged for, so floods of tiny clips still count;
+    # by default a whole request, so short clips keep the RATE_LIMIT_PER_HOUR count
+    RATE_LIMIT_MIN_SECONDS: int = int(os.getenv("RATE_LIMIT_MIN_SECONDS", str(_rate_limit_seconds_per_request())))
+    # Upstream endpoints; overridable for a local Bot API server or benchmark stand-ins
+    TELEGRAM_API_BASE: str = os.getenv("TELEGRAM_API_BASE", "")
+    # Self-hosted Bot API server started with --local: get_file returns paths on its disk
+    TELEGRAM_API_LOCAL: bool = _TELEGRAM_API_LOCAL
+    # Where the server's working directory is mounted in this container, if the paths differ
+    TELEGRAM_LOCAL_SERVER_DIR: str = os.getenv("TELEGRAM_LOCAL_SERVER_DIR", "")
+    TELEGRAM_LOCAL_FILES_DIR: str = os.getenv("TELEGRAM_LOCAL_FILES_DIR", "")
+    # Delete media from the server's directory once transcribed; nothing is kept on disk
+    TELEGRAM_LOCAL_DELETE_FILES: bool = os.getenv("TELEGRAM_LOCAL_DELETE_FILES", "true").lower() == "true"
+    DEEPGRAM_BASE_URL: str = os.getenv("DEEPGRAM_BASE_URL", "https://api.deepgram.com/v1/listen")
+    ANTHROPIC_BASE_URL: str = os.getenv("ANTHROPIC_BASE_URL", "")
+    # Logging: JSON lines to LOG_FILE (empty disables it) and text to stderr, written by a background thread
+    # Records below this level are skipped before they are built, the only truly free log call
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FILE: str = os.getenv("LOG_FILE", "bot.log")
+    LOG_CONSOLE: bool = os.getenv("LOG_CONSOLE", "true").lower() == "true"
+    # DEBUG records allowed per second from each call site; 0 keeps them all
+    LOG_DEBUG_PER_SECOND: int = int(os.getenv("LOG_DEBUG_PER_SECOND", "10"))
+    # Records waiting to be written; more are dropped rather than blocking the bot
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    # Prometheus /metrics endpoint; 0 disables it
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "0"))
+    # Event loop lag sampling; a loop blocked longer than LOOP_STALL_THRESHOLD_MS is logged with its stack
+    LOOP_MONITOR_INTERVAL_MS: int = int(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+    LOOP_STALL_THRESHOLD_MS: int = int(os.getenv("LOOP_STALL_THRESHOLD_MS", "500"))
+    # Readiness probe served from a thread on METRICS_HOST, so it answers 503 while the loop is
+    # blocked; /health on METRICS_PORT runs on the loop and times out instead. 0 disables it
+    HEALTH_PORT: int = int(os.getenv("HEALTH_PORT", "0"))
+    # uvloop event loop and orjson codec (requirements-perf.txt); falls back to asyncio/json when not installed
+    PERFORMANCE_RUNTIME: bool = os.getenv("PERFORMANCE_RUNTIME", "false").lower() == "true"
+    # Stack frames recorded per allocation by /mem start; more frames cost more memory and time while tracing
+    MEMORY_TRACE_FRAMES: int = int(os.getenv("MEMORY_TRACE_FRAMES", "1"))
+    # Local OTLP/HTTP collector for traces, e.g. http://localhost:4318; empty disables export
+    OTLP_ENDPOINT: str = os.getenv("OTLP_ENDPOINT", "")
+    # Telegram flood limits: ~1 msg/s per chat, ~30 msg/s per bot
+    OUTBOUND_PER_CHAT_RATE: float = float(os.getenv("OUTBOUND_PER_CHAT_RATE", "1.0"))
+    OUTBOUND_PER_CHAT_BURST: float = float(os.getenv("OUTBOUND_PER_CHAT_BURST", "3"))
+    OUTBOUND_GLOBAL_RATE: float = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+    # Accepted jobs are journaled here and resumed after a restart
+    JOURNAL_FILE: str = os.getenv("JOURNAL_FILE", "data/jobs.journal")
+    # Seconds between resumed jobs on startup, so a backlog does not hit Deepgram at once
+    JOURNAL_RESUME_INTERVAL: float = float(os.getenv("JOURNAL_RESUME_INTERVAL", "0.5"))
+    # Unfinished jobs older than this are dropped instead of resumed
+    JOURNAL_MAX_AGE_HOURS: float = float(os.getenv("JOURNAL_MAX_AGE_HOURS", "24"))
+    # Seconds running jobs get to finish on shutdown before they are cancelled (and resumed on the next start)
+    SHUTDOWN_GRACE_SECONDS: float = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "45"))
+    # JSON list of TenantBot rows for more bots in this process, e.g.
+    # [{"name": "brand2", "token": "...", "admin_user_id": 42}]; the main bot is BOT_TOKEN
+    BOTS: List[TenantBot] = _parse_bots(os.getenv("BOTS"))
+
+    def for_bot(self, bot: TenantBot) -> "Config":
+        """This config with the bot's token, admin, quotas, transcription backends and data files."""
+        data_dir = bot.data_dir or os.path.join(self.DATA_DIR, bot.name)
+        return self.model_copy(update={
+            "BOT_TOKEN": bot.token,
+            "BOT_NAME": bot.name,
+            "ADMIN_USER_ID": self.ADMIN_USER_ID if bot.admin_user_id is None else bot.admin_user_id,
+            "RATE_LIMIT_TIERS": self.RATE_LIMIT_TIERS if bot.rate_limit_tiers is None else bot.rate_limit_tiers,
+            "DATA_DIR": data_dir,
+            "UNLIMITED_USERS_FILE": bot.unlimited_users_file or os.path.join(data_dir, "unlimited_users.json"),
+            "UNLIMITED_USERS": bot.unlimited_users,
+            "TRANSCRIBER_BACKENDS": self.TRANSCRIBER_BACKENDS if bot.transcriber_backends is None else bot.transcriber_backends,
+            "JOURNAL_FILE": os.path.join(data_dir, "jobs.journal"),
+            "BOTS": [],
+        })
 
 config = Config()
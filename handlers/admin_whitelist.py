@@ -1,15 +1,19 @@
+import json
+import re
+
 from aiogram import Router
 from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.types import BufferedInputFile, Message
 
-from config.config import config
-from services import access_control_service
+from services import ServiceContainer
+from services.access_control import normalize_user_id
 
 router = Router()
 
-
-def _is_admin(user_id: int) -> bool:
-    return user_id == config.ADMIN_USER_ID
+# Largest VIP list file accepted by /vip_import
+MAX_IMPORT_BYTES = 5 * 1024 * 1024
+# /vip_list prints at most this many ids; the rest is available via /vip_export
+VIP_LIST_LIMIT = 100
 
 
 def _extract_target_user(message: Message) -> str | None:
@@ -23,47 +27,116 @@ def _extract_target_user(message: Message) -> str | None:
     return None
 
 
+def _parse_user_ids(text: str) -> list[str]:
+    """Ids from a JSON list or any whitespace/comma separated text."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, list):
+        return [str(user) for user in data]
+    return [part for part in re.split(r"[\s,;]+", text) if part]
+
+
 @router.message(Command("vip_add"))
-async def handle_vip_add(message: Message):
-    if not _is_admin(message.from_user.id):
+async def handle_vip_add(message: Message, services: ServiceContainer):
+    if not services.is_admin(message.from_user.id):
         return
 
     target_id = _extract_target_user(message)
     if not target_id:
-        await message.answer("❌ Укажите ID пользователя или ответьте на его сообщение.")
+        await services.outbound_sender.answer(message, "❌ Укажите ID пользователя или ответьте на его сообщение.")
+        return
+    if normalize_user_id(target_id) is None:
+        await services.outbound_sender.answer(message, "❌ ID пользователя должен быть числом.")
         return
 
-    if access_control_service.add_user(target_id):
-        await message.answer(f"✅ Пользователь {target_id} теперь в VIP.")
+    if services.access_control_service.add_user(target_id):
+        await services.outbound_sender.answer(message, f"✅ Пользователь {target_id} теперь в VIP.")
     else:
-        await message.answer(f"ℹ️ Пользователь {target_id} уже был в VIP.")
+        await services.outbound_sender.answer(message, f"ℹ️ Пользователь {target_id} уже был в VIP.")
 
 
 @router.message(Command("vip_remove"))
-async def handle_vip_remove(message: Message):
-    if not _is_admin(message.from_user.id):
+async def handle_vip_remove(message: Message, services: ServiceContainer):
+    if not services.is_admin(message.from_user.id):
         return
 
     target_id = _extract_target_user(message)
     if not target_id:
-        await message.answer("❌ Укажите ID пользователя или ответьте на его сообщение.")
+        await services.outbound_sender.answer(message, "❌ Укажите ID пользователя или ответьте на его сообщение.")
         return
 
-    if access_control_service.remove_user(target_id):
-        await message.answer(f"🗑️ Пользователь {target_id} удалён из VIP.")
+    if services.access_control_service.remove_user(target_id):
+        await services.outbound_sender.answer(message, f"🗑️ Пользователь {target_id} удалён из VIP.")
     else:
-        await message.answer(f"ℹ️ Пользователь {target_id} не найден в VIP.")
+        await services.outbound_sender.answer(message, f"ℹ️ Пользователь {target_id} не найден в VIP.")
 
 
 @router.message(Command("vip_list"))
-async def handle_vip_list(message: Message):
-    if not _is_admin(message.from_user.id):
+async def handle_vip_list(message: Message, services: ServiceContainer):
+    if not services.is_admin(message.from_user.id):
         return
 
-    users = access_control_service.list_users()
+    users = services.access_control_service.list_users()
     if not users:
-        await message.answer("📭 Список VIP пуст.")
+        await services.outbound_sender.answer(message, "📭 Список VIP пуст.")
+        return
+
+    formatted = "\n".join(users[:VIP_LIST_LIMIT])
+    if len(users) > VIP_LIST_LIMIT:
+        formatted += f"\n… и ещё {len(users) - VIP_LIST_LIMIT}, полный список: /vip_export"
+    await services.outbound_sender.answer(message, f"👑 VIP пользователи ({len(users)}):\n{formatted}")
+
+
+@router.message(Command("vip_import"))
+async def handle_vip_import(message: Message, services: ServiceContainer):
+    """Add many VIP users at once: ids after the command or a .txt/.json file with this caption.
+
+    `/vip_import replace ...` makes the list exactly the given ids.
+    """
+    if not services.is_admin(message.from_user.id):
+        return
+
+    text = message.text or message.caption or ""
+    parts = text.strip().split(maxsplit=1)
+    payload = parts[1] if len(parts) > 1 else ""
+    replace = False
+    if payload.startswith("replace"):
+        replace = True
+        payload = payload[len("replace"):]
+
+    document = message.document or (message.reply_to_message and message.reply_to_message.document)
+    if document:
+        if document.file_size and document.file_size > MAX_IMPORT_BYTES:
+            await services.outbound_sender.answer(message, "❌ Файл слишком большой для импорта.")
+            return
+        downloaded = await message.bot.download(document)
+        payload += "\n" + downloaded.read().decode("utf-8", errors="replace")
+
+    user_ids = _parse_user_ids(payload)
+    if not user_ids:
+        await services.outbound_sender.answer(
+            message, "❌ Укажите ID через пробел или приложите файл со списком ID."
+        )
+        return
+
+    access_control = services.access_control_service
+    added = access_control.import_users(user_ids, replace=replace)
+    await services.outbound_sender.answer(
+        message, f"✅ Импорт завершён: добавлено {added}, всего VIP: {len(access_control)}."
+    )
+
+
+@router.message(Command("vip_export"))
+async def handle_vip_export(message: Message, services: ServiceContainer):
+    if not services.is_admin(message.from_user.id):
+        return
+
+    exported = services.access_control_service.export_users()
+    if not exported:
+        await services.outbound_sender.answer(message, "📭 Список VIP пуст.")
         return
 
-    formatted = "\n".join(users)
-    await message.answer(f"👑 VIP пользователи ({len(users)}):\n{formatted}")
+    document = BufferedInputFile(exported.encode("utf-8") + b"\n", filename="vip_users.txt")
+    await services.outbound_sender.run(message.chat.id, lambda: message.answer_document(document))
@@ -0,0 +1,135 @@
+import asyncio
+import html
+from datetime import datetime
+from typing import Dict, Optional
+
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from services import ServiceContainer
+from services.memory_profiler import MAX_TRACE_FRAMES, MemoryReport, process_memory
+from services.telemetry import JOB_BUFFERED_BYTES, JOB_PEAK_BYTES
+
+router = Router()
+
+# Allocation sites listed per section of /mem
+MEM_TOP = 10
+# Stack lines of the last stall shown in /health; the full stack is in the log
+STACK_LINES = 12
+
+
+def format_health_message(monitor, transcribers: Dict[str, Dict[str, Optional[float]]] | None = None) -> str:
+    health = monitor.health()
+    lines = [
+        "🩺 <b>Состояние бота</b>",
+        "",
+        f"Готовность: {'✅ да' if health['ready'] else '❌ нет (цикл событий блокировался)'}",
+    ]
+    lag = health["lag_ms"]
+    if lag:
+        lines.append(
+            f"Задержка цикла событий: p50 {lag['p50']:.1f} мс, p90 {lag['p90']:.1f} мс, "
+            f"p99 {lag['p99']:.1f} мс, макс. {lag['max']:.1f} мс"
+        )
+    lines.append(f"Блокировок дольше {health['threshold_ms']:.0f} мс: {health['stalls']}")
+
+    if transcribers:
+        lines.append("")
+        lines.append("Распознавание речи:")
+        for name, stats in transcribers.items():
+            latency = f"p50 {stats['p50']:.1f} с" if stats["p50"] is not None else "нет успешных"
+            if stats["short_p50"] is not None:
+                latency += f", короткие p50 {stats['short_p50']:.1f} с"
+            lines.append(f"• {name}: {latency}, ошибки {stats['error_rate']:.0%}")
+
+    stalls = monitor.recent_stalls()
+    if stalls:
+        lines.append("")
+        lines.append("Последние блокировки:")
+        for stall in reversed(stalls):
+            lines.append(f"• {datetime.fromtimestamp(stall.started):%d.%m %H:%M:%S} — {stall.duration * 1000:.0f} мс")
+        stack = "".join(stalls[-1].stack.splitlines(keepends=True)[-STACK_LINES:])
+        if stack:
+            lines.append("")
+            lines.append(f"<pre>{html.escape(stack)}</pre>")
+    return "\n".join(lines)
+
+
+@router.message(Command("health"))
+async def handle_health(message: Message, services: ServiceContainer):
+    """Event loop lag, recent stalls and transcription backend health - admin only."""
+    if not services.is_admin(message.from_user.id):
+        return
+    await services.outbound_sender.answer(
+        message, format_health_message(services.loop_monitor, services.transcriber_router.snapshot())
+    )
+
+
+def _mb(size: float) -> str:
+    return f"{size / 2 ** 20:.1f} МБ"
+
+
+def format_memory_message(report: MemoryReport | None) -> str:
+    lines = ["🧠 <b>Память</b>", ""]
+    readings = process_memory()
+    if "rss" in readings:
+        lines.append(f"Процесс: {_mb(readings['rss'])} (пик {_mb(readings.get('rss_peak', 0))})")
+    if "cgroup_used" in readings:
+        limit = readings.get("cgroup_limit")
+        lines.append(f"Контейнер: {_mb(readings['cgroup_used'])}" + (f" из {_mb(limit)}" if limit else ""))
+
+    jobs = [
+        f"{media_type:<11}{count:>6}{total / count / 1024:>10.0f}"
+        for (media_type,), (count, total) in sorted(JOB_PEAK_BYTES.series().items()) if count
+    ]
+    if jobs:
+        lines.append("")
+        lines.append("Пик памяти на задачу, КБ (среднее):")
+        lines.append("<pre>" + "\n".join([f"{'тип':<11}{'n':>6}{'КБ':>10}"] + jobs) + "</pre>")
+        stages = [f"{'тип':<11}{'этап':<11}{'КБ':>10}"] + [
+            f"{media_type:<11}{stage:<11}{total / count / 1024:>10.0f}"
+            for (media_type, stage), (count, total) in sorted(JOB_BUFFERED_BYTES.series().items()) if count
+        ]
+        lines.append("После этапа, КБ (среднее):")
+        lines.append("<pre>" + "\n".join(stages) + "</pre>")
+
+    lines.append("")
+    if report is None:
+        lines.append("Трассировка выделений выключена: /mem start [глубина стека]")
+        return "\n".join(lines)
+    lines.append(f"Отслежено: {_mb(report.traced_bytes)} (пик {_mb(report.traced_peak_bytes)})")
+    for title, rows in (("Крупнейшие места выделения", report.top), ("Рост с прошлого отчёта", report.growth)):
+        if rows:
+            lines.append(f"\n{title}:")
+            rows = [f"{size / 1024:>9.0f} КБ {count:>7} {html.escape(site)}" for site, size, count in rows]
+            lines.append("<pre>" + "\n".join(rows) + "</pre>")
+    return "\n".join(lines)
+
+
+@router.message(Command("mem"))
+async def handle_memory(message: Message, services: ServiceContainer):
+    """/mem [start [frames] | stop]: memory usage and allocation tracing - admin only."""
+    if not services.is_admin(message.from_user.id):
+        return
+    profiler = services.memory_profiler
+    args = (message.text or "").split()[1:]
+    if args[:1] == ["start"]:
+        frames = None
+        if len(args) > 1:
+            frames = int(args[1]) if args[1].isdigit() else 0
+            if not 1 <= frames <= MAX_TRACE_FRAMES:
+                await services.outbound_sender.answer(
+                    message, f"Использование: /mem start [кадров стека на выделение, от 1 до {MAX_TRACE_FRAMES}]"
+                )
+                return
+        profiler.start(frames)
+        await services.outbound_sender.answer(message, "✅ Трассировка выделений включена. /mem — отчёт, /mem stop — выключить.")
+        return
+    if args[:1] == ["stop"]:
+        profiler.stop()
+        await services.outbound_sender.answer(message, "✅ Трассировка выделений выключена.")
+        return
+    # A snapshot walks every traced block; keep it off the event loop
+    report = await asyncio.to_thread(profiler.report, MEM_TOP)
+    await services.outbound_sender.answer(message, format_memory_message(report))
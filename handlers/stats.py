@@ -1,18 +1,17 @@
 from aiogram import Router, F
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.filters import Command
+from services import ServiceContainer
 from services.metrics import MetricsService
-from config.config import config
+from models.metrics import AllTimeMetrics
+from services.tracing import tracer
 from loguru import logger
 from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Tuple
 import calendar
 
 router = Router()
-metrics_service = MetricsService()
-
-def is_admin(user_id: int) -> bool:
-    """Check if user is admin."""
-    return user_id == config.ADMIN_USER_ID
 
 def format_month_name(month_key: str) -> str:
     """Convert YYYY-MM to readable format."""
@@ -23,21 +22,25 @@ def format_month_name(month_key: str) -> str:
     except:
         return month_key
 
-def create_months_keyboard() -> InlineKeyboardMarkup:
+def create_months_keyboard(metrics_service: MetricsService) -> InlineKeyboardMarkup:
     """Create keyboard with available months."""
-    all_months = metrics_service.get_all_months()
+    current_month = datetime.now().strftime("%Y-%m")
+    return _months_keyboard(tuple(metrics_service.month_keys()), current_month)
+
+@lru_cache(maxsize=8)
+def _months_keyboard(month_keys: Tuple[str, ...], current_month: str) -> InlineKeyboardMarkup:
+    """Keyboard for a set of months; rebuilt only when a month appears or the current one rolls over."""
     buttons = []
     
     # Current month first
-    current_month = datetime.now().strftime("%Y-%m")
-    if current_month in all_months:
+    if current_month in month_keys:
         buttons.append([InlineKeyboardButton(
             text=f"📊 {format_month_name(current_month)} (текущий)",
             callback_data=f"stats_{current_month}"
         )])
     
     # Other months
-    for month_key in sorted(all_months.keys(), reverse=True):
+    for month_key in month_keys:
         if month_key != current_month:
             buttons.append([InlineKeyboardButton(
                 text=f"📊 {format_month_name(month_key)}",
@@ -78,26 +81,16 @@ def format_stats_message(month_key: str, stats) -> str:
     
     return message
 
-def format_all_stats_message(all_months) -> str:
+def format_all_stats_message(totals: AllTimeMetrics) -> str:
     """Format all-time statistics message."""
-    if not all_months:
+    if not totals.months:
         return "📈 Общая статистика\n\n❌ Данных нет"
     
-    total_users = set()
-    total_transcriptions = 0
-    total_llm = {"proofread": 0, "my": 0, "business": 0, "brief": 0}
-    
-    for stats in all_months.values():
-        total_users.update(stats.unique_users)
-        total_transcriptions += stats.transcriptions
-        for style, count in stats.llm_calls.items():
-            total_llm[style] += count
-    
-    total_llm_count = sum(total_llm.values())
+    total_llm_count = sum(totals.llm_calls.values())
     
     message = "📈 Общая статистика\n\n"
-    message += f"👥 Всего уникальных пользователей: {len(total_users)}\n"
-    message += f"🎙️ Всего транскрипций: {total_transcriptions}\n"
+    message += f"👥 Всего уникальных пользователей: {totals.unique_users}\n"
+    message += f"🎙️ Всего транскрипций: {totals.transcriptions}\n"
     message += f"🤖 Всего LLM обработок: {total_llm_count}\n\n"
     
     if total_llm_count > 0:
@@ -108,33 +101,55 @@ def format_all_stats_message(all_months) -> str:
             "business": "👔 Деловой",
             "brief": "📋 Кратко"
         }
-        for style, count in total_llm.items():
+        for style, count in totals.llm_calls.items():
             if count > 0:
                 message += f"  {style_names.get(style, style)}: {count}\n"
     
-    message += f"\n📅 Месяцев с данными: {len(all_months)}"
+    message += f"\n📅 Месяцев с данными: {totals.months}"
     
     return message
 
+# (metrics service id, period) -> (data version, formatted message)
+_stats_messages: Dict[Tuple[int, str], Tuple[int, str]] = {}
+
+def get_stats_message(metrics_service: MetricsService, period: str) -> str:
+    """Formatted stats for a month or "all", re-rendered only after the data changed."""
+    if period == "all":
+        version = metrics_service.version
+    else:
+        version = metrics_service.month_version(period)
+    
+    key = (id(metrics_service), period)
+    cached = _stats_messages.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+    
+    if period == "all":
+        message = format_all_stats_message(metrics_service.get_all_time_stats())
+    else:
+        message = format_stats_message(period, metrics_service.get_month_stats(period))
+    _stats_messages[key] = (version, message)
+    return message
+
 @router.message(Command("stats"))
-async def handle_stats_command(message: Message):
+async def handle_stats_command(message: Message, services: ServiceContainer):
     """Handle /stats command - admin only."""
-    if not is_admin(message.from_user.id):
+    if not services.is_admin(message.from_user.id):
         # Silently ignore for non-admin users
         return
     
     try:
-        keyboard = create_months_keyboard()
-        await message.answer("📊 Выберите период для просмотра статистики:", reply_markup=keyboard)
+        keyboard = create_months_keyboard(services.metrics_service)
+        await services.outbound_sender.answer(message, "📊 Выберите период для просмотра статистики:", reply_markup=keyboard)
         
     except Exception as e:
         logger.error(f"Error in stats command: {str(e)}")
-        await message.answer("❌ Ошибка при получении статистики")
+        await services.outbound_sender.answer(message, "❌ Ошибка при получении статистики")
 
 @router.callback_query(F.data.startswith("stats_"))
-async def process_stats_selection(callback: CallbackQuery):
+async def process_stats_selection(callback: CallbackQuery, services: ServiceContainer):
     """Handle stats period selection."""
-    if not is_admin(callback.from_user.id):
+    if not services.is_admin(callback.from_user.id):
         await callback.answer("❌ Доступ запрещен")
         return
     
@@ -143,15 +158,14 @@ async def process_stats_selection(callback: CallbackQuery):
         
         period = callback.data.replace("stats_", "")
         
-        if period == "all":
-            all_months = metrics_service.get_all_months()
-            message = format_all_stats_message(all_months)
-        else:
-            stats = metrics_service.get_month_stats(period)
-            message = format_stats_message(period, stats)
+        message = get_stats_message(services.metrics_service, period)
         
         try:
-            await callback.message.edit_text(message, reply_markup=create_months_keyboard())
+            keyboard = create_months_keyboard(services.metrics_service)
+            await services.outbound_sender.run(
+                callback.message.chat.id,
+                lambda: callback.message.edit_text(message, reply_markup=keyboard),
+            )
         except Exception as edit_error:
             if "message is not modified" in str(edit_error).lower():
                 # Ignore this error - content is the same
@@ -161,4 +175,50 @@ async def process_stats_selection(callback: CallbackQuery):
         
     except Exception as e:
         logger.error(f"Error processing stats selection: {str(e)}")
-        await callback.message.answer("❌ Ошибка при получении статистики")
\ No newline at end of file
+        await services.outbound_sender.answer(callback.message, "❌ Ошибка при получении статистики")
+
+PERF_WINDOWS = [(300, "5 мин"), (3600, "1 час")]
+
+def format_perf_message() -> str:
+    """Format per-stage latency percentiles and the slowest recent traces."""
+    message = "⏱ Производительность (мс)\n"
+    
+    for window_seconds, window_name in PERF_WINDOWS:
+        stages = tracer.stage_percentiles(window_seconds)
+        message += f"\n<b>{window_name}</b>\n"
+        if not stages:
+            message += "❌ Данных нет\n"
+            continue
+        rows = [f"{'этап':<17}{'n':>5}{'p50':>8}{'p95':>8}{'p99':>8}"]
+        for name, stats in sorted(stages.items()):
+            rows.append(
+                f"{name:<17}{stats['count']:>5}"
+                f"{stats['p50'] * 1000:>8.0f}{stats['p95'] * 1000:>8.0f}{stats['p99'] * 1000:>8.0f}"
+            )
+        message += "<pre>" + "\n".join(rows) + "</pre>\n"
+    
+    slowest = tracer.slowest_traces(limit=5)
+    if slowest:
+        message += "\n🐢 Самые медленные запросы:\n"
+        for trace in slowest:
+            breakdown = ", ".join(
+                f"{span.name} {span.duration * 1000:.0f}" for span in trace.spans[:6]
+            )
+            message += f"<code>{trace.trace_id[:8]}</code> {trace.root.duration * 1000:.0f}"
+            message += f" — {breakdown}\n" if breakdown else "\n"
+    
+    return message
+
+@router.message(Command("perf"))
+async def handle_perf_command(message: Message, services: ServiceContainer):
+    """Handle /perf command - admin only."""
+    if not services.is_admin(message.from_user.id):
+        # Silently ignore for non-admin users
+        return
+    
+    try:
+        await services.outbound_sender.answer(message, format_perf_message())
+        
+    except Exception as e:
+        logger.error(f"Error in perf command: {str(e)}")
+        await services.outbound_sender.answer(message, "❌ Ошибка при получении статистики")
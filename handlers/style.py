@@ -1,15 +1,15 @@
+import asyncio
+
 from aiogram import Router, F
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from services.anthropic import AnthropicService
-from services.metrics import MetricsService
 from models.metrics import MetricsEvent
-from utils.telegram_formatting import format_style_result, format_error_message
-from config.config import config
+from services import ServiceContainer
+from utils.telegram_formatting import (
+    format_style_result, format_error_message, strip_transcription_header, split_long_message
+)
 from loguru import logger
 
 router = Router()
-anthropic_service = AnthropicService(config.ANTHROPIC_API_KEY)
-metrics_service = MetricsService()
 
 def get_style_keyboard() -> InlineKeyboardMarkup:
     """Create keyboard with style buttons."""
@@ -26,35 +26,75 @@ def get_style_keyboard() -> InlineKeyboardMarkup:
         ]
     )
 
+async def _send_style_result(services: ServiceContainer, callback: CallbackQuery, style: str, processed_text: str) -> None:
+    formatted_result = format_style_result(style, processed_text)
+    for part in split_long_message(formatted_result):
+        await services.outbound_sender.answer(callback.message, part)
+
+# Sent for style requests cut off by a restart; the text is not journaled, so they are not re-run
+STYLE_INTERRUPTED_MESSAGE = "⚠️ Бот перезапускался во время обработки. Нажмите кнопку стиля ещё раз."
+
 @router.callback_query(F.data.startswith("style_"))
-async def process_style_selection(callback: CallbackQuery):
+async def process_style_selection(callback: CallbackQuery, services: ServiceContainer):
     """Handle style selection."""
+    journal = services.job_journal
+    job_id = f"style:{callback.id}"
+    entry = {
+        "kind": "style",
+        "chat_id": callback.message.chat.id,
+        "chat_type": callback.message.chat.type,
+        "message_id": callback.message.message_id,
+        "user_id": callback.from_user.id,
+        "style": callback.data.replace("style_", ""),
+    }
+    if journal.begin(job_id, entry) is None:
+        return
+    services.track(asyncio.current_task())
+
+    interrupted = False
     try:
         # Show that we're processing the callback
         await callback.answer("Обрабатываю...")
         
-        # Get original text from the message (now it's clean, without prefix)
-        original_text = callback.message.text
+        # Long transcripts span several messages; prefer the full stored text
+        original_text = services.transcript_store.get(
+            services.config.BOT_NAME, callback.message.chat.id, callback.message.message_id
+        ) or strip_transcription_header(callback.message.text)
         
         # Get selected style
         style = callback.data.replace("style_", "")
         
-        logger.debug(f"Processing text with style {style}. Text length: {len(original_text)}")
+        logger.debug("Processing text with style {}. Text length: {}", style, len(original_text))
         
-        # Process text with selected style
-        processed_text = await anthropic_service.process_text(original_text, style)
+        # Answer from a speculative or earlier result when there is one
+        results = await services.style_speculator.take(str(callback.from_user.id), original_text, style)
+        if results is not None:
+            for processed_text in results:
+                await _send_style_result(services, callback, style, processed_text)
+        else:
+            # Process text with selected style, sending results in order as they arrive
+            results = []
+            async for processed_text in services.anthropic_service.process_long_text(original_text, style):
+                results.append(processed_text)
+                await _send_style_result(services, callback, style, processed_text)
+            services.style_cache.put(original_text, style, results)
         
         # Track metrics
-        metrics_service.track_event(MetricsEvent(
+        services.metrics_service.track_event(MetricsEvent(
             user_id=str(callback.from_user.id),
             event_type="llm_call",
             event_subtype=style
         ))
         
-        # Format and send result
-        formatted_result = format_style_result(style, processed_text)
-        await callback.message.answer(formatted_result)
-        
+    except asyncio.CancelledError:
+        # Cancelled by shutdown: the request stays in the journal and gets a note after the restart
+        interrupted = True
+        raise
     except Exception as e:
         logger.error(f"Error processing text: {str(e)}")
-        await callback.message.answer(format_error_message(str(e))) 
+        await services.outbound_sender.answer(callback.message, format_error_message(str(e)))
+    finally:
+        # Also when the error reply itself fails, so a restart does not send a false note
+        if not interrupted:
+            journal.finish(job_id)
+
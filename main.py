@@ -1,21 +1,73 @@
+import time
+
+PROCESS_STARTED = time.perf_counter()
+
 import asyncio
-import logging
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from config.config import config
-from handlers import voice, video, audio, style, stats, admin_whitelist
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, BareFilesPathWrapper, SimpleFilesPathWrapper, TelegramAPIServer
+from aiogram.methods import GetUpdates
+from config.config import Config, config
+from handlers import voice, video, audio, style, stats, admin_whitelist, health
+from handlers.style import STYLE_INTERRUPTED_MESSAGE
+from services import ServiceContainer
+from services.logs import setup_logging
+from services.media_pipeline import restore_message
+from services.spool import SpooledMedia
+from services.tenants import TenantMiddleware, build_tenants
+from services.telemetry import start_metrics_server
+from services.tracing import OtlpExporter, TracingMiddleware, tracer
+from utils import json_codec
+from utils.runtime import setup_runtime
 from loguru import logger
 
+IMPORTS_DONE = time.perf_counter()
+
 # Configure logging
-logging.basicConfig(level=logging.INFO)
-logger.add("bot.log", rotation="1 day", compression="zip")
+setup_logging(
+    level=config.LOG_LEVEL,
+    log_file=config.LOG_FILE,
+    console=config.LOG_CONSOLE,
+    debug_per_second=config.LOG_DEBUG_PER_SECOND,
+    max_queue=config.LOG_QUEUE_SIZE,
+)
 
-async def main():
-    # Initialize bot and dispatcher with new DefaultBotProperties
+def create_session() -> AiohttpSession:
+    """Bot API session, pointed at a custom Bot API server if configured; one is shared by all bots."""
+    api = PRODUCTION
+    if config.TELEGRAM_API_BASE:
+        wrap_local_file = BareFilesPathWrapper()
+        if config.TELEGRAM_LOCAL_SERVER_DIR and config.TELEGRAM_LOCAL_FILES_DIR:
+            wrap_local_file = SimpleFilesPathWrapper(config.TELEGRAM_LOCAL_SERVER_DIR, config.TELEGRAM_LOCAL_FILES_DIR)
+        api = TelegramAPIServer.from_base(
+            config.TELEGRAM_API_BASE, is_local=config.TELEGRAM_API_LOCAL, wrap_local_file=wrap_local_file
+        )
+    # Updates and API responses are decoded with the shared codec (orjson in the performance runtime)
+    return AiohttpSession(api=api, json_loads=json_codec.loads, json_dumps=json_codec.dumps)
+
+def create_bot(bot_config: Config = config, session: AiohttpSession | None = None) -> Bot:
+    """Create the bot for `bot_config`'s token."""
+    # Initialize bot with new DefaultBotProperties
     default = DefaultBotProperties(parse_mode=ParseMode.HTML)
-    bot = Bot(token=config.BOT_TOKEN, default=default)
-    dp = Dispatcher()
+    return Bot(token=bot_config.BOT_TOKEN, default=default, session=session or create_session())
+
+def create_dispatcher(
+    services: ServiceContainer | None = None,
+    tenants: dict[int, ServiceContainer] | None = None,
+) -> Dispatcher:
+    """Create the dispatcher with middlewares and all routers.
+    
+    The service container is passed to handlers as the `services` argument;
+    with `tenants` (bot id -> container) each bot's updates get its own.
+    """
+    dp = Dispatcher(services=services or ServiceContainer(config), tenants=tenants or {})
+    
+    # Trace every update
+    dp.update.outer_middleware(TracingMiddleware(tracer))
+    if tenants:
+        dp.update.outer_middleware(TenantMiddleware(tenants))
     
     # Register routers
     dp.include_router(voice.router)
@@ -24,12 +76,131 @@ async def main():
     dp.include_router(style.router)
     dp.include_router(stats.router)
     dp.include_router(admin_whitelist.router)
+    dp.include_router(health.router)
+    return dp
+
+def track_startup(bot: Bot, services: ServiceContainer) -> None:
+    """Log cold-start timing on the first getUpdates, then preload heavy modules."""
+    started = False
+
+    async def middleware(make_request, bot, method):
+        nonlocal started
+        if not started and isinstance(method, GetUpdates):
+            started = True
+            imports_ms = (IMPORTS_DONE - PROCESS_STARTED) * 1000
+            ready_ms = (time.perf_counter() - PROCESS_STARTED) * 1000
+            built = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in services.build_times.items())
+            logger.info(f"Cold start: imports {imports_ms:.0f} ms, first getUpdates at {ready_ms:.0f} ms ({built or 'no services built yet'})")
+            # spawn keeps a reference until the task is done; a bare create_task may be collected mid-run
+            services.spawn(services.preload())
+        return await make_request(bot, method)
+
+    bot.session.middleware(middleware)
+
+async def resume_jobs(bot: Bot, services: ServiceContainer) -> None:
+    """Re-run the jobs the previous process left unfinished, one every JOURNAL_RESUME_INTERVAL seconds.
+
+    Media jobs go through the pipeline again from the journaled file_id.
+    Style requests only get a note asking to press the button again.
+    """
+    journal = services.job_journal
+    entries = journal.pending()
+    if not entries:
+        return
+    logger.info(f"Resuming {len(entries)} unfinished jobs")
+    max_age = services.config.JOURNAL_MAX_AGE_HOURS * 3600
+    for entry in entries:
+        job_id = entry.pop("id")
+        # Telegram may have redelivered the update in the meantime
+        if not journal.is_pending(job_id):
+            continue
+        if time.time() - entry.get("ts", 0) > max_age:
+            logger.warning(f"Dropping {job_id}: too old to resume")
+            journal.finish(job_id)
+            continue
+        try:
+            if entry["kind"] == "media":
+                message, media = restore_message(bot, entry)
+                services.spawn(services.media_pipeline.process(message, entry["media_type"], media))
+            else:
+                journal.begin(job_id, entry)
+                await services.outbound_sender.run(entry["chat_id"], lambda: bot.send_message(
+                    entry["chat_id"], STYLE_INTERRUPTED_MESSAGE, reply_to_message_id=entry["message_id"]
+                ))
+                journal.finish(job_id)
+        except Exception as e:
+            logger.error(f"Could not resume {job_id}: {e}")
+            journal.finish(job_id)
+        await asyncio.sleep(services.config.JOURNAL_RESUME_INTERVAL)
+
+def schedule_resume(dp: Dispatcher) -> None:
+    """Resume every bot's journaled jobs once polling starts; stop resuming when it stops."""
+
+    tasks = []
+
+    async def on_startup(bots: list[Bot], services: ServiceContainer, tenants: dict[int, ServiceContainer]) -> None:
+        for bot in bots:
+            tasks.append(asyncio.create_task(resume_jobs(bot, tenants.get(bot.id, services))))
+
+    async def on_shutdown() -> None:
+        for task in tasks:
+            task.cancel()
+
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+async def main():
+    tenants = build_tenants(config)
+    services = tenants[0]
+    # One Bot API connection pool for all bots
+    session = create_session()
+    bots = [create_bot(tenant.config, session) for tenant in tenants]
+    dp = create_dispatcher(services, {bot.id: tenant for bot, tenant in zip(bots, tenants)})
+    track_startup(bots[0], services)
+    schedule_resume(dp)
+    services.loop_monitor.start()
+    
+    otlp_exporter = None
+    if config.OTLP_ENDPOINT:
+        otlp_exporter = OtlpExporter(config.OTLP_ENDPOINT)
+        tracer.add_exporter(otlp_exporter)
+        otlp_exporter.start()
+    
+    # Wipe media spooled by a previous run that did not shut down cleanly
+    removed = await asyncio.to_thread(SpooledMedia.purge_stale, config.SPOOL_DIR or None)
+    if removed:
+        logger.info(f"Removed {removed} stale spool files")
+    
+    # Optional Prometheus endpoint
+    metrics_runner = None
+    if config.METRICS_PORT:
+        metrics_runner = await start_metrics_server(
+            config.METRICS_HOST, config.METRICS_PORT, health=services.loop_monitor.health
+        )
+        logger.info(f"Metrics available at http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics (health at /health)")
+    if config.HEALTH_PORT:
+        services.loop_monitor.serve_health(config.METRICS_HOST, config.HEALTH_PORT)
+        logger.info(f"Readiness available at http://{config.METRICS_HOST}:{config.HEALTH_PORT}/health")
     
     # Start polling
-    logger.info("Starting bot...")
-    await dp.start_polling(bot)
+    logger.info(f"Starting {len(bots)} bot(s)...")
+    try:
+        # The session stays open so running jobs can still reply while they drain
+        await dp.start_polling(*bots, close_bot_session=False)
+    finally:
+        await asyncio.gather(*(tenant.drain(config.SHUTDOWN_GRACE_SECONDS) for tenant in tenants))
+        # The root container (first) closes the shared clients, once no bot can use them
+        for tenant in reversed(tenants):
+            await tenant.close()
+        await session.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        if otlp_exporter:
+            await otlp_exporter.stop()
 
 if __name__ == "__main__":
+    runtime = setup_runtime(config.PERFORMANCE_RUNTIME)
+    logger.info(f"Runtime: {runtime['loop']} event loop, {runtime['json']} codec")
     try:
         asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
@@ -10,6 +10,12 @@ class MonthlyMetrics(BaseModel):
     class Config:
         arbitrary_types_allowed = True
 
+class AllTimeMetrics(BaseModel):
+    unique_users: int = 0
+    transcriptions: int = 0
+    llm_calls: Dict[str, int] = {"proofread": 0, "my": 0, "business": 0, "brief": 0}
+    months: int = 0
+
 class MetricsEvent(BaseModel):
     user_id: str
     event_type: str  # "transcription" or "llm_call"
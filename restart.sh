@@ -4,14 +4,14 @@
 
 echo "🔄 Перезапуск transcription_bot v2..."
 
-# Остановка текущих контейнеров
-echo "⏹️  Остановка контейнеров..."
-docker compose down
-
-# Пересборка с обновлениями
+# Пересборка с обновлениями, пока старый контейнер ещё работает
 echo "🔨 Пересборка образа..."
 docker compose build --no-cache
 
+# Остановка текущих контейнеров (бот дожидается текущих задач)
+echo "⏹️  Остановка контейнеров..."
+docker compose down
+
 # Запуск в фоновом режиме
 echo "🚀 Запуск контейнеров..."
 docker compose up -d
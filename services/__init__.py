@@ -1,10 +1,11 @@
-from config.config import config
-
 from .access_control import AccessControlService
+from .container import ServiceContainer
+from .outbound import OutboundSender
+from .transcripts import TranscriptStore
 
-access_control_service = AccessControlService(
-    whitelist_file=config.UNLIMITED_USERS_FILE,
-    initial_users=config.UNLIMITED_USERS,
-)
-
-__all__ = ["AccessControlService", "access_control_service"]
\ No newline at end of file
+__all__ = [
+    "AccessControlService",
+    "OutboundSender",
+    "ServiceContainer",
+    "TranscriptStore",
+]
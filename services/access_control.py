@@ -1,6 +1,16 @@
-import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable, List, Set
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from utils import json_codec
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
 
 try:
     from loguru import logger
@@ -9,75 +19,186 @@ except ImportError:  # pragma: no cover
     logger = logging.getLogger(__name__)
 
 
+def normalize_user_id(user_id: str | int) -> Optional[int]:
+    """Telegram user id as an int, or None if the value is not one."""
+    if type(user_id) is int:
+        return user_id
+    try:
+        return int(str(user_id).strip())
+    except ValueError:
+        return None
+
+
 class AccessControlService:
-    """Manage a whitelist of users with unlimited access."""
+    """Manage a whitelist of users with unlimited access.
+
+    Users are kept as a set of ints, so `is_unlimited` is a plain set lookup.
+    The file is replaced atomically (temp file + rename) under an exclusive
+    lock, so a crash never leaves a truncated whitelist and concurrent edits
+    from several processes are not lost. Other processes notice a change by
+    the file's (inode, mtime, size) signature, checked at most once per
+    `reload_interval` seconds rather than on every lookup. `version` grows
+    with every change, local or reloaded.
+    """
 
     def __init__(
         self,
         whitelist_file: str = "data/unlimited_users.json",
         initial_users: Iterable[str] | None = None,
+        reload_interval: float = 5.0,
     ) -> None:
         self.whitelist_file = Path(whitelist_file)
         self.whitelist_file.parent.mkdir(parents=True, exist_ok=True)
-        self._users: Set[str] = set()
-
-        stored_users = self._load_users()
-        if stored_users:
-            self._users = stored_users
-
-        if initial_users:
-            normalized = {str(user).strip() for user in initial_users if str(user).strip()}
-            if normalized - self._users:
-                self._users.update(normalized)
-                self._save_users(self._users)
-        elif not stored_users:
-            # Ensure file exists even if there are no users yet
-            self._save_users(self._users)
-
-    def _load_users(self) -> Set[str]:
+        self.lock_file = self.whitelist_file.with_name(self.whitelist_file.name + ".lock")
+        self.reload_interval = reload_interval
+        self.version = 0
+        self._users: Set[int] = set()
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._checked_at = 0.0
+
+        with self._locked():
+            self._reload()
+            if initial_users:
+                normalized = self._normalize_all(initial_users)
+                if normalized - self._users:
+                    self._commit(self._users | normalized)
+            elif self._signature is None:
+                # Ensure file exists even if there are no users yet
+                self._commit(self._users)
+
+    @staticmethod
+    def _normalize_all(user_ids: Iterable[str | int]) -> Set[int]:
+        normalized = set()
+        for user in user_ids:
+            user_id = normalize_user_id(user)
+            if user_id is None:
+                if str(user).strip():
+                    logger.warning(f"Ignoring invalid unlimited user id {user!r}")
+                continue
+            normalized.add(user_id)
+        return normalized
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialize read-modify-write cycles across processes sharing the file."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_file, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _file_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.whitelist_file)
+        except OSError:
+            return None
+        # A rename always brings a new inode, even within the mtime granularity
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load_users(self) -> Set[int]:
         if not self.whitelist_file.exists():
             return set()
 
         try:
             with open(self.whitelist_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            return {str(user).strip() for user in data if str(user).strip()}
+                data = json_codec.load(f)
+            return self._normalize_all(data)
         except Exception as exc:
             logger.error(f"Error loading unlimited users: {exc}")
-            return set()
+            return set(self._users)
 
-    def _save_users(self, users: Set[str]) -> None:
+    def _save_users(self, users: Set[int]) -> bool:
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f".{self.whitelist_file.name}.", dir=self.whitelist_file.parent
+        )
         try:
-            with open(self.whitelist_file, "w", encoding="utf-8") as f:
-                json.dump(sorted(users), f, ensure_ascii=False, indent=2)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json_codec.dump(sorted(users), f, indent=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.whitelist_file)
+            return True
         except Exception as exc:
             logger.error(f"Error saving unlimited users: {exc}")
-
-    def is_unlimited(self, user_id: str | int) -> bool:
-        return str(user_id) in self._users
-
-    def add_user(self, user_id: str | int) -> bool:
-        normalized = str(user_id).strip()
-        if not normalized:
+            Path(tmp_path).unlink(missing_ok=True)
             return False
 
-        if normalized in self._users:
+    def _reload(self) -> None:
+        signature = self._file_signature()
+        self._checked_at = time.monotonic()
+        if signature is not None and signature == self._signature:
+            return
+        users = self._load_users()
+        self._signature = signature
+        if users != self._users:
+            self._users = users
+            self.version += 1
+
+    def _commit(self, users: Set[int]) -> bool:
+        """Write `users` and adopt them; call with the lock held."""
+        if not self._save_users(users):
             return False
-
-        self._users.add(normalized)
-        self._save_users(self._users)
-        logger.info(f"Added unlimited user {normalized}")
+        self._users = set(users)
+        self._signature = self._file_signature()
+        self.version += 1
         return True
 
+    def refresh(self, force: bool = False) -> None:
+        """Pick up changes written by other processes; cheap unless the file changed."""
+        if force or time.monotonic() - self._checked_at >= self.reload_interval:
+            self._reload()
+
+    def is_unlimited(self, user_id: str | int) -> bool:
+        self.refresh()
+        if type(user_id) is int:
+            return user_id in self._users
+        return normalize_user_id(user_id) in self._users
+
+    def add_user(self, user_id: str | int) -> bool:
+        return self.import_users([user_id]) == 1
+
     def remove_user(self, user_id: str | int) -> bool:
-        normalized = str(user_id).strip()
-        if normalized not in self._users:
+        normalized = normalize_user_id(user_id)
+        if normalized is None:
             return False
 
-        self._users.remove(normalized)
-        self._save_users(self._users)
+        with self._locked():
+            self._reload()
+            if normalized not in self._users or not self._commit(self._users - {normalized}):
+                return False
         logger.info(f"Removed unlimited user {normalized}")
         return True
 
+    def import_users(self, user_ids: Iterable[str | int], replace: bool = False) -> int:
+        """Add many users in one write; with `replace` the list becomes exactly `user_ids`.
+
+        Returns how many users were added.
+        """
+        normalized = self._normalize_all(user_ids)
+        with self._locked():
+            self._reload()
+            users = normalized if replace else self._users | normalized
+            added = len(users - self._users)
+            if users == self._users or not self._commit(users):
+                return 0
+        if added == 1 and len(normalized) == 1:
+            logger.info(f"Added unlimited user {next(iter(normalized))}")
+        else:
+            logger.info(f"Imported {added} unlimited users ({len(users)} total)")
+        return added
+
+    def export_users(self) -> str:
+        """All users, one id per line, in the format `import_users` accepts after splitting."""
+        return "\n".join(self.list_users())
+
     def list_users(self) -> List[str]:
-        return sorted(self._users)
+        self.refresh()
+        return [str(user_id) for user_id in sorted(self._users)]
+
+    def __len__(self) -> int:
+        return len(self._users)
@@ -0,0 +1,105 @@
+import asyncio
+from collections import deque
+from typing import Any, Deque, Optional, Tuple
+
+from services.pipeline import JobRejected
+from services.telemetry import ADMISSION_REJECTIONS, MEDIA_BYTES_IN_FLIGHT
+
+MB = 1024 * 1024
+
+
+class ByteBudget:
+    """Process-wide budget of media bytes held in memory, granted in FIFO order.
+
+    A request larger than the whole budget is clamped to it, so it still runs,
+    just alone.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_use = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, size: int) -> int:
+        """Wait until `size` bytes fit; returns the number of bytes reserved."""
+        size = min(size, self.capacity)
+        if not self._waiters and self.in_use + size <= self.capacity:
+            self.in_use += size
+            return size
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (size, waiter)
+        self._waiters.append(entry)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we were cancelled
+                self.release(size)
+            else:
+                self._waiters.remove(entry)
+                self._wake()
+            raise
+        return size
+
+    def release(self, size: int) -> None:
+        self.in_use = max(0, self.in_use - size)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_use + self._waiters[0][0] <= self.capacity:
+            size, waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_use += size
+                waiter.set_result(None)
+
+
+class AdmissionController:
+    """Decide from Telegram's media metadata, before any I/O, whether and when a job may run.
+
+    Files over the Bot API download limit are rejected right away instead of
+    after a failed get_file. Rate limit cost is the media duration in seconds.
+    Admitted jobs reserve their file size from a shared ByteBudget and wait
+    while memory headroom is exhausted.
+    """
+
+    def __init__(
+        self,
+        max_file_bytes: int,
+        budget_bytes: int,
+        min_cost_seconds: float = 0,
+        max_reservation: Optional[int] = None,
+    ):
+        self.max_file_bytes = max_file_bytes
+        self.min_cost_seconds = min_cost_seconds
+        # Media above the spool threshold only ever holds that much in RAM
+        self.max_reservation = max_reservation or max_file_bytes
+        self.budget = ByteBudget(budget_bytes)
+        MEDIA_BYTES_IN_FLIGHT.set_function(lambda: self.budget.in_use)
+
+    def check_size(self, media: Any, media_type: str) -> None:
+        file_size: Optional[int] = getattr(media, "file_size", None)
+        if file_size and file_size > self.max_file_bytes:
+            ADMISSION_REJECTIONS.inc(media_type=media_type, reason="too_large")
+            raise JobRejected(
+                f"📦 Файл слишком большой: {file_size / MB:.1f} МБ.\n"
+                f"Бот может скачать не больше {self.max_file_bytes / MB:.0f} МБ. "
+                "Отправьте запись короче или сожмите её, например как голосовое сообщение."
+            )
+
+    def cost(self, media: Any) -> float:
+        """Rate limit cost in audio seconds, at least `min_cost_seconds`."""
+        duration = getattr(media, "duration", None) or 0
+        return max(float(duration), self.min_cost_seconds, 1.0)
+
+    async def reserve(self, media: Any) -> int:
+        """Reserve the media's in-memory bytes from the budget; unknown sizes count as the download limit."""
+        size = getattr(media, "file_size", None) or self.max_file_bytes
+        return await self.budget.acquire(min(size, self.max_reservation))
+
+    def release(self, size: int) -> None:
+        self.budget.release(size)
@@ -1,17 +1,93 @@
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic, APIConnectionError, APIStatusError, APITimeoutError
+import asyncio
+import time
 import os
 from pathlib import Path
-import logging
+from typing import AsyncIterator, Dict, List, Tuple
 import re
 import html
 from config.config import config
+from services.model_router import ModelRouter
+from services.telemetry import QUEUE_DEPTH, STAGE_LATENCY, UPSTREAM_ERRORS
+from services.tracing import tracer
+from utils.telegram_formatting import split_long_message
 
-logger = logging.getLogger(__name__)
+try:
+    from loguru import logger
+except ImportError:  # pragma: no cover
+    import logging
+    logger = logging.getLogger(__name__)
+
+# Styles whose per-chunk results must be combined by the model, not concatenated
+MERGE_PROMPTS = {"brief": "brief_merge.md"}
+
+# The block of a prompt template that wraps the user text, e.g. <text>{text}</text>
+_TEXT_BLOCK_RE = re.compile(r'<(\w+)>\s*\{text\}\s*</\1>')
+
+# Upstream statuses worth retrying on another model (529 is "overloaded")
+_FAILOVER_STATUSES = {429, 500, 502, 503, 504, 529}
+
+_USAGE_FIELDS = ("input_tokens", "output_tokens")
 
 class AnthropicService:
-    def __init__(self, api_key: str):
-        self.client = Anthropic(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        chunk_tokens: int = 3000,
+        max_concurrency: int = 4,
+        router: ModelRouter | None = None,
+        base_url: str | None = None,
+    ):
+        # Retries are handled by failing over between models in the router
+        self.client = AsyncAnthropic(api_key=api_key, base_url=base_url or None, max_retries=0)
+        self.router = router or ModelRouter(
+            config.LLM_ROUTES, config.LLM_MAX_ERROR_RATE, config.LLM_MAX_OUTPUT_TOKENS
+        )
         self.prompts_dir = Path(__file__).parent.parent / "prompts"
+        self.chunk_tokens = chunk_tokens
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        QUEUE_DEPTH.set_function(lambda: self.waiting, queue="llm")
+        self._prompts: Dict[str, Tuple[str, str]] = {}
+        self.usage_totals: Dict[str, int] = {field: 0 for field in _USAGE_FIELDS}
+
+    @property
+    def under_pressure(self) -> bool:
+        """True when every LLM slot is busy and new requests would queue."""
+        return self._semaphore.locked()
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Rough token count; Cyrillic text averages about three characters per token."""
+        return len(text) // 3 + 1
+
+    def _max_tokens_for(self, text: str) -> int:
+        """Output budget that scales with the input instead of a fixed cap; clamped per model on sending."""
+        return min(8192, max(2048, self.estimate_tokens(text) * 2))
+
+    def split_into_chunks(self, text: str) -> List[str]:
+        """Split text into token-budgeted chunks along paragraph boundaries."""
+        budget = self.chunk_tokens * 3
+        chunks = []
+        current: List[str] = []
+        size = 0
+
+        for paragraph in text.split('\n\n'):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            # Oversized paragraphs fall back to sentence boundaries
+            pieces = split_long_message(paragraph, limit=budget) if len(paragraph) > budget else [paragraph]
+            for piece in pieces:
+                if current and size + len(piece) > budget:
+                    chunks.append('\n\n'.join(current))
+                    current, size = [], 0
+                current.append(piece)
+                size += len(piece) + 2
+
+        if current:
+            chunks.append('\n\n'.join(current))
+        return chunks
     
     def _sanitize_html(self, text: str) -> str:
         """Sanitize HTML to ensure valid Telegram formatting."""
@@ -100,60 +176,172 @@ class AnthropicService:
         
         return text.strip()
 
-    async def _load_prompt(self, prompt_file: str) -> str:
-        """Load prompt template from file."""
-        with open(self.prompts_dir / prompt_file, 'r', encoding='utf-8') as f:
-            return f.read()
+    async def _load_prompt(self, prompt_file: str) -> Tuple[str, str]:
+        """Load prompt template split into static instructions and a text wrapper.
+
+        The instructions are identical for every request of a style and go in
+        the system prompt; only the wrapper gets the user text. They are not
+        marked for prompt caching: each style's instructions (300-600 tokens)
+        are below the shortest prefix the models cache (2048 tokens for Haiku,
+        1024 for Sonnet and Opus), so a marker would never take effect.
+        """
+        if prompt_file not in self._prompts:
+            with open(self.prompts_dir / prompt_file, 'r', encoding='utf-8') as f:
+                template = f.read()
+
+            match = _TEXT_BLOCK_RE.search(template)
+            if match:
+                instructions = template[:match.start()] + template[match.end():]
+                instructions = instructions.replace('{{', '{').replace('}}', '}').strip()
+                self._prompts[prompt_file] = (instructions, match.group(0))
+            else:
+                self._prompts[prompt_file] = ("", template)
+        return self._prompts[prompt_file]
+
+    def _record_usage(self, usage) -> None:
+        """Accumulate token usage."""
+        if usage is None:
+            return
+        for field in _USAGE_FIELDS:
+            self.usage_totals[field] += getattr(usage, field, None) or 0
+        logger.debug(
+            "Token usage: input={}, output={}",
+            getattr(usage, 'input_tokens', 0),
+            getattr(usage, 'output_tokens', 0),
+        )
+
+    async def _complete(self, instructions: str, prompt: str, max_tokens: int, style: str) -> str:
+        """Send one prompt to the routed model and return sanitized text."""
+        request = {
+            "max_tokens": max_tokens,
+            "messages": [{
+                "role": "user",
+                "content": prompt
+            }],
+        }
+        if instructions:
+            request["system"] = instructions
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            with STAGE_LATENCY.time(stage="llm", style=style):
+                response = await self._create_with_failover(request, style, self.estimate_tokens(prompt))
+        finally:
+            self._semaphore.release()
+
+        if not response or not response.content:
+            raise ValueError("Empty response from Anthropic API")
+
+        self._record_usage(getattr(response, "usage", None))
+
+        # Response may contain non-text blocks (e.g. thinking) — take the first text block
+        result = next(
+            (block.text for block in response.content if getattr(block, "type", None) == "text" and block.text),
+            None,
+        )
+        if not result:
+            raise ValueError("No text content in API response")
+
+        # Sanitize HTML to ensure valid Telegram formatting
+        sanitized_result = self._sanitize_html(result)
+        logger.debug("HTML sanitization applied: original={}, sanitized={}", len(result), len(sanitized_result))
+        return sanitized_result
+
+    async def _create_with_failover(self, request: dict, style: str, input_tokens: int):
+        """Call the routed models in order until one answers in time."""
+        models, timeout = self.router.candidates(style, input_tokens)
+        last_error: Exception | None = None
+
+        for model in models:
+            logger.debug("Sending request to Anthropic API using model: {}", model)
+            started = time.monotonic()
+            try:
+                max_tokens = self.router.output_budget(model, request["max_tokens"])
+                response = await asyncio.wait_for(
+                    self.client.messages.create(model=model, **{**request, "max_tokens": max_tokens}), timeout
+                )
+            except (asyncio.TimeoutError, APITimeoutError, APIConnectionError) as e:
+                UPSTREAM_ERRORS.inc(upstream="anthropic", code="timeout")
+                last_error = e
+            except APIStatusError as e:
+                UPSTREAM_ERRORS.inc(upstream="anthropic", code=str(e.status_code))
+                if e.status_code not in _FAILOVER_STATUSES:
+                    raise
+                last_error = e
+            else:
+                self.router.record(model, time.monotonic() - started, ok=True)
+                return response
+
+            self.router.record(model, time.monotonic() - started, ok=False)
+            logger.warning(f"Model {model} failed ({type(last_error).__name__}), trying fallback")
+
+        raise last_error or ValueError("No models configured for style")
 
     async def process_text(self, text: str, style: str) -> str:
         """Process text using specified style."""
+        with tracer.span("process_text", style=style, input_length=len(text)):
+            return await self._process_text(text, style)
+
+    async def _process_text(self, text: str, style: str) -> str:
         if not text:
             raise ValueError("Input text cannot be empty")
             
         if not style:
             raise ValueError("Style must be specified")
             
-        logger.info(f"Processing text with style: {style}")
-        logger.debug(f"Input text length: {len(text)}")
+        logger.info("Processing text with style {}, input length {}", style, len(text))
         
         try:
             # Load appropriate prompt template
             prompt_file = f"{style}.md"
-            prompt_template = await self._load_prompt(prompt_file)
+            instructions, prompt_template = await self._load_prompt(prompt_file)
             
             # Format prompt with text
             prompt = prompt_template.format(text=text)
-            logger.debug(f"Formatted prompt length: {len(prompt)}")
-            
-            # Call Anthropic API (synchronously)
-            logger.info(f"Sending request to Anthropic API using model: {config.ANTHROPIC_MODEL}")
-            response = self.client.messages.create(
-                model=config.ANTHROPIC_MODEL,
-                max_tokens=2048,
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }]
-            )
-            
-            if not response or not response.content:
-                raise ValueError("Empty response from Anthropic API")
-
-            # Response may contain non-text blocks (e.g. thinking) — take the first text block
-            result = next(
-                (block.text for block in response.content if getattr(block, "type", None) == "text" and block.text),
-                None,
-            )
-            if not result:
-                raise ValueError("No text content in API response")
-            
-            # Sanitize HTML to ensure valid Telegram formatting
-            sanitized_result = self._sanitize_html(result)
-            logger.info(f"Successfully processed text (output length: {len(sanitized_result)})")
-            logger.debug(f"HTML sanitization applied: original={len(result)}, sanitized={len(sanitized_result)}")
-            
+            logger.debug("Formatted prompt length: {}", len(prompt))
+
+            sanitized_result = await self._complete(instructions, prompt, self._max_tokens_for(text), style)
+            logger.debug("Successfully processed text (output length: {})", len(sanitized_result))
+
             return sanitized_result
-            
+
         except Exception as e:
             logger.error(f"Error processing text with style {style}: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+
+    async def process_long_text(self, text: str, style: str) -> AsyncIterator[str]:
+        """Process text of any length, yielding results in order as they are ready.
+
+        Long text is split into chunks that are processed concurrently (bounded
+        by the service-wide concurrency cap). Results are yielded chunk by chunk,
+        except for styles in MERGE_PROMPTS, whose partial results are merged
+        into a single answer.
+        """
+        chunks = self.split_into_chunks(text)
+        if len(chunks) <= 1:
+            yield await self.process_text(text, style)
+            return
+
+        logger.info("Processing long text with style {} in {} chunks", style, len(chunks))
+        tasks = [asyncio.create_task(self.process_text(chunk, style)) for chunk in chunks]
+        try:
+            if style in MERGE_PROMPTS:
+                partials = await asyncio.gather(*tasks)
+                yield await self._merge(partials, style)
+            else:
+                for task in tasks:
+                    yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _merge(self, partials: List[str], style: str) -> str:
+        """Reduce per-chunk results into one coherent answer."""
+        instructions, prompt_template = await self._load_prompt(MERGE_PROMPTS[style])
+        merged_input = '\n\n---\n\n'.join(partials)
+        prompt = prompt_template.format(text=merged_input)
+        return await self._complete(instructions, prompt, self._max_tokens_for(merged_input), style)
@@ -0,0 +1,304 @@
+import asyncio
+import importlib
+import time
+from functools import cached_property, wraps
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Optional, Set, TypeVar
+
+from config.config import Config
+
+try:
+    from loguru import logger
+except ImportError:  # pragma: no cover
+    import logging
+    logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from services.access_control import AccessControlService
+    from services.admission import AdmissionController
+    from services.anthropic import AnthropicService
+    from services.deepgram import DeepgramService
+    from services.journal import JobJournal
+    from services.loop_monitor import LoopMonitor
+    from services.media_pipeline import MediaPipeline
+    from services.memory_profiler import MemoryProfiler
+    from services.metrics import MetricsService
+    from services.outbound import OutboundSender
+    from services.rate_limiter import RateLimiterService
+    from services.silence import SilenceTrimmer
+    from services.speculation import StyleSpeculator
+    from services.style_cache import StyleCache
+    from services.transcriber import Transcriber, TranscriberRouter
+    from services.transcripts import TranscriptStore
+
+# Modules too slow to import on the startup path; imported off the event loop after polling starts
+HEAVY_MODULES = ("services.anthropic",)
+
+T = TypeVar("T")
+
+
+def shared_service(build: Callable[["ServiceContainer"], T]) -> "cached_property[T]":
+    """A service built once per process: tenant containers use the root container's instance."""
+
+    @wraps(build)
+    def get(self: "ServiceContainer") -> T:
+        if self.root is not None:
+            return getattr(self.root, build.__name__)
+        return build(self)
+
+    return cached_property(get)
+
+
+class ServiceContainer:
+    """Builds each service once, on first use, and shares it across handlers.
+
+    The container is passed to handlers as the `services` keyword through the
+    Dispatcher's workflow data. Service modules are imported inside the
+    properties so that heavy SDKs are not loaded at startup.
+
+    With several bots in one process each bot has its own container, built
+    from its tenant config with `root` set to the main bot's container.
+    Quotas, whitelist, metrics, journal, outbound flood limits and the order
+    of transcription backends are per bot; `shared_service` properties (HTTP
+    clients, the transcriber router and its backend health, caches, the
+    memory budget and process-wide monitors) come from the root.
+    """
+
+    def __init__(self, config: Config, root: Optional["ServiceContainer"] = None):
+        self.config = config
+        self.root = root
+        # Seconds spent building each service, for the startup report
+        self.build_times: Dict[str, float] = {}
+        # Jobs to let finish on shutdown (media and style requests)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _timed(self, name: str, started: float) -> None:
+        self.build_times[name] = time.perf_counter() - started
+        logger.debug(f"Service {name} ready in {self.build_times[name] * 1000:.1f} ms")
+
+    @cached_property
+    def access_control_service(self) -> "AccessControlService":
+        started = time.perf_counter()
+        from services.access_control import AccessControlService
+        service = AccessControlService(
+            whitelist_file=self.config.UNLIMITED_USERS_FILE,
+            initial_users=self.config.UNLIMITED_USERS,
+            reload_interval=self.config.UNLIMITED_USERS_RELOAD_SECONDS,
+        )
+        self._timed("access_control_service", started)
+        return service
+
+    @cached_property
+    def outbound_sender(self) -> "OutboundSender":
+        from services.outbound import OutboundSender
+        return OutboundSender(
+            per_chat_rate=self.config.OUTBOUND_PER_CHAT_RATE,
+            per_chat_burst=self.config.OUTBOUND_PER_CHAT_BURST,
+            global_rate=self.config.OUTBOUND_GLOBAL_RATE,
+            global_burst=self.config.OUTBOUND_GLOBAL_RATE,
+            bot=self.config.BOT_NAME,
+        )
+
+    @shared_service
+    def transcript_store(self) -> "TranscriptStore":
+        from services.transcripts import TranscriptStore
+        return TranscriptStore(ttl_seconds=self.config.TRANSCRIPT_TTL_SECONDS)
+
+    @shared_service
+    def deepgram_service(self) -> "DeepgramService":
+        from services.deepgram import DeepgramService
+        return DeepgramService(
+            self.config.DEEPGRAM_API_KEY,
+            base_url=self.config.DEEPGRAM_BASE_URL,
+            max_attempts=self.config.DEEPGRAM_MAX_ATTEMPTS,
+        )
+
+    @shared_service
+    def transcriber_router(self) -> "TranscriberRouter":
+        from services.transcriber import TranscriberRouter
+        names = [*self.config.TRANSCRIBER_BACKENDS, *(name for bot in self.config.BOTS for name in bot.transcriber_backends or [])]
+        backends: Dict[str, "Transcriber"] = {}
+        for name in dict.fromkeys(names):
+            try:
+                backends[name] = self._build_transcriber(name)
+            except (RuntimeError, ValueError) as e:
+                logger.warning(f"Transcription backend {name} is unavailable: {e}")
+        return TranscriberRouter(
+            backends,
+            max_error_rate=self.config.TRANSCRIBER_MAX_ERROR_RATE,
+            short_clip_seconds=self.config.TRANSCRIBER_SHORT_CLIP_SECONDS,
+        )
+
+    def _build_transcriber(self, name: str) -> "Transcriber":
+        if name == "deepgram":
+            return self.deepgram_service
+        if name == "local":
+            from services.transcriber import LocalTranscriber
+            return LocalTranscriber(
+                model=self.config.LOCAL_TRANSCRIBER_MODEL,
+                threads=self.config.LOCAL_TRANSCRIBER_THREADS,
+                max_seconds=self.config.LOCAL_TRANSCRIBER_MAX_SECONDS,
+                max_concurrency=self.config.LOCAL_TRANSCRIBER_CONCURRENCY,
+            )
+        if name == "fake":
+            from services.transcriber import FakeTranscriber
+            return FakeTranscriber()
+        raise ValueError("not one of deepgram, local, fake")
+
+    @shared_service
+    def silence_trimmer(self) -> "Optional[SilenceTrimmer]":
+        if not self.config.SILENCE_TRIM_ENABLED:
+            return None
+        from services.admission import MB
+        from services.silence import SilenceTrimmer
+        try:
+            return SilenceTrimmer(
+                ffmpeg=self.config.FFMPEG_BINARY,
+                margin_db=self.config.SILENCE_MARGIN_DB,
+                max_pause=self.config.SILENCE_MAX_PAUSE_MS / 1000,
+                min_saved_seconds=self.config.SILENCE_MIN_SAVED_SECONDS,
+                max_seconds=self.config.SILENCE_TRIM_MAX_SECONDS,
+                spool_threshold=self.config.SPOOL_MEMORY_LIMIT_MB * MB,
+                spool_dir=self.config.SPOOL_DIR,
+            )
+        except RuntimeError as e:
+            logger.warning(f"SILENCE_TRIM_ENABLED is on but {e}; media is uploaded as is")
+            return None
+
+    @cached_property
+    def metrics_service(self) -> "MetricsService":
+        started = time.perf_counter()
+        from services.metrics import MetricsService
+        service = MetricsService(data_dir=self.config.DATA_DIR)
+        self._timed("metrics_service", started)
+        return service
+
+    @cached_property
+    def rate_limiter(self) -> "RateLimiterService":
+        from services.rate_limiter import RateLimiterService
+        return RateLimiterService(
+            data_dir=self.config.DATA_DIR,
+            admin_user_id=self.config.ADMIN_USER_ID,
+            is_unlimited_user=self.access_control_service.is_unlimited,
+            tiers=self.config.RATE_LIMIT_TIERS,
+        )
+
+    @shared_service
+    def anthropic_service(self) -> "AnthropicService":
+        started = time.perf_counter()
+        from services.anthropic import AnthropicService
+        service = AnthropicService(
+            self.config.ANTHROPIC_API_KEY,
+            chunk_tokens=self.config.LLM_CHUNK_TOKENS,
+            max_concurrency=self.config.LLM_MAX_CONCURRENCY,
+            base_url=self.config.ANTHROPIC_BASE_URL,
+        )
+        self._timed("anthropic_service", started)
+        return service
+
+    @shared_service
+    def style_cache(self) -> "StyleCache":
+        from services.style_cache import StyleCache
+        return StyleCache(ttl_seconds=self.config.STYLE_CACHE_TTL_SECONDS)
+
+    @cached_property
+    def style_speculator(self) -> "StyleSpeculator":
+        from services.speculation import StyleSpeculator
+        return StyleSpeculator(
+            self.anthropic_service,
+            self.metrics_service,
+            self.style_cache,
+            enabled=self.config.SPECULATIVE_STYLE_ENABLED,
+            tokens_per_hour=self.config.SPECULATIVE_TOKENS_PER_HOUR,
+            max_concurrent=self.config.SPECULATIVE_MAX_CONCURRENT,
+        )
+
+    @shared_service
+    def admission_controller(self) -> "AdmissionController":
+        from services.admission import MB, AdmissionController
+        return AdmissionController(
+            max_file_bytes=self.config.MAX_DOWNLOAD_MB * MB,
+            budget_bytes=self.config.MEDIA_BYTES_BUDGET_MB * MB,
+            min_cost_seconds=self.config.RATE_LIMIT_MIN_SECONDS,
+            max_reservation=self.config.SPOOL_MEMORY_LIMIT_MB * MB,
+        )
+
+    @cached_property
+    def job_journal(self) -> "JobJournal":
+        started = time.perf_counter()
+        from services.journal import JobJournal
+        journal = JobJournal(self.config.JOURNAL_FILE)
+        self._timed("job_journal", started)
+        return journal
+
+    @shared_service
+    def loop_monitor(self) -> "LoopMonitor":
+        from services.loop_monitor import LoopMonitor
+        return LoopMonitor(
+            interval=self.config.LOOP_MONITOR_INTERVAL_MS / 1000,
+            threshold=self.config.LOOP_STALL_THRESHOLD_MS / 1000,
+        )
+
+    @shared_service
+    def memory_profiler(self) -> "MemoryProfiler":
+        from services.memory_profiler import MemoryProfiler
+        return MemoryProfiler(frames=self.config.MEMORY_TRACE_FRAMES)
+
+    @cached_property
+    def media_pipeline(self) -> "MediaPipeline":
+        from services.media_pipeline import MediaPipeline
+        return MediaPipeline(self, self.config.PIPELINE_STAGES, queue_size=self.config.PIPELINE_QUEUE_SIZE)
+
+    def is_admin(self, user_id: int) -> bool:
+        """Whether `user_id` is this bot's admin."""
+        return user_id == self.config.ADMIN_USER_ID
+
+    def track(self, task: "asyncio.Task | None") -> None:
+        """Have `drain` wait for `task` on shutdown."""
+        if task is not None:
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def spawn(self, coro: Awaitable) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self.track(task)
+        return task
+
+    async def drain(self, timeout: float) -> None:
+        """Wait up to `timeout` seconds for tracked jobs, then cancel the rest."""
+        if not self._tasks:
+            return
+        logger.info(f"Waiting up to {timeout:.0f} s for {len(self._tasks)} running jobs")
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Cancelled {len(pending)} jobs; they will be resumed on the next start")
+            await asyncio.wait(pending)
+
+    async def close(self, grace: float = 0) -> None:
+        """Let running jobs finish for `grace` seconds, then stop background workers of services that were built.
+
+        The root container also closes the shared services, so it is closed after the other bots' containers.
+        """
+        await self.drain(grace)
+        if "media_pipeline" in self.__dict__:
+            await self.media_pipeline.stop()
+        if "job_journal" in self.__dict__:
+            self.job_journal.close()
+        # Shared services are stopped with the root container
+        if self.root is None and "loop_monitor" in self.__dict__:
+            await self.loop_monitor.stop()
+        if self.root is None and "deepgram_service" in self.__dict__:
+            await self.deepgram_service.close()
+
+    async def preload(self) -> None:
+        """Import heavy modules in a worker thread so the first style request does not stall the loop."""
+        started = time.perf_counter()
+        modules = HEAVY_MODULES + (("services.silence",) if self.config.SILENCE_TRIM_ENABLED else ())
+        for module in modules:
+            try:
+                await asyncio.to_thread(importlib.import_module, module)
+            except Exception as e:
+                # The module is imported again, and fails visibly, when the service is first used
+                logger.opt(exception=e).error(f"Preloading {module} failed")
+        self._timed("preload", started)
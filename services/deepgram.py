@@ -1,24 +1,90 @@
-from aiohttp import ClientSession, TCPConnector
-from models.transcription import TranscriptionResult, Word
+from aiohttp import ClientError, ClientSession, TCPConnector
+from models.transcription import TranscriptionResult, Word, Paragraph
+from contextlib import nullcontext
+from pathlib import Path
+from typing import BinaryIO, Callable, ContextManager, List, Optional, Tuple, Union
+import asyncio
 import ssl
 import certifi
-import json
 from loguru import logger
+from services.telemetry import BYTES_DOWNLOADED, BYTES_UPLOADED, STAGE_LATENCY, UPSTREAM_ERRORS
+from services.spool import SpooledMedia
+from services.tracing import tracer
+from services.transcriber import Transcriber
+from utils import json_codec
 
-class DeepgramService:
-    def __init__(self, api_key: str):
+# Upload errors worth another attempt with the same payload
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class DeepgramError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class DeepgramService(Transcriber):
+    """Deepgram uploads and Telegram file downloads over one pooled HTTP session.
+
+    The service is shared by every bot of the process, so connections to
+    Deepgram and to the Bot API file server are reused across bots and
+    requests. The session is opened on first use and closed by `close`.
+    """
+
+    name = "deepgram"
+
+    def __init__(self, api_key: str, base_url: str = "https://api.deepgram.com/v1/listen", max_attempts: int = 2):
         self.api_key = api_key
-        self.base_url = "https://api.deepgram.com/v1/listen"
+        self.base_url = base_url
+        self.max_attempts = max(1, max_attempts)
         self.ssl_context = ssl.create_default_context(cafile=certifi.where())
+        self._session: Optional[ClientSession] = None
+
+    @property
+    def session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(connector=TCPConnector(ssl=self.ssl_context))
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
     async def download_file(self, url: str) -> bytes:
-        async with ClientSession(connector=TCPConnector(ssl=self.ssl_context)) as session:
-            async with session.get(url) as response:
-                return await response.read()
+        with tracer.span("download_file") as span:
+            async with self.session.get(url) as response:
+                data = await response.read()
+            span.attributes["bytes"] = len(data)
+            return data
 
-    async def transcribe_audio(self, file_url: str) -> TranscriptionResult:
-        audio_data = await self.download_file(file_url)
-        
+    async def transcribe_audio(self, file_url: str, media_type: str = "") -> TranscriptionResult:
+        with tracer.span("transcribe_audio", media_type=media_type):
+            audio_data = await self.download_audio(file_url, media_type)
+            return await self.transcribe_bytes(audio_data, media_type)
+
+    async def download_audio(self, file_url: str, media_type: str = "") -> bytes:
+        with STAGE_LATENCY.time(stage="download", media_type=media_type):
+            audio_data = await self.download_file(file_url)
+        BYTES_DOWNLOADED.inc(len(audio_data), media_type=media_type)
+        return audio_data
+
+    async def download_to(self, file_url: str, spool: SpooledMedia, media_type: str = "") -> None:
+        """Stream a download into a spool buffer, chunk by chunk."""
+        with STAGE_LATENCY.time(stage="download", media_type=media_type), tracer.span("download_file") as span:
+            async with self.session.get(file_url) as response:
+                if response.status != 200:
+                    raise Exception(f"File download error: {response.status}")
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    await spool.awrite(chunk)
+            await asyncio.to_thread(spool.finish)
+            span.attributes["bytes"] = spool.size
+            span.attributes["spooled"] = spool.on_disk
+        BYTES_DOWNLOADED.inc(spool.size, media_type=media_type)
+
+    def _request_options(self) -> Tuple[dict, dict]:
         headers = {
             "Authorization": f"Token {self.api_key}",
             "Content-Type": "application/octet-stream"
@@ -32,38 +98,106 @@ class DeepgramService:
             "smart_format": "true",
             "profanity_filter": "false",
         }
+        return headers, params
 
-        async with ClientSession(connector=TCPConnector(ssl=self.ssl_context)) as session:
-            async with session.post(self.base_url, headers=headers, params=params, data=audio_data) as response:
-                result = await response.json()
-                
-                logger.debug(f"Deepgram response status: {response.status}")
-                logger.debug(f"Deepgram response: {json.dumps(result, indent=2)}")
-                
-                # Проверяем статус ответа и наличие результатов
-                if response.status != 200:
-                    raise Exception(f"Deepgram API error: {response.status}, {result}")
-                
-                if "results" not in result:
-                    raise Exception(f"No results in Deepgram response: {result}")
-                    
-                if not result["results"]["channels"]:
-                    raise Exception("No channels in Deepgram results")
-                    
-                alternative = result["results"]["channels"][0]["alternatives"][0]
+    async def transcribe_bytes(self, audio_data: bytes, media_type: str = "") -> TranscriptionResult:
+        return await self._upload(lambda: nullcontext(audio_data), len(audio_data), media_type)
+
+    async def transcribe_file(self, path: Path, media_type: str = "") -> TranscriptionResult:
+        """Stream a file from disk into the upload without loading it into memory."""
+        return await self._upload(lambda: open(path, "rb"), path.stat().st_size, media_type)
+
+    async def transcribe_spool(self, spool: SpooledMedia, media_type: str = "") -> TranscriptionResult:
+        return await self._upload(spool.reader, spool.size, media_type)
+
+    async def _upload(
+        self, open_payload: Callable[[], ContextManager], size: int, media_type: str
+    ) -> TranscriptionResult:
+        """Post the payload, reopening it for each retry instead of downloading it again."""
+        headers, params = self._request_options()
+        with STAGE_LATENCY.time(stage="transcribe", media_type=media_type), tracer.span("transcribe", media_type=media_type):
+            for attempt in range(1, self.max_attempts + 1):
+                BYTES_UPLOADED.inc(size, media_type=media_type)
+                try:
+                    with open_payload() as payload:
+                        return await self._post_audio(payload, headers, params)
+                except (DeepgramError, ClientError) as e:
+                    retryable = isinstance(e, ClientError) or e.status in _RETRY_STATUSES
+                    if not retryable or attempt == self.max_attempts:
+                        raise
+                    logger.warning(f"Deepgram upload attempt {attempt} failed, retrying: {e}")
+                    await asyncio.sleep(0.5 * attempt)
+
+    async def _post_audio(self, audio_data: Union[bytes, bytearray, BinaryIO], headers: dict, params: dict) -> TranscriptionResult:
+        async with self.session.post(self.base_url, headers=headers, params=params, data=audio_data) as response:
+            body = await response.read()
+            try:
+                result = json_codec.loads(body)
+            except ValueError:
+                # Proxies answer errors with HTML; keep the status handling below
+                if response.status == 200:
+                    raise Exception("Deepgram returned a response that is not JSON")
+                result = body[:200].decode("utf-8", "replace")
+            
+            logger.debug("Deepgram response status: {}", response.status)
+            
+            # Проверяем статус ответа и наличие результатов
+            if response.status != 200:
+                UPSTREAM_ERRORS.inc(upstream="deepgram", code=str(response.status))
+                raise DeepgramError(response.status, f"Deepgram API error: {response.status}, {result}")
+            
+            if "results" not in result:
+                raise Exception(f"No results in Deepgram response: {result}")
                 
-                # Преобразуем слова из Deepgram в наш формат
-                words = []
-                for word_data in alternative.get("words", []):
-                    words.append(Word(
-                        word=word_data["word"],
-                        start=word_data["start"],
-                        end=word_data["end"],
-                        confidence=word_data["confidence"]
-                    ))
+            if not result["results"]["channels"]:
+                raise Exception("No channels in Deepgram results")
                 
-                return TranscriptionResult(
-                    text=alternative["transcript"],
-                    confidence=alternative["confidence"],
-                    words=words
-                )
+            alternative = result["results"]["channels"][0]["alternatives"][0]
+            
+            # Преобразуем слова из Deepgram в наш формат
+            words = []
+            for word_data in alternative.get("words", []):
+                words.append(Word(
+                    word=word_data["word"],
+                    start=word_data["start"],
+                    end=word_data["end"],
+                    confidence=word_data["confidence"]
+                ))
+            
+            return TranscriptionResult(
+                text=alternative["transcript"],
+                confidence=alternative["confidence"],
+                words=words,
+                paragraphs=self._parse_paragraphs(alternative, words)
+            )
+
+    def _parse_paragraphs(self, alternative: dict, words: List[Word]) -> Optional[List[Paragraph]]:
+        """Build paragraphs from the Deepgram `paragraphs=true` output."""
+        paragraphs_data = (alternative.get("paragraphs") or {}).get("paragraphs")
+        if not paragraphs_data:
+            return None
+
+        paragraphs = []
+        word_index = 0
+        for paragraph_data in paragraphs_data:
+            text = " ".join(
+                sentence["text"] for sentence in paragraph_data.get("sentences", []) if sentence.get("text")
+            )
+            if not text:
+                continue
+
+            # Words are ordered in time, so each paragraph takes the next slice
+            paragraph_words = []
+            while word_index < len(words) and words[word_index].start < paragraph_data["end"]:
+                paragraph_words.append(words[word_index])
+                word_index += 1
+
+            paragraphs.append(Paragraph(
+                text=text,
+                start=paragraph_data["start"],
+                end=paragraph_data["end"],
+                words=paragraph_words,
+                speaker=paragraph_data.get("speaker")
+            ))
+
+        return paragraphs or None
@@ -0,0 +1,141 @@
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TextIO
+
+from utils import json_codec
+
+try:
+    from loguru import logger
+except ImportError:  # pragma: no cover
+    import logging
+    logger = logging.getLogger(__name__)
+
+
+class JobJournal:
+    """Write-ahead log of accepted jobs, so work interrupted by a restart can be picked up again.
+
+    Each job is a JSON line `begin` record with its metadata (chat, message,
+    user, file_id, ...), followed by one record per finished stage and a
+    final `done`. Audio and transcript text are never written. Records are
+    flushed to the OS on every write but not fsynced, which survives a
+    process restart, not a power loss.
+
+    Jobs that were unfinished when the journal was opened are `pending()`.
+    They stay in the file until they are begun again, either by the resume
+    loop or by Telegram redelivering the same update, and then finished. The
+    ids of recently finished jobs are remembered, so a redelivered update is
+    not processed twice. The file is rewritten with only the live entries
+    on open and every `compact_every` records.
+    """
+
+    def __init__(self, path: str = "data/jobs.journal", compact_every: int = 1000, remember_done: int = 1000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.compact_every = compact_every
+        self.remember_done = remember_done
+        self._active: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._done: "OrderedDict[str, None]" = OrderedDict()
+        self._file: Optional[TextIO] = None
+        self._records = 0
+
+        self._replay()
+        # Whatever was running when the previous process stopped
+        self._pending, self._active = self._active, {}
+        self._compact()
+
+    def _replay(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+
+        for line in lines:
+            try:
+                record = json_codec.loads(line)
+            except ValueError:
+                # A torn last line from a crash mid-write
+                logger.warning(f"Skipping unreadable job journal record: {line[:80]!r}")
+                continue
+            job_id = record.get("id")
+            op = record.get("op")
+            if op == "begin":
+                self._active[job_id] = record["entry"]
+            elif op == "stage" and job_id in self._active:
+                self._active[job_id]["stage"] = record["stage"]
+            elif op == "done":
+                self._active.pop(job_id, None)
+                self._remember(job_id)
+
+    def _remember(self, job_id: str) -> None:
+        self._done[job_id] = None
+        while len(self._done) > self.remember_done:
+            self._done.popitem(last=False)
+
+    def _compact(self) -> None:
+        """Rewrite the file with live entries and the remembered ids only."""
+        if self._file is not None:
+            self._file.close()
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{self.path.name}.", dir=self.path.parent)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for job_id in self._done:
+                f.write(json_codec.dumps({"op": "done", "id": job_id}) + "\n")
+            for entries in (self._pending, self._active):
+                for job_id, entry in entries.items():
+                    f.write(json_codec.dumps({"op": "begin", "id": job_id, "entry": entry}) + "\n")
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._records = 0
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._file.write(json_codec.dumps(record) + "\n")
+        self._file.flush()
+        self._records += 1
+        if self._records >= self.compact_every:
+            self._compact()
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Entries left unfinished by the previous process that nobody has begun again yet."""
+        return [dict(entry, id=job_id) for job_id, entry in self._pending.items()]
+
+    def is_pending(self, job_id: str) -> bool:
+        return job_id in self._pending
+
+    def begin(self, job_id: str, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Record an accepted job; returns None for a duplicate of a running or finished one.
+
+        For a job resumed from the previous run the returned entry carries the
+        last `stage` it completed.
+        """
+        if job_id in self._active or job_id in self._done:
+            return None
+        previous = self._pending.pop(job_id, None)
+        if previous is not None:
+            entry = dict(previous)
+        else:
+            entry = dict(entry, ts=time.time())
+        self._active[job_id] = entry
+        self._write({"op": "begin", "id": job_id, "entry": entry})
+        return entry
+
+    def advance(self, job_id: str, stage: str) -> None:
+        entry = self._active.get(job_id)
+        if entry is None:
+            return
+        entry["stage"] = stage
+        self._write({"op": "stage", "id": job_id, "stage": stage})
+
+    def finish(self, job_id: str) -> None:
+        if self._active.pop(job_id, None) is None and self._pending.pop(job_id, None) is None:
+            return
+        self._remember(job_id)
+        self._write({"op": "done", "id": job_id})
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
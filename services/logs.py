@@ -0,0 +1,277 @@
+"""Logging setup: one loguru pipeline for our code and stdlib loggers, written off the event loop.
+
+Records are queued by a loguru sink and rendered and written by a single
+background thread, as JSON lines to the log file and as text to stderr.
+The event loop only pays for building the record. DEBUG records are
+sampled per call site, and a full queue drops records instead of blocking.
+"""
+
+import atexit
+import gzip
+import inspect
+import json
+import logging
+import queue
+import shutil
+import sys
+import threading
+import time
+import traceback
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+from loguru import logger
+
+from services.telemetry import LOG_RECORDS_DROPPED
+from services.tracing import current_trace_id
+
+_DEBUG_NO = logger.level("DEBUG").no
+# Per-update and per-request INFO lines from libraries; tracing already records
+# both, so below DEBUG they only cost event loop time
+_CHATTY_LOGGERS = ("aiogram.event", "httpx")
+# Bound by the patcher from the current trace; a top-level field in JSON lines
+_TRACE_KEY = "trace_id"
+
+
+def _add_trace_id(record: Dict[str, Any]) -> None:
+    trace_id = current_trace_id()
+    if trace_id and _TRACE_KEY not in record["extra"]:
+        record["extra"][_TRACE_KEY] = trace_id
+
+
+def _format_exception(record: Dict[str, Any]) -> Optional[str]:
+    exception = record["exception"]
+    if exception is None:
+        return None
+    return "".join(traceback.format_exception(exception.type, exception.value, exception.traceback))
+
+
+class InterceptHandler(logging.Handler):
+    """Route stdlib logging (aiogram, aiohttp, the Anthropic SDK) into loguru."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+
+        # Report the stdlib caller, not this handler, as the record's origin
+        frame, depth = inspect.currentframe(), 0
+        while frame and (depth == 0 or frame.f_code.co_filename == logging.__file__):
+            frame = frame.f_back
+            depth += 1
+        logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
+
+
+class DebugSampler:
+    """Loguru filter passing at most `per_second` DEBUG records per call site each second.
+
+    The number of records dropped at a site is attached as `extra["sampled_out"]`
+    to the next record that passes there. 0 disables sampling.
+    """
+
+    def __init__(self, per_second: int):
+        self.per_second = per_second
+        # (module, line) -> [window start, records passed, records dropped]
+        self._sites: Dict[Tuple[str, int], List] = {}
+
+    def __call__(self, record: Dict[str, Any]) -> bool:
+        if record["level"].no > _DEBUG_NO or not self.per_second:
+            return True
+
+        now = time.monotonic()
+        site = self._sites.get((record["name"], record["line"]))
+        if site is None:
+            self._sites[(record["name"], record["line"])] = [now, 1, 0]
+            return True
+        if now - site[0] >= 1.0:
+            if site[2]:
+                record["extra"]["sampled_out"] = site[2]
+            site[:] = [now, 1, 0]
+            return True
+        if site[1] < self.per_second:
+            site[1] += 1
+            return True
+        site[2] += 1
+        LOG_RECORDS_DROPPED.inc(reason="sampled")
+        return False
+
+
+class JsonFileWriter:
+    """JSON lines file, rotated daily to `<stem>.<date><suffix>.gz`."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._file: Optional[TextIO] = None
+        self._day: Optional[date] = None
+
+    def write(self, record: Dict[str, Any]) -> None:
+        day = record["time"].date()
+        if day != self._day:
+            self._rotate(day)
+        extra = dict(record["extra"])
+        entry = {
+            "ts": record["time"].isoformat(),
+            "level": record["level"].name,
+            "logger": record["name"],
+            "func": record["function"],
+            "line": record["line"],
+            "msg": record["message"],
+        }
+        trace_id = extra.pop(_TRACE_KEY, None)
+        if trace_id:
+            entry[_TRACE_KEY] = trace_id
+        if extra:
+            entry["extra"] = extra
+        exception = _format_exception(record)
+        if exception:
+            entry["exc"] = exception
+        self._file.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    def _rotate(self, day: date) -> None:
+        if self._file is None:
+            # Resume today's file after a restart; archive an older one
+            try:
+                written = date.fromtimestamp(self.path.stat().st_mtime)
+            except OSError:
+                written = day
+            if written != day:
+                self._archive(written)
+        else:
+            self._file.close()
+            self._archive(self._day)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._day = day
+
+    def _archive(self, day: date) -> None:
+        archived = self.path.with_name(f"{self.path.stem}.{day.isoformat()}{self.path.suffix}.gz")
+        try:
+            with open(self.path, "rb") as source, gzip.open(archived, "ab") as target:
+                shutil.copyfileobj(source, target)
+            self.path.unlink()
+        except OSError as e:
+            sys.stderr.write(f"Could not rotate {self.path}: {e}\n")
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class TextStreamWriter:
+    """Human-readable lines for the console."""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = (
+            f"{record['time']:%Y-%m-%d %H:%M:%S.%f}"[:-3]
+            + f" | {record['level'].name:<8} | {record['name']}:{record['function']}:{record['line']}"
+            + f" - {record['message']}"
+        )
+        trace_id = record["extra"].get(_TRACE_KEY)
+        if trace_id:
+            line += f" [{trace_id[:8]}]"
+        exception = _format_exception(record)
+        self.stream.write(line + "\n" + (exception or ""))
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def close(self) -> None:
+        self.flush()
+
+
+class BackgroundSink:
+    """Loguru sink handing records to a writer thread through a bounded queue.
+
+    Writers are flushed whenever the queue runs empty, so bursts are written
+    in batches. When the queue is full the record is dropped and counted;
+    logging never blocks the caller.
+    """
+
+    def __init__(self, writers: List[Any], max_queue: int = 10000):
+        self.writers = writers
+        self.max_queue = max_queue
+        # SimpleQueue is lock-free on the put side; the bound is checked via qsize()
+        self._queue: "queue.SimpleQueue[Optional[Dict[str, Any]]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def __call__(self, message: Any) -> None:
+        if self._queue.qsize() >= self.max_queue:
+            LOG_RECORDS_DROPPED.inc(reason="queue_full")
+            return
+        self._queue.put(message.record)
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            for writer in self.writers:
+                try:
+                    writer.write(record)
+                except Exception as e:  # pragma: no cover - never let the writer thread die
+                    sys.stderr.write(f"Log writer {type(writer).__name__} failed: {e}\n")
+            if self._queue.empty():
+                for writer in self.writers:
+                    writer.flush()
+        for writer in self.writers:
+            writer.close()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Write out queued records and close the writers."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+_sink: Optional[BackgroundSink] = None
+
+
+def setup_logging(
+    level: str = "INFO",
+    log_file: str = "bot.log",
+    console: bool = True,
+    debug_per_second: int = 10,
+    max_queue: int = 10000,
+) -> BackgroundSink:
+    """Send loguru and stdlib logging through one background sink; safe to call again."""
+    global _sink
+    logger.remove()
+    stop_logging()
+    logger.configure(patcher=_add_trace_id)
+
+    writers: List[Any] = []
+    if log_file:
+        writers.append(JsonFileWriter(log_file))
+    if console:
+        writers.append(TextStreamWriter(sys.stderr))
+    _sink = BackgroundSink(writers, max_queue)
+    # format only matters for message.record's str(); rendering is done by the writers
+    logger.add(_sink, level=level, format="{message}", filter=DebugSampler(debug_per_second), catch=True)
+
+    # Third-party debug output stays off unless asked for explicitly
+    level_no = logger.level(level).no
+    logging.basicConfig(handlers=[InterceptHandler()], level=max(logging.INFO, level_no), force=True)
+    for name in _CHATTY_LOGGERS:
+        logging.getLogger(name).setLevel(logging.DEBUG if level_no <= _DEBUG_NO else logging.WARNING)
+    return _sink
+
+
+def stop_logging() -> None:
+    global _sink
+    if _sink is not None:
+        _sink.stop()
+        _sink = None
+
+
+atexit.register(stop_logging)
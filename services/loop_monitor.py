@@ -0,0 +1,186 @@
+"""Event loop lag monitor with a watchdog thread that captures what is blocking the loop."""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from services.telemetry import LOOP_LAG, LOOP_STALLS
+from utils import json_codec
+
+try:
+    from loguru import logger
+except ImportError:  # pragma: no cover
+    import logging
+    logger = logging.getLogger(__name__)
+
+# Innermost frames kept from the stack of a blocked loop
+STACK_DEPTH = 15
+
+
+@dataclass
+class Stall:
+    started: float  # wall clock
+    duration: float
+    stack: str
+
+
+class LoopMonitor:
+    """Measure event loop lag and report stalls with the stack of whatever blocks the loop.
+
+    A task sleeps `interval` seconds and records how late it wakes up; the
+    last `window` seconds of lags give the percentiles. A watchdog thread
+    checks the task's heartbeat and, once the loop has not come round for
+    `threshold` seconds, captures the loop thread's stack, logs it and keeps
+    it in `stalls`. The loop counts as not ready while stalled and for
+    `ready_window` seconds after a lag above the threshold.
+
+    A /health endpoint served by the event loop cannot answer while the loop
+    is blocked; `serve_health` answers it from a thread instead, so a probe
+    gets a 503 during a stall rather than a timeout.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        threshold: float = 0.5,
+        window: float = 60.0,
+        ready_window: float = 5.0,
+        keep_stalls: int = 20,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.ready_window = ready_window
+        # (monotonic time, lag) per wake-up
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=max(1, int(window / interval)))
+        self.stalls: Deque[Stall] = deque(maxlen=keep_stalls)
+        self._beat = time.monotonic()
+        self._current: Optional[Stall] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._health_server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> None:
+        """Start monitoring the running loop."""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+        if self._health_server is not None:
+            await asyncio.to_thread(self._health_server.shutdown)
+            self._health_server.server_close()
+            self._health_server = None
+
+    def serve_health(self, host: str, port: int) -> int:
+        """Answer GET /health from a thread of its own; returns the bound port."""
+        monitor = self
+
+        class HealthHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path != "/health":
+                    self.send_error(404)
+                    return
+                report = monitor.health()
+                body = json_codec.dumps(report).encode("utf-8")
+                self.send_response(200 if report["ready"] else 503)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._health_server = ThreadingHTTPServer((host, port), HealthHandler)
+        self._health_server.daemon_threads = True
+        threading.Thread(target=self._health_server.serve_forever, name="health", daemon=True).start()
+        return self._health_server.server_address[1]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self._beat = now = time.monotonic()
+            self._samples.append((now, lag))
+            LOOP_LAG.observe(lag)
+            stall = self._current
+            if stall is not None:
+                self._current = None
+                stall.duration = lag
+                logger.warning(f"Event loop was blocked for {lag * 1000:.0f} ms")
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.threshold / 4):
+            blocked = time.monotonic() - self._beat - self.interval
+            if blocked < self.threshold or self._current is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame, limit=STACK_DEPTH)) if frame else ""
+            # The duration is filled in by the loop once it comes round
+            stall = Stall(started=time.time() - blocked, duration=blocked, stack=stack)
+            self._current = stall
+            self.stalls.append(stall)
+            LOOP_STALLS.inc()
+            logger.warning(f"Event loop blocked for over {blocked * 1000:.0f} ms in:\n{stack}")
+
+    @property
+    def stalled(self) -> bool:
+        return self._current is not None
+
+    def percentiles(self) -> Dict[str, float]:
+        """Lag percentiles in seconds over the window; empty before the first sample."""
+        # Copied first: the health thread reads while the loop appends
+        lags = sorted(lag for _, lag in list(self._samples))
+        if not lags:
+            return {}
+
+        def pick(q: float) -> float:
+            return lags[min(len(lags) - 1, int(q * len(lags)))]
+
+        return {"p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": lags[-1]}
+
+    def ready(self) -> bool:
+        if self._task is None:
+            return True
+        if self.stalled or time.monotonic() - self._beat > self.interval + self.threshold:
+            return False
+        since = time.monotonic() - self.ready_window
+        return all(lag < self.threshold for at, lag in list(self._samples) if at >= since)
+
+    def health(self) -> Dict[str, Any]:
+        """Readiness and lag summary for the /health endpoint."""
+        return {
+            "ready": self.ready(),
+            "lag_ms": {name: round(value * 1000, 1) for name, value in self.percentiles().items()},
+            "stalls": len(self.stalls),
+            "threshold_ms": self.threshold * 1000,
+        }
+
+    def recent_stalls(self, limit: int = 3) -> List[Stall]:
+        return list(self.stalls)[-limit:]
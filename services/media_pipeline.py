@@ -0,0 +1,354 @@
+import asyncio
+import math
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.types import Audio, Chat, InlineKeyboardMarkup, Message, User, Video, VideoNote, Voice
+from aiogram.utils.chat_action import ChatActionSender
+
+from config.config import PipelineStage, RateTier
+from models.metrics import MetricsEvent
+from models.transcription import TranscriptionResult
+from services.admission import MB
+from services.pipeline import Job, JobRejected, Pipeline, Stage
+from services.spool import SpooledMedia
+from services.telemetry import (
+    JOB_BUFFERED_BYTES, JOB_PEAK_BYTES, JOBS_IN_FLIGHT, RATE_LIMIT_REJECTIONS, STAGE_LATENCY,
+)
+from services.tracing import current_trace, tracer
+from utils.formatting import format_transcription, transcription_text
+from utils.telegram_formatting import format_error_message, format_transcription_header
+
+try:
+    from loguru import logger
+except ImportError:  # pragma: no cover
+    import logging
+    logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from services.container import ServiceContainer
+    from services.silence import TimeMap
+
+STAGES = ("admit", "fetch", "prepare", "transcribe", "account", "render", "deliver")
+
+_PERIOD_NAMES = {60: "в минуту", 3600: "в час", 86400: "в сутки"}
+
+# Stages after which the job has been charged to the user's quota
+_ACCOUNTED_STAGES = {"account", "render", "deliver"}
+
+# What the job journal keeps of the media: enough to fetch it again, no file names or captions
+_JOURNAL_MEDIA_FIELDS = ("file_id", "file_unique_id", "duration", "file_size", "width", "height", "length")
+_MEDIA_TYPES = {"voice": Voice, "audio": Audio, "video": Video, "video_note": VideoNote}
+
+# Memory held by one transcript Word with its strings and floats, measured with tracemalloc
+WORD_BYTES = 1100
+
+
+def journal_entry(message: Message, media_type: str, media: Any) -> Dict[str, Any]:
+    """Job journal metadata for a media message."""
+    return {
+        "kind": "media",
+        "chat_id": message.chat.id,
+        "chat_type": message.chat.type,
+        "message_id": message.message_id,
+        "user_id": message.from_user.id,
+        "media_type": media_type,
+        "media": {
+            field: getattr(media, field)
+            for field in _JOURNAL_MEDIA_FIELDS
+            if getattr(media, field, None) is not None
+        },
+    }
+
+
+def buffered_bytes(job: "MediaJob") -> int:
+    """Estimate of the bytes a job holds in memory: media buffered in RAM, the transcript and the reply.
+
+    Cheap enough to run after every stage; spooled-to-disk media is not counted.
+    """
+    held = 0
+    if job.spool is not None and not job.spool.on_disk:
+        held += job.spool.size
+    if job.result is not None:
+        held += sys.getsizeof(getattr(job.result, "text", "")) + len(getattr(job.result, "words", ())) * WORD_BYTES
+    held += sum(sys.getsizeof(part) for part in job.parts)
+    return held
+
+
+def restore_message(bot: Bot, entry: Dict[str, Any]) -> Tuple[Message, Any]:
+    """Rebuild a journaled media message well enough to run it through the pipeline again."""
+    media = _MEDIA_TYPES[entry["media_type"]](**entry["media"])
+    message = Message(
+        message_id=entry["message_id"],
+        date=datetime.fromtimestamp(entry["ts"], timezone.utc),
+        chat=Chat(id=entry["chat_id"], type=entry["chat_type"]),
+        from_user=User(id=entry["user_id"], is_bot=False, first_name=""),
+        **{entry["media_type"]: media},
+    ).as_(bot)
+    return message, media
+
+
+def _tier_period_name(period: float) -> str:
+    return _PERIOD_NAMES.get(int(period), f"за {_format_duration(period)}")
+
+
+def _rate_limit_reply(tier: RateTier, wait: float, min_cost: float) -> str:
+    """Rejection text for a full quota tier; names the minimum charge, which dominates for short clips."""
+    reply = f"⏰ Вы превысили лимит: {_format_duration(tier.limit)} аудио {_tier_period_name(tier.period)}.\n"
+    if min_cost > 1:
+        reply += (
+            f"Каждый файл засчитывается как минимум {_format_duration(min_cost)}, "
+            f"так что короткими записями это {_count_files(int(tier.limit // min_cost))} {_tier_period_name(tier.period)}.\n"
+        )
+    return reply + f"Попробуйте снова через {_format_duration(wait)}. Нужно больше? Напишите @shimaoz"
+
+
+def _count_files(count: int) -> str:
+    if count % 10 == 1 and count % 100 != 11:
+        return f"{count} файл"
+    if 2 <= count % 10 <= 4 and not 12 <= count % 100 <= 14:
+        return f"{count} файла"
+    return f"{count} файлов"
+
+
+def _format_duration(seconds: float) -> str:
+    """Round up to whole minutes: "2 ч 5 мин", "7 мин"."""
+    minutes = max(1, math.ceil(seconds / 60))
+    hours, minutes = divmod(minutes, 60)
+    if hours and minutes:
+        return f"{hours} ч {minutes} мин"
+    return f"{hours} ч" if hours else f"{minutes} мин"
+
+
+class MediaJob(Job):
+    """One voice, audio, video or video_note message on its way through the pipeline."""
+
+    def __init__(self, message: Message, media_type: str, media: Any):
+        super().__init__(current_trace())
+        self.message = message
+        self.media_type = media_type
+        self.media = media
+        self.user_id = str(message.from_user.id)
+        self.journal_id = ""
+        # Last stage completed before a restart, for jobs resumed from the journal
+        self.resumed_stage: Optional[str] = None
+        self.cost = 1
+        self.reserved_bytes = 0
+        self.file_url = ""
+        self.local_path: Optional[Path] = None
+        self.spool: Optional[SpooledMedia] = None
+        # Set when long pauses were cut before upload; maps word times back to the original
+        self.time_map: Optional["TimeMap"] = None
+        self.result: Optional[TranscriptionResult] = None
+        self.header = ""
+        self.parts: List[str] = []
+        self.reply_markup: Optional[InlineKeyboardMarkup] = None
+        self.peak_bytes = 0
+
+
+class MediaPipeline:
+    """The transcription flow shared by the voice, audio, video and video_note handlers.
+
+    admit → fetch → prepare → transcribe → account → render → deliver, each a
+    stage with its own worker pool and timeout (see PIPELINE_STAGES), so the
+    download of one job overlaps with the transcription of another.
+    """
+
+    def __init__(self, services: "ServiceContainer", stages: Dict[str, PipelineStage], queue_size: int = 16):
+        self.services = services
+        self.pipeline = Pipeline(
+            "media",
+            [Stage(name, getattr(self, f"_{name}"), stages[name].concurrency, stages[name].timeout) for name in STAGES],
+            queue_size=queue_size,
+            on_stage_done=self._stage_done,
+            bot=services.config.BOT_NAME,
+        )
+
+    async def process(self, message: Message, media_type: str, media: Any) -> None:
+        """Transcribe a media message and reply with the result or an error.
+
+        The job is journaled until it is answered; if the process stops
+        first, it is resumed on the next start. Duplicates of a running or
+        answered job (e.g. an update redelivered after a restart) are dropped.
+        """
+        journal = self.services.job_journal
+        job = MediaJob(message, media_type, media)
+        job.journal_id = f"media:{message.chat.id}:{message.message_id}"
+        entry = journal.begin(job.journal_id, journal_entry(message, media_type, media))
+        if entry is None:
+            logger.info("Skipping {}: already being processed or answered", job.journal_id)
+            return
+        job.resumed_stage = entry.get("stage")
+
+        self.services.track(asyncio.current_task())
+        JOBS_IN_FLIGHT.inc(media_type=media_type)
+        interrupted = False
+        try:
+            try:
+                async with ChatActionSender.typing(bot=message.bot, chat_id=message.chat.id):
+                    await self.pipeline.submit(job)
+            except asyncio.CancelledError:
+                # Cancelled by shutdown: the job stays in the journal and is resumed
+                interrupted = True
+                raise
+            except JobRejected as e:
+                await self.services.outbound_sender.answer(message, e.reply)
+            except Exception as e:
+                # The traceback is rendered by the log writer thread, not here
+                logger.opt(exception=e).error("Error processing {} message", media_type)
+                await self.services.outbound_sender.answer(message, format_error_message(str(e)))
+        finally:
+            # Also when the reply fails, so the job is not run again after a restart
+            if not interrupted:
+                journal.finish(job.journal_id)
+            self._release(job)
+            await self._discard_media(job)
+            JOBS_IN_FLIGHT.dec(media_type=media_type)
+            if job.peak_bytes:
+                JOB_PEAK_BYTES.observe(job.peak_bytes, media_type=media_type)
+
+    async def stop(self) -> None:
+        await self.pipeline.stop()
+
+    def _stage_done(self, job: MediaJob, stage: str) -> None:
+        if job.journal_id:
+            self.services.job_journal.advance(job.journal_id, stage)
+        held = buffered_bytes(job)
+        job.peak_bytes = max(job.peak_bytes, held)
+        JOB_BUFFERED_BYTES.observe(held, media_type=job.media_type, stage=stage)
+
+    def _release(self, job: MediaJob) -> None:
+        if job.reserved_bytes:
+            self.services.admission_controller.release(job.reserved_bytes)
+            job.reserved_bytes = 0
+
+    async def _discard_media(self, job: MediaJob) -> None:
+        """Drop the job's copy of the media, wherever it is; nothing outlives the upload."""
+        if job.spool is not None:
+            spool, job.spool = job.spool, None
+            await spool.aclose()
+        if job.local_path and self.services.config.TELEGRAM_LOCAL_DELETE_FILES:
+            try:
+                job.local_path.unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"Could not delete {job.local_path}: {e}")
+        job.local_path = None
+
+    @staticmethod
+    def _resolve_local_path(bot, file_path: str) -> Optional[Path]:
+        """Map a local Bot API server's file path to a readable file here, if there is one."""
+        api = bot.session.api
+        if not api.is_local:
+            return None
+        try:
+            path = Path(api.wrap_local_file.to_local(file_path))
+        except ValueError:
+            return None
+        return path if path.is_absolute() and path.is_file() else None
+
+    # --- stages ------------------------------------------------------------
+
+    async def _admit(self, job: MediaJob) -> None:
+        admission = self.services.admission_controller
+        rate_limiter = self.services.rate_limiter
+        # Metadata checks first: nothing is downloaded for media that cannot be processed
+        admission.check_size(job.media, job.media_type)
+        job.cost = admission.cost(job.media)
+
+        # A job resumed after a restart was admitted before it
+        wait, tier = rate_limiter.check(job.user_id, job.cost) if job.resumed_stage is None else (0, None)
+        if wait > 0:
+            RATE_LIMIT_REJECTIONS.inc(media_type=job.media_type)
+            raise JobRejected(_rate_limit_reply(tier, wait, admission.min_cost_seconds))
+
+        # Wait for memory headroom before the media is downloaded
+        with tracer.span("admission_wait"):
+            job.reserved_bytes = await admission.reserve(job.media)
+
+    async def _fetch(self, job: MediaJob) -> None:
+        bot = job.message.bot
+        with STAGE_LATENCY.time(stage="get_file", media_type=job.media_type), tracer.span("get_file"):
+            file = await bot.get_file(job.media.file_id)
+        logger.debug("Processing {} message of {} bytes", job.media_type, job.media.file_size)
+
+        # A local Bot API server has already stored the file; stream it from disk
+        job.local_path = self._resolve_local_path(bot, file.file_path)
+        if job.local_path:
+            self._release(job)
+            return
+
+        job.file_url = bot.session.api.file_url(bot.token, file.file_path)
+        config = self.services.config
+        job.spool = SpooledMedia(config.SPOOL_MEMORY_LIMIT_MB * MB, config.SPOOL_DIR)
+        await self.services.deepgram_service.download_to(job.file_url, job.spool, job.media_type)
+
+    async def _prepare(self, job: MediaJob) -> None:
+        size = job.local_path.stat().st_size if job.local_path else job.spool.size
+        if not size:
+            raise ValueError("Не удалось скачать файл: пустой ответ от Telegram")
+
+        trimmer = self.services.silence_trimmer
+        if trimmer is None or not trimmer.accepts(getattr(job.media, "duration", None)):
+            return
+        try:
+            trimmed = await asyncio.wait_for(
+                trimmer.trim(job.local_path or job.spool, job.media_type), self.services.config.SILENCE_TRIM_TIMEOUT
+            )
+        except Exception as e:
+            logger.warning(f"Silence trimming failed, uploading the media as is: {e!r}")
+            return
+        if trimmed is None:
+            return
+        # Only the trimmed copy is uploaded; the original goes now
+        spool, job.time_map = trimmed
+        await self._discard_media(job)
+        job.spool = spool
+
+    async def _transcribe(self, job: MediaJob) -> None:
+        router = self.services.transcriber_router
+        duration = job.time_map.duration if job.time_map else getattr(job.media, "duration", None) or None
+        order = self.services.config.TRANSCRIBER_BACKENDS
+        if job.local_path:
+            job.result = await router.transcribe_file(job.local_path, job.media_type, duration, order)
+        else:
+            job.result = await router.transcribe_spool(job.spool, job.media_type, duration, order)
+        if job.time_map is not None:
+            job.result = job.time_map.apply(job.result)
+        # Media and transcript are both held only here
+        job.peak_bytes = max(job.peak_bytes, buffered_bytes(job))
+        # The media is no longer needed; free it and its budget before the job waits in later queues
+        self._release(job)
+        await self._discard_media(job)
+
+    async def _account(self, job: MediaJob) -> None:
+        if job.resumed_stage in _ACCOUNTED_STAGES:
+            return
+        self.services.metrics_service.track_event(MetricsEvent(
+            user_id=job.user_id,
+            event_type="transcription"
+        ))
+        self.services.rate_limiter.record_request(job.user_id, cost=job.cost)
+
+    async def _render(self, job: MediaJob) -> None:
+        job.header = format_transcription_header(job.result.confidence)
+        job.parts, job.reply_markup = format_transcription(job.result, job.header)
+
+    async def _deliver(self, job: MediaJob) -> None:
+        message = job.message
+        # Send header merged into the first part, keyboard on the last one
+        sent = await self.services.outbound_sender.send_parts(
+            message, job.parts, header=job.header, reply_markup=job.reply_markup
+        )
+        text = transcription_text(job.result)
+
+        # Style buttons only see the last part; keep the full text for them
+        if sent and len(job.parts) > 1:
+            self.services.transcript_store.put(
+                self.services.config.BOT_NAME, message.chat.id, sent[-1].message_id, text
+            )
+
+        # Start the style this user most likely wants before they press it
+        self.services.style_speculator.speculate(job.user_id, text)
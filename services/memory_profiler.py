@@ -0,0 +1,110 @@
+"""On-demand allocation tracing with tracemalloc, plus process and container memory readings."""
+
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Allocations made by tracing itself and by the import machinery are noise in the report
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+@dataclass
+class MemoryReport:
+    traced_bytes: int
+    traced_peak_bytes: int
+    # (site, bytes, allocations)
+    top: List[Tuple[str, int, int]] = field(default_factory=list)
+    # (site, bytes grown, allocations grown) since the previous report
+    growth: List[Tuple[str, int, int]] = field(default_factory=list)
+
+
+# Deepest traceback tracemalloc can record per allocation
+MAX_TRACE_FRAMES = 65535
+
+# Project files are reported relative to the checkout, wherever it is installed
+_PROJECT_ROOT = str(Path(__file__).resolve().parents[1]) + "/"
+
+
+def _site(trace: tracemalloc.Frame) -> str:
+    filename = trace.filename
+    if filename.startswith(_PROJECT_ROOT):
+        filename = filename[len(_PROJECT_ROOT):]
+    else:
+        # Trim site-packages and stdlib prefixes to the module path
+        for marker in ("site-packages/", "/lib/"):
+            if marker in filename:
+                filename = filename.split(marker, 1)[1]
+                break
+    return f"{filename}:{trace.lineno}"
+
+
+def process_memory() -> Dict[str, int]:
+    """Resident memory of the process and, in a container, cgroup usage and limit, in bytes."""
+    readings = {}
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                readings["rss" if key == "VmRSS" else "rss_peak"] = int(value.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    for key, name in (("cgroup_used", "memory.current"), ("cgroup_limit", "memory.max")):
+        try:
+            value = Path("/sys/fs/cgroup", name).read_text().strip()
+        except OSError:
+            continue
+        if value.isdigit():
+            readings[key] = int(value)
+    return readings
+
+
+class MemoryProfiler:
+    """Start and stop tracemalloc on request and report the top allocation sites.
+
+    Nothing is traced until `start`, so it costs nothing while off; while
+    on, every allocation pays for recording its traceback. Each `report`
+    also lists the growth since the previous one.
+    """
+
+    def __init__(self, frames: int = 1):
+        self.frames = frames
+        self._previous: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def active(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: Optional[int] = None) -> None:
+        if not self.active:
+            tracemalloc.start(frames or self.frames)
+            self._previous = None
+
+    def stop(self) -> None:
+        if self.active:
+            tracemalloc.stop()
+        self._previous = None
+
+    def report(self, limit: int = 10) -> Optional[MemoryReport]:
+        """Top sites by size and growth since the last report; None while tracing is off.
+
+        Walks every traced block, so call it off the event loop.
+        """
+        if not self.active:
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        traced, peak = tracemalloc.get_traced_memory()
+        report = MemoryReport(traced_bytes=traced, traced_peak_bytes=peak)
+        for stat in snapshot.statistics("lineno")[:limit]:
+            report.top.append((_site(stat.traceback[0]), stat.size, stat.count))
+        if self._previous is not None:
+            growth = [diff for diff in snapshot.compare_to(self._previous, "lineno") if diff.size_diff > 0]
+            for diff in growth[:limit]:
+                report.growth.append((_site(diff.traceback[0]), diff.size_diff, diff.count_diff))
+        self._previous = snapshot
+        return report
@@ -1,16 +1,38 @@
-import json
 import os
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
-from models.metrics import MonthlyMetrics, MetricsEvent
+from typing import Dict, List, Optional, Set
+from models.metrics import AllTimeMetrics, MonthlyMetrics, MetricsEvent
+from utils import json_codec
 from loguru import logger
 
+def _empty_llm_calls() -> Dict[str, int]:
+    return {"proofread": 0, "my": 0, "business": 0, "brief": 0}
+
 class MetricsService:
+    """Monthly usage metrics persisted to data/metrics.json.
+
+    The file is read once and then kept as an in-memory rollup: per-month
+    counters plus all-time totals, updated incrementally by `track_event`.
+    Reads never touch the JSON, only a stat() to notice another process
+    rewriting it, so /stats costs the same after years of history.
+    `version` and `month_version()` change only when the data does and let
+    callers cache whatever they render from it.
+    """
+
     def __init__(self, data_dir: str = "data"):
         self.data_dir = Path(data_dir)
-        self.data_dir.mkdir(exist_ok=True)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
         self.metrics_file = self.data_dir / "metrics.json"
+        self.version = 0
+        self._metrics: Dict[str, Dict] = {}
+        self._mtime_ns: Optional[int] = None
+        self._loaded = False
+        self._month_versions: Dict[str, int] = {}
+        self._month_models: Dict[str, MonthlyMetrics] = {}
+        self._all_users: Set[str] = set()
+        self._totals: Dict = {}
+        self._totals_model: Optional[AllTimeMetrics] = None
         
     def _load_metrics(self) -> Dict[str, Dict]:
         """Load metrics from JSON file."""
@@ -19,7 +41,7 @@ class MetricsService:
         
         try:
             with open(self.metrics_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+                data = json_codec.load(f)
                 # Convert unique_users lists back to sets
                 for month_key in data:
                     if 'unique_users' in data[month_key]:
@@ -40,10 +62,40 @@ class MetricsService:
                     serializable_data[month_key]['unique_users'] = list(serializable_data[month_key]['unique_users'])
             
             with open(self.metrics_file, 'w', encoding='utf-8') as f:
-                json.dump(serializable_data, f, ensure_ascii=False, indent=2)
+                json_codec.dump(serializable_data, f, indent=True)
+            self._mtime_ns = self._file_mtime()
         except Exception as e:
             logger.error(f"Error saving metrics: {e}")
     
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.metrics_file).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _ensure_loaded(self) -> None:
+        """(Re)build the rollup on first use or when the file was rewritten by someone else."""
+        mtime = self._file_mtime()
+        if self._loaded and mtime == self._mtime_ns:
+            return
+        self._metrics = self._load_metrics()
+        self._mtime_ns = mtime
+        self._loaded = True
+        self._rebuild_rollup()
+    
+    def _rebuild_rollup(self) -> None:
+        self.version += 1
+        self._month_models.clear()
+        self._totals_model = None
+        self._all_users = set()
+        self._totals = {'transcriptions': 0, 'llm_calls': _empty_llm_calls()}
+        for month_key, month_data in self._metrics.items():
+            self._month_versions[month_key] = self._month_versions.get(month_key, 0) + 1
+            self._all_users.update(month_data.get('unique_users', ()))
+            self._totals['transcriptions'] += month_data.get('transcriptions', 0)
+            for style, count in month_data.get('llm_calls', {}).items():
+                self._totals['llm_calls'][style] = self._totals['llm_calls'].get(style, 0) + count
+    
     def _get_month_key(self, date: Optional[datetime] = None) -> str:
         """Get month key in format YYYY-MM."""
         if date is None:
@@ -52,56 +104,88 @@ class MetricsService:
     
     def track_event(self, event: MetricsEvent) -> None:
         """Track a metrics event."""
+        self._ensure_loaded()
         month_key = self._get_month_key(event.timestamp)
-        metrics = self._load_metrics()
+        metrics = self._metrics
         
         # Initialize month if not exists
         if month_key not in metrics:
             metrics[month_key] = {
                 'unique_users': set(),
                 'transcriptions': 0,
-                'llm_calls': {"proofread": 0, "my": 0, "business": 0, "brief": 0}
+                'llm_calls': _empty_llm_calls()
             }
+        month = metrics[month_key]
+        changed = event.user_id not in month['unique_users']
         
         # Add user to unique users
-        metrics[month_key]['unique_users'].add(event.user_id)
+        month['unique_users'].add(event.user_id)
+        self._all_users.add(event.user_id)
         
         # Track event
         if event.event_type == "transcription":
-            metrics[month_key]['transcriptions'] += 1
+            month['transcriptions'] += 1
+            self._totals['transcriptions'] += 1
+            changed = True
         elif event.event_type == "llm_call" and event.event_subtype:
-            if event.event_subtype in metrics[month_key]['llm_calls']:
-                metrics[month_key]['llm_calls'][event.event_subtype] += 1
+            if event.event_subtype in month['llm_calls']:
+                month['llm_calls'][event.event_subtype] += 1
+                self._totals['llm_calls'][event.event_subtype] = self._totals['llm_calls'].get(event.event_subtype, 0) + 1
+                changed = True
         
-        self._save_metrics(metrics)
-        logger.debug(f"Tracked event: {event.event_type} for user {event.user_id}")
+        if changed:
+            self.version += 1
+            self._month_versions[month_key] = self._month_versions.get(month_key, 0) + 1
+            self._month_models.pop(month_key, None)
+            self._totals_model = None
+            self._save_metrics(metrics)
+        logger.debug("Tracked event: {} for user {}", event.event_type, event.user_id)
+    
+    def month_version(self, month_key: str) -> int:
+        """Counter that changes whenever the month's stats do (0 for a month without data)."""
+        self._ensure_loaded()
+        return self._month_versions.get(month_key, 0) if month_key in self._metrics else 0
+    
+    def month_keys(self) -> List[str]:
+        """Months with data, newest first."""
+        self._ensure_loaded()
+        return sorted(self._metrics, reverse=True)
     
     def get_month_stats(self, month_key: Optional[str] = None) -> Optional[MonthlyMetrics]:
-        """Get statistics for a specific month."""
+        """Get statistics for a specific month.
+
+        The returned model is shared until the month changes; treat it as read-only.
+        """
         if month_key is None:
             month_key = self._get_month_key()
         
-        metrics = self._load_metrics()
-        if month_key not in metrics:
+        self._ensure_loaded()
+        if month_key not in self._metrics:
             return None
         
-        month_data = metrics[month_key]
-        return MonthlyMetrics(
-            unique_users=month_data.get('unique_users', set()),
-            transcriptions=month_data.get('transcriptions', 0),
-            llm_calls=month_data.get('llm_calls', {"proofread": 0, "my": 0, "business": 0, "brief": 0})
-        )
+        cached = self._month_models.get(month_key)
+        if cached is None:
+            month_data = self._metrics[month_key]
+            cached = MonthlyMetrics(
+                unique_users=month_data.get('unique_users', set()),
+                transcriptions=month_data.get('transcriptions', 0),
+                llm_calls=month_data.get('llm_calls', _empty_llm_calls())
+            )
+            self._month_models[month_key] = cached
+        return cached
     
     def get_all_months(self) -> Dict[str, MonthlyMetrics]:
         """Get statistics for all months."""
-        metrics = self._load_metrics()
-        result = {}
-        
-        for month_key, month_data in metrics.items():
-            result[month_key] = MonthlyMetrics(
-                unique_users=month_data.get('unique_users', set()),
-                transcriptions=month_data.get('transcriptions', 0),
-                llm_calls=month_data.get('llm_calls', {"proofread": 0, "my": 0, "business": 0, "brief": 0})
+        return {month_key: self.get_month_stats(month_key) for month_key in self.month_keys()}
+    
+    def get_all_time_stats(self) -> AllTimeMetrics:
+        """All-time totals from the rollup, without walking the months."""
+        self._ensure_loaded()
+        if self._totals_model is None:
+            self._totals_model = AllTimeMetrics(
+                unique_users=len(self._all_users),
+                transcriptions=self._totals['transcriptions'],
+                llm_calls=dict(self._totals['llm_calls']),
+                months=len(self._metrics)
             )
-        
-        return result
\ No newline at end of file
+        return self._totals_model
@@ -0,0 +1,94 @@
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from config.config import ModelRoute
+
+
+class ModelStats:
+    """Rolling latency and error rate for one model over its last calls."""
+
+    def __init__(self, window: int = 50, max_age: float = 300.0):
+        self.max_age = max_age
+        self._calls: deque = deque(maxlen=window)  # (finished_at, latency, ok)
+
+    def record(self, latency: float, ok: bool) -> None:
+        self._calls.append((time.monotonic(), latency, ok))
+
+    def _recent(self) -> List[Tuple[float, float, bool]]:
+        cutoff = time.monotonic() - self.max_age
+        return [call for call in self._calls if call[0] >= cutoff]
+
+    def error_rate(self) -> float:
+        recent = self._recent()
+        if not recent:
+            return 0.0
+        return sum(1 for _, _, ok in recent if not ok) / len(recent)
+
+    def latency(self, quantile: float = 0.5) -> Optional[float]:
+        latencies = sorted(latency for _, latency, ok in self._recent() if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+
+class ModelRouter:
+    """Pick an ordered list of models for a request from the routing table.
+
+    The first route matching the style and input size decides the primary
+    model and its fallbacks. Models that have been failing recently are moved
+    to the end of the list, so an overloaded model stops costing a timeout on
+    every request while it is unhealthy. `max_output_tokens` caps the output
+    budget per model, so a fallback with a smaller limit is not sent a
+    request it rejects.
+    """
+
+    def __init__(
+        self,
+        routes: List[ModelRoute],
+        max_error_rate: float = 0.5,
+        max_output_tokens: Optional[Dict[str, int]] = None,
+    ):
+        self.routes = routes
+        self.max_error_rate = max_error_rate
+        self.max_output_tokens = max_output_tokens or {}
+        self.stats: Dict[str, ModelStats] = {}
+
+    def _stats(self, model: str) -> ModelStats:
+        if model not in self.stats:
+            self.stats[model] = ModelStats()
+        return self.stats[model]
+
+    def match(self, style: str, input_tokens: int) -> ModelRoute:
+        for route in self.routes:
+            if route.styles is not None and style not in route.styles:
+                continue
+            if route.max_input_tokens is not None and input_tokens > route.max_input_tokens:
+                continue
+            return route
+        return self.routes[-1]
+
+    def candidates(self, style: str, input_tokens: int) -> Tuple[List[str], float]:
+        """Models to try in order, and the per-attempt timeout."""
+        route = self.match(style, input_tokens)
+        models = list(dict.fromkeys([route.model, *route.fallbacks]))
+        healthy = [m for m in models if self._stats(m).error_rate() <= self.max_error_rate]
+        unhealthy = [m for m in models if m not in healthy]
+        return healthy + unhealthy, route.timeout
+
+    def output_budget(self, model: str, max_tokens: int) -> int:
+        """`max_tokens` clamped to what the model accepts."""
+        return min(max_tokens, self.max_output_tokens.get(model, max_tokens))
+
+    def record(self, model: str, latency: float, ok: bool) -> None:
+        self._stats(model).record(latency, ok)
+
+    def snapshot(self) -> Dict[str, Dict[str, Optional[float]]]:
+        return {
+            model: {
+                "error_rate": stats.error_rate(),
+                "p50": stats.latency(0.5),
+                "p95": stats.latency(0.95),
+            }
+            for model, stats in self.stats.items()
+        }
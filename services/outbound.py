@@ -0,0 +1,186 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, TypeVar
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup, Message
+
+from services.telemetry import QUEUE_DEPTH, STAGE_LATENCY, UPSTREAM_ERRORS
+from services.tracing import tracer
+from utils.telegram_formatting import utf16_len
+
+try:
+    from loguru import logger
+except ImportError:  # pragma: no cover
+    import logging
+    logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Telegram rejects messages longer than 4096 UTF-16 code units
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+class TokenBucket:
+    """Async token bucket; waiters are served in FIFO order."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def penalize(self, seconds: float) -> None:
+        """Block the bucket (e.g. after a 429) and drop accumulated burst."""
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = max(now, self._blocked_until)
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _ChatState:
+    def __init__(self, rate: float, burst: float, group: bool = False):
+        self.bucket = TokenBucket(rate, burst)
+        self.lock = asyncio.Lock()
+        # Groups have their own flood limit on top of the bot-wide one
+        self.group = group
+
+
+class OutboundSender:
+    """Send Telegram requests under per-chat and global flood limits.
+
+    Every request goes through a per-chat and a global token bucket, requests
+    for the same chat are delivered in order, and `TelegramRetryAfter` is
+    handled by pausing the chat and retrying instead of failing the handler.
+    A 429 in a private chat comes from the bot-wide limit and pauses every
+    chat; in a group it may be the group's own limit and pauses only that chat.
+    `bot` labels the queue depth series of this sender.
+    """
+
+    def __init__(
+        self,
+        per_chat_rate: float = 1.0,
+        per_chat_burst: float = 3.0,
+        global_rate: float = 30.0,
+        global_burst: float = 30.0,
+        max_retries: int = 5,
+        max_chats: int = 10000,
+        bot: str = "",
+    ):
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._chats: "OrderedDict[int, _ChatState]" = OrderedDict()
+        self.retry_after_count = 0
+        self.pending = 0
+        QUEUE_DEPTH.set_function(lambda: self.pending, queue="outbound", bot=bot)
+
+    def _chat(self, chat_id: int) -> _ChatState:
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = _ChatState(self.per_chat_rate, self.per_chat_burst, group=chat_id < 0)
+            self._chats[chat_id] = state
+            self._evict()
+        else:
+            self._chats.move_to_end(chat_id)
+        return state
+
+    def _evict(self) -> None:
+        # Drop the least recently used idle chats; busy ones keep their order
+        while len(self._chats) > self.max_chats:
+            for chat_id, state in self._chats.items():
+                if not state.lock.locked():
+                    del self._chats[chat_id]
+                    break
+            else:
+                return
+
+    async def _call(self, state: _ChatState, request: Callable[[], Awaitable[T]]) -> T:
+        for attempt in range(self.max_retries + 1):
+            await state.bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                with STAGE_LATENCY.time(stage="send"), tracer.span("answer", attempt=attempt):
+                    return await request()
+            except TelegramRetryAfter as e:
+                UPSTREAM_ERRORS.inc(upstream="telegram", code="429")
+                if attempt == self.max_retries:
+                    raise
+                self.retry_after_count += 1
+                logger.warning(f"Flood control hit, retrying in {e.retry_after}s")
+                state.bucket.penalize(e.retry_after)
+                if not state.group:
+                    self.global_bucket.penalize(e.retry_after)
+
+    async def run(self, chat_id: int, request: Callable[[], Awaitable[T]]) -> T:
+        """Run a single Telegram request for a chat under flood control."""
+        state = self._chat(chat_id)
+        self.pending += 1
+        try:
+            async with state.lock:
+                return await self._call(state, request)
+        finally:
+            self.pending -= 1
+
+    async def answer(self, message: Message, text: str, **kwargs: Any) -> Message:
+        """Flood-controlled `message.answer`."""
+        return await self.run(message.chat.id, lambda: message.answer(text, **kwargs))
+
+    async def send_parts(
+        self,
+        message: Message,
+        parts: List[str],
+        header: str = "",
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+    ) -> List[Message]:
+        """Send a multi-part reply in order, keyboard on the last part.
+
+        The header is merged into the first part when both fit in one message.
+        Parts of one reply are never interleaved with other sends to the chat.
+        """
+        texts = list(parts)
+        if not texts:
+            reply_markup = None
+        if header:
+            if texts and utf16_len(header + texts[0]) <= TELEGRAM_MESSAGE_LIMIT:
+                texts[0] = header + texts[0]
+            else:
+                texts.insert(0, header.rstrip())
+
+        state = self._chat(message.chat.id)
+        sent = []
+        self.pending += len(texts)
+        try:
+            async with state.lock:
+                for i, text in enumerate(texts):
+                    markup = reply_markup if i == len(texts) - 1 else None
+                    sent.append(await self._call(
+                        state,
+                        lambda text=text, markup=markup: message.answer(text, reply_markup=markup),
+                    ))
+                    self.pending -= 1
+        finally:
+            self.pending -= len(texts) - len(sent)
+        return sent
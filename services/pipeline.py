@@ -0,0 +1,175 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, List, Optional, Set
+
+from services.telemetry import PIPELINE_QUEUE_WAIT, QUEUE_DEPTH
+from services.tracing import Trace, tracer
+
+try:
+    from loguru import logger
+except ImportError:  # pragma: no cover
+    import logging
+    logger = logging.getLogger(__name__)
+
+
+class JobRejected(Exception):
+    """Raised by a stage to finish a job early with a reply instead of an error."""
+
+    def __init__(self, reply: str):
+        super().__init__(reply)
+        self.reply = reply
+
+
+class StageTimeout(Exception):
+    pass
+
+
+@dataclass
+class Stage:
+    name: str
+    handler: Callable[[Any], Awaitable[None]]
+    concurrency: int = 1
+    timeout: float = 60.0
+
+
+class Job:
+    """Base for pipeline jobs; stages read and fill in attributes of subclasses."""
+
+    def __init__(self, trace: Optional[Trace] = None):
+        self.trace = trace
+        self.done: Optional[asyncio.Future] = None
+        self.enqueued_at = 0.0
+        # The stage currently working on the job, if any
+        self.stage_task: Optional[asyncio.Task] = None
+
+
+class Pipeline:
+    """Run jobs through stages with per-stage workers, timeouts and bounded queues.
+
+    Each stage has its own pool of `concurrency` workers reading from a queue
+    of at most `queue_size` jobs. A worker that finishes a job hands it to the
+    next stage's queue and waits while that queue is full, so a slow stage
+    pushes back on the ones before it instead of piling up work in memory.
+    `submit` resolves when the job has left the last stage or failed.
+    `on_stage_done(job, stage_name)` is called after each stage a job completes.
+
+    Cancelling a submitter cancels its job: a queued job is skipped and a
+    running stage is cancelled and waited for before `submit` returns, so
+    nothing touches the job's data afterwards. `stop` cancels the jobs it
+    leaves unfinished; their submitters get CancelledError.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        stages: List[Stage],
+        queue_size: int = 16,
+        on_stage_done: Optional[Callable[[Any, str], None]] = None,
+        bot: str = "",
+    ):
+        self.name = name
+        # Label of the queue depth series, so pipelines of different bots do not overwrite each other
+        self.bot = bot
+        self.stages = stages
+        self.queue_size = queue_size
+        self.on_stage_done = on_stage_done
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        # Submitted jobs that have not finished yet
+        self._jobs: Set[Job] = set()
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        for index, stage in enumerate(self.stages):
+            queue = self._queues[index]
+            QUEUE_DEPTH.set_function(queue.qsize, queue=f"{self.name}_{stage.name}", bot=self.bot)
+            for _ in range(stage.concurrency):
+                self._workers.append(asyncio.create_task(self._worker(index)))
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # Jobs still queued or between stages will never finish
+        for job in list(self._jobs):
+            job.done.cancel()
+
+    async def submit(self, job: Job) -> None:
+        """Run a job through every stage; raises whatever the failing stage raised."""
+        self.start()
+        job.done = asyncio.get_running_loop().create_future()
+        job.enqueued_at = time.perf_counter()
+        self._jobs.add(job)
+        try:
+            await self._queues[0].put(job)
+            await job.done
+        except asyncio.CancelledError:
+            # The caller frees the job's media next; stop the stage using it first
+            job.done.cancel()
+            if job.stage_task is not None:
+                job.stage_task.cancel()
+                await asyncio.wait({job.stage_task})
+            raise
+        finally:
+            self._jobs.discard(job)
+
+    async def _worker(self, index: int) -> None:
+        stage = self.stages[index]
+        queue = self._queues[index]
+        while True:
+            job = await queue.get()
+            try:
+                # Cancelled while it waited in the queue
+                if job.done.done():
+                    continue
+                PIPELINE_QUEUE_WAIT.observe(time.perf_counter() - job.enqueued_at, pipeline=self.name, stage=stage.name)
+                error = await self._run_stage(stage, job)
+                if job.done.done():
+                    continue
+                if error is not None:
+                    self._finish(job, error)
+                elif index + 1 < len(self.stages):
+                    if self.on_stage_done is not None:
+                        self.on_stage_done(job, stage.name)
+                    job.enqueued_at = time.perf_counter()
+                    await self._queues[index + 1].put(job)
+                else:
+                    if self.on_stage_done is not None:
+                        self.on_stage_done(job, stage.name)
+                    self._finish(job)
+            finally:
+                queue.task_done()
+
+    async def _run_stage(self, stage: Stage, job: Job) -> Optional[BaseException]:
+        """Run one stage on a job in a task of its own, which `submit` can cancel; returns the stage's error."""
+        with tracer.resume(job.trace):
+            task = asyncio.ensure_future(asyncio.wait_for(stage.handler(job), stage.timeout))
+        job.stage_task = task
+        try:
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            # The pipeline is stopping: no stage outlives its worker
+            task.cancel()
+            await asyncio.wait({task})
+            raise
+        finally:
+            job.stage_task = None
+        if task.cancelled():
+            return StageTimeout(f"Этап «{stage.name}» прерван")
+        error = task.exception()
+        if isinstance(error, asyncio.TimeoutError):
+            return StageTimeout(f"Этап «{stage.name}» не уложился в {stage.timeout:.0f} с")
+        return error
+
+    @staticmethod
+    def _finish(job: Job, error: Optional[BaseException] = None) -> None:
+        if job.done.done():
+            return
+        if error is None:
+            job.done.set_result(None)
+        else:
+            job.done.set_exception(error)
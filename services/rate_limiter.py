@@ -1,7 +1,13 @@
-import json
-from datetime import datetime, timedelta
+import math
+import os
+import tempfile
+import time
+from datetime import timedelta
 from pathlib import Path
-from typing import Callable, Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config.config import RateTier
+from utils import json_codec
 try:
     from loguru import logger
 except ImportError:
@@ -9,54 +15,82 @@ except ImportError:
     logger = logging.getLogger(__name__)
 
 class RateLimiterService:
+    """Per-user quotas enforced with GCRA, one theoretical arrival time (TAT) per tier.
+
+    Each tier allows `limit` units per `period`, all of which may be spent
+    at once; units drain back at `limit / period` per second. Requests are
+    weighted by `cost` (the pipeline charges audio seconds), a request must
+    fit every tier, and a cost above a tier's limit is clamped to it so a
+    long file can still run on an empty quota. Checks, "retry in" answers
+    and updates are O(tiers) per user, independent of history.
+
+    Without explicit tiers a single hourly tier of `max_requests_per_hour`
+    units is used, which with the default cost of 1 is a request count.
+    """
+
     def __init__(
         self,
         data_dir: str = "data",
         max_requests_per_hour: int = 5,
         admin_user_id: int = None,
         is_unlimited_user: Callable[[str], bool] | None = None,
+        tiers: List[RateTier] | None = None,
+        clock: Callable[[], float] = time.time,
     ):
         self.data_dir = Path(data_dir)
-        self.data_dir.mkdir(exist_ok=True)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
         self.rate_limit_file = self.data_dir / "rate_limits.json"
-        self.max_requests_per_hour = max_requests_per_hour
         self.admin_user_id = admin_user_id
         self.is_unlimited_user = is_unlimited_user or (lambda _user_id: False)
-    
-    def _load_rate_limits(self) -> Dict[str, List[str]]:
-        """Load rate limit data from JSON file."""
+        if tiers is None:
+            tiers = [RateTier(name="hour", period=3600, limit=max_requests_per_hour)]
+        self.tiers = tiers
+        self.clock = clock
+        # user id -> TAT per tier, in the order of self.tiers (wall clock, so it survives restarts)
+        self._tats: Dict[str, List[float]] = self._load_rate_limits()
+
+    def _load_rate_limits(self) -> Dict[str, List[float]]:
+        """Load rate limit state from JSON file."""
         if not self.rate_limit_file.exists():
             return {}
-        
+
         try:
             with open(self.rate_limit_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                data = json_codec.load(f)
         except Exception as e:
             logger.error(f"Error loading rate limits: {e}")
             return {}
-    
-    def _save_rate_limits(self, rate_limits: Dict[str, List[str]]) -> None:
-        """Save rate limit data to JSON file."""
+
+        tats = {}
+        for user_id, state in data.items():
+            # Lists of request timestamps from the old format are dropped
+            if isinstance(state, dict):
+                tats[user_id] = [float(state.get(tier.name, 0.0)) for tier in self.tiers]
+        return tats
+
+    def _save_rate_limits(self) -> None:
+        """Save the TATs still in the future to JSON file, atomically."""
+        now = self.clock()
+        data = {
+            user_id: {tier.name: tat for tier, tat in zip(self.tiers, tats) if tat > now}
+            for user_id, tats in self._tats.items()
+            if max(tats, default=0.0) > now
+        }
+        self._tats = {user_id: self._tats[user_id] for user_id in data}
         try:
-            with open(self.rate_limit_file, 'w', encoding='utf-8') as f:
-                json.dump(rate_limits, f, ensure_ascii=False, indent=2)
+            fd, tmp_path = tempfile.mkstemp(prefix=".rate_limits.", dir=self.data_dir)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json_codec.dump(data, f, indent=True)
+            os.replace(tmp_path, self.rate_limit_file)
         except Exception as e:
             logger.error(f"Error saving rate limits: {e}")
-    
-    def _clean_old_requests(self, timestamps: List[str]) -> List[str]:
-        """Remove timestamps older than 1 hour."""
-        cutoff_time = datetime.now() - timedelta(hours=1)
-        return [
-            ts for ts in timestamps 
-            if datetime.fromisoformat(ts) > cutoff_time
-        ]
-    
+
     def is_admin(self, user_id: str) -> bool:
         """Check if user is admin."""
         if not self.admin_user_id:
             return False
         return str(self.admin_user_id) == str(user_id)
-    
+
     def _has_unlimited_access(self, user_id: str) -> bool:
         user_id_str = str(user_id)
         if self.is_admin(user_id_str):
@@ -67,82 +101,63 @@ class RateLimiterService:
             logger.error(f"Unlimited user check failed: {exc}")
             return False
 
-    def can_make_request(self, user_id: str, username: str = None) -> bool:
-        """Check if user can make a transcription request."""
+    def check(self, user_id: str, cost: float = 1) -> Tuple[float, Optional[RateTier]]:
+        """Seconds until a request costing `cost` fits every tier (0 if it fits now), and the tier that blocks it."""
+        if not self.tiers or self._has_unlimited_access(user_id):
+            return 0.0, None
+
+        now = self.clock()
+        tats = self._tats.get(str(user_id))
+        wait, blocking = 0.0, None
+        for index, tier in enumerate(self.tiers):
+            tat = max(tats[index], now) if tats else now
+            new_tat = tat + min(cost, tier.limit) * tier.period / tier.limit
+            tier_wait = new_tat - tier.period - now
+            # Tolerance for float error at exact boundaries
+            if tier_wait > max(wait, 1e-6):
+                wait, blocking = tier_wait, tier
+        return wait, blocking
+
+    def can_make_request(self, user_id: str, username: str = None, cost: float = 1) -> bool:
+        """Check if user can make a transcription request costing `cost` units."""
         # Unlimited users have no limits
         if self._has_unlimited_access(user_id):
-            logger.debug(f"Unlimited user {user_id} bypassing rate limit")
+            logger.debug("Unlimited user {} bypassing rate limit", user_id)
             return True
-        
-        rate_limits = self._load_rate_limits()
-        
-        # Get user's request history
-        user_requests = rate_limits.get(user_id, [])
-        
-        # Clean old requests
-        user_requests = self._clean_old_requests(user_requests)
-        
-        # Check if under limit
-        return len(user_requests) < self.max_requests_per_hour
-    
-    def record_request(self, user_id: str, username: str = None) -> None:
-        """Record a transcription request for the user."""
+
+        return self.check(user_id, cost)[0] <= 0
+
+    def record_request(self, user_id: str, username: str = None, cost: float = 1) -> None:
+        """Charge a transcription request costing `cost` units to every tier."""
         # Don't record for unlimited users to keep data clean
-        if self._has_unlimited_access(user_id):
+        if not self.tiers or self._has_unlimited_access(user_id):
             return
-        
-        rate_limits = self._load_rate_limits()
-        
-        # Get user's request history
-        user_requests = rate_limits.get(user_id, [])
-        
-        # Clean old requests
-        user_requests = self._clean_old_requests(user_requests)
-        
-        # Add current request
-        user_requests.append(datetime.now().isoformat())
-        
-        # Update and save
-        rate_limits[user_id] = user_requests
-        self._save_rate_limits(rate_limits)
-        
-        logger.debug(f"Recorded request for user {user_id}. Total in last hour: {len(user_requests)}")
-    
-    def get_remaining_requests(self, user_id: str, username: str = None) -> int:
-        """Get number of remaining requests for the user."""
+
+        now = self.clock()
+        user_id = str(user_id)
+        tats = self._tats.get(user_id) or [now] * len(self.tiers)
+        self._tats[user_id] = [
+            max(tat, now) + min(cost, tier.limit) * tier.period / tier.limit
+            for tier, tat in zip(self.tiers, tats)
+        ]
+        self._save_rate_limits()
+
+        logger.debug("Recorded request for user {} costing {}", user_id, cost)
+
+    def get_remaining_requests(self, user_id: str, username: str = None) -> float:
+        """Units the user can spend right now, limited by the tightest tier."""
         # Unlimited users have unlimited requests
-        if self._has_unlimited_access(user_id):
+        if not self.tiers or self._has_unlimited_access(user_id):
             return float('inf')
-        
-        rate_limits = self._load_rate_limits()
-        
-        # Get user's request history
-        user_requests = rate_limits.get(user_id, [])
-        
-        # Clean old requests
-        user_requests = self._clean_old_requests(user_requests)
-        
-        return max(0, self.max_requests_per_hour - len(user_requests))
-    
-    def get_time_until_next_request(self, user_id: str, username: str = None) -> timedelta:
-        """Get time until user can make next request."""
-        # Unlimited users can always make requests
-        if self._has_unlimited_access(user_id):
-            return timedelta(0)
-        
-        rate_limits = self._load_rate_limits()
-        
-        # Get user's request history
-        user_requests = rate_limits.get(user_id, [])
-        
-        if len(user_requests) < self.max_requests_per_hour:
-            return timedelta(0)
-        
-        # Find oldest request in the current hour window
-        oldest_request = min(user_requests, key=lambda x: datetime.fromisoformat(x))
-        oldest_time = datetime.fromisoformat(oldest_request)
-        
-        # Time when oldest request will be 1 hour old
-        next_available = oldest_time + timedelta(hours=1)
-        
-        return max(timedelta(0), next_available - datetime.now())
\ No newline at end of file
+
+        now = self.clock()
+        tats = self._tats.get(str(user_id))
+        remaining = float('inf')
+        for index, tier in enumerate(self.tiers):
+            backlog = max(tats[index] - now, 0.0) if tats else 0.0
+            remaining = min(remaining, (tier.period - backlog) * tier.limit / tier.period)
+        return max(0, math.floor(remaining + 1e-6))
+
+    def get_time_until_next_request(self, user_id: str, username: str = None, cost: float = 1) -> timedelta:
+        """Get time until user can make a request costing `cost` units."""
+        return timedelta(seconds=self.check(user_id, cost)[0])
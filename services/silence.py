@@ -0,0 +1,243 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from bisect import bisect_right
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple, Union
+
+from models.transcription import TranscriptionResult, Word
+from services.spool import SPOOL_PREFIX, SpooledMedia, secure_delete
+from services.telemetry import SILENCE_TRIMMED_SECONDS, STAGE_LATENCY
+from services.tracing import tracer
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Speech is analysed as 16 kHz mono 16-bit PCM in 30 ms frames
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = 480
+FRAME_SECONDS = FRAME_SAMPLES / SAMPLE_RATE
+# ffmpeg output read per call: 128 frames
+READ_CHUNK = FRAME_SAMPLES * 2 * 128
+# Trailing bytes of ffmpeg's stderr kept for the error message
+STDERR_TAIL = 4096
+# The trimmed media is re-encoded as 16 kHz Opus at the lowest encoder complexity:
+# about 3x faster to encode than the default and no larger at this bitrate
+OPUS_BITRATE = "24k"
+OPUS_COMPRESSION_LEVEL = "0"
+
+Interval = Tuple[float, float]
+
+
+def frame_levels(pcm: bytes) -> "np.ndarray":
+    """Level of each whole 30 ms frame of 16-bit PCM, in dBFS."""
+    samples = np.frombuffer(pcm, dtype="<i2", count=len(pcm) // (FRAME_SAMPLES * 2) * FRAME_SAMPLES)
+    power = np.square(samples.astype(np.float32) / 32768).reshape(-1, FRAME_SAMPLES).mean(axis=1)
+    return 10 * np.log10(power + 1e-10)
+
+
+def speech_intervals(levels: "np.ndarray", margin_db: float = 10.0, max_pause: float = 0.7) -> List[Interval]:
+    """Intervals of the media to keep, in seconds, from per-frame levels.
+
+    Frames louder than `margin_db` above the noise floor (the 10th
+    percentile) are speech; the threshold never goes above halfway to the
+    loud frames, so quiet speakers are not cut. Speech is widened by half of
+    `max_pause` on each side: shorter pauses are kept whole, longer ones
+    shrink to `max_pause`. A recording without a clear floor is kept whole.
+    """
+    if not len(levels):
+        return []
+    floor, loud = np.percentile(levels, [10, 99])
+    if loud - floor < margin_db:
+        return [(0.0, len(levels) * FRAME_SECONDS)]
+    speech = levels > min(floor + margin_db, (floor + loud) / 2)
+    reach = int(round(max_pause / 2 / FRAME_SECONDS))
+    keep = np.convolve(speech.astype(np.float32), np.ones(2 * reach + 1, dtype=np.float32), mode="same") > 0.5
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], keep.astype(np.int8), [0]))))
+    return [(start * FRAME_SECONDS, end * FRAME_SECONDS) for start, end in zip(edges[::2].tolist(), edges[1::2].tolist())]
+
+
+class TimeMap:
+    """Maps times in trimmed media back to the original media's timeline.
+
+    `kept` are the intervals of the original that the trimmed media is made
+    of, in order.
+    """
+
+    def __init__(self, kept: List[Interval]):
+        self.kept = kept
+        # Where each kept interval starts in the trimmed media
+        self.starts: List[float] = []
+        position = 0.0
+        for start, end in kept:
+            self.starts.append(position)
+            position += end - start
+        self.duration = position
+
+    def to_original(self, seconds: float) -> float:
+        if not self.kept:
+            return seconds
+        index = max(0, bisect_right(self.starts, seconds) - 1)
+        start, end = self.kept[index]
+        return min(start + seconds - self.starts[index], end)
+
+    def _word(self, word: Word) -> Word:
+        return word.model_copy(update={"start": self.to_original(word.start), "end": self.to_original(word.end)})
+
+    def apply(self, result: TranscriptionResult) -> TranscriptionResult:
+        """The result with word and paragraph times on the original timeline."""
+        words = [self._word(word) for word in result.words]
+        # Paragraphs share their Word objects with result.words
+        mapped = {id(old): new for old, new in zip(result.words, words)}
+        paragraphs = None
+        if result.paragraphs is not None:
+            paragraphs = [
+                paragraph.model_copy(update={
+                    "start": self.to_original(paragraph.start),
+                    "end": self.to_original(paragraph.end),
+                    "words": [mapped.get(id(word)) or self._word(word) for word in paragraph.words],
+                })
+                for paragraph in result.paragraphs
+            ]
+        return result.model_copy(update={"words": words, "paragraphs": paragraphs})
+
+
+class SilenceTrimmer:
+    """Shortens long pauses in media before it is uploaded for transcription.
+
+    ffmpeg decodes the audio to PCM, which is streamed through a NumPy
+    energy pass without keeping the samples; the kept intervals are then cut
+    from the original and re-encoded as Opus (video is dropped). Media that
+    would lose less than `min_saved_seconds` is left alone. Word times in the
+    transcript are mapped back with the returned TimeMap.
+    """
+
+    def __init__(
+        self,
+        ffmpeg: str = "ffmpeg",
+        margin_db: float = 10.0,
+        max_pause: float = 0.7,
+        min_saved_seconds: float = 2.0,
+        max_seconds: float = 1800,
+        spool_threshold: int = 8 * 1024 * 1024,
+        spool_dir: Optional[str] = None,
+    ):
+        if np is None:
+            raise RuntimeError("NumPy is not installed (pip install -r requirements-audio.txt)")
+        binary = shutil.which(ffmpeg)
+        if binary is None:
+            raise RuntimeError(f"{ffmpeg} was not found")
+        self.ffmpeg = binary
+        self.margin_db = margin_db
+        self.max_pause = max_pause
+        self.min_saved_seconds = min_saved_seconds
+        self.max_seconds = max_seconds
+        self.spool_threshold = spool_threshold
+        self.spool_dir = spool_dir or None
+
+    def accepts(self, duration: Optional[float]) -> bool:
+        return duration is not None and self.min_saved_seconds < duration <= self.max_seconds
+
+    async def trim(
+        self, source: Union[Path, SpooledMedia], media_type: str = ""
+    ) -> Optional[Tuple[SpooledMedia, TimeMap]]:
+        """The media with long pauses shortened and its map to the original, or None if not worth it."""
+        with STAGE_LATENCY.time(stage="trim_silence", media_type=media_type), \
+                tracer.span("trim_silence", media_type=media_type) as span:
+            async with self._source_path(source) as path:
+                levels = await self._levels(path)
+                kept = speech_intervals(levels, self.margin_db, self.max_pause)
+                time_map = TimeMap(kept)
+                saved = len(levels) * FRAME_SECONDS - time_map.duration
+                span.attributes["saved_seconds"] = round(saved, 2)
+                if not kept or saved < self.min_saved_seconds:
+                    return None
+                spool = await self._encode(path, kept)
+        SILENCE_TRIMMED_SECONDS.inc(saved, media_type=media_type)
+        return spool, time_map
+
+    @asynccontextmanager
+    async def _source_path(self, source: Union[Path, SpooledMedia]) -> AsyncIterator[Path]:
+        """A file ffmpeg can seek in; in-memory media is written to a private temp file for the duration."""
+        if isinstance(source, Path):
+            yield source
+            return
+        if source.path is not None:
+            yield source.path
+            return
+        fd, name = tempfile.mkstemp(prefix=SPOOL_PREFIX, dir=self.spool_dir)
+        path = Path(name)
+        try:
+            with os.fdopen(fd, "wb") as copy, source.reader() as payload:
+                await asyncio.to_thread(copy.write, payload)
+            yield path
+        finally:
+            await asyncio.to_thread(secure_delete, path)
+
+    async def _run(self, *args: str, output: Callable[[bytes], Awaitable[None]]) -> None:
+        """Run ffmpeg, handing each chunk of its stdout to `output`."""
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", *args,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        # Drained alongside stdout: ffmpeg blocks, and so would we, once a full stderr pipe goes unread
+        errors = asyncio.ensure_future(self._tail(process.stderr))
+        try:
+            while True:
+                chunk = await process.stdout.read(READ_CHUNK)
+                if not chunk:
+                    break
+                await output(chunk)
+            if await process.wait() != 0:
+                message = (await errors).decode(errors="replace")
+                raise RuntimeError(f"ffmpeg exited with {process.returncode}: {message[-300:]}")
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            errors.cancel()
+            await asyncio.gather(errors, return_exceptions=True)
+
+    @staticmethod
+    async def _tail(stream: asyncio.StreamReader) -> bytes:
+        """Read a stream to the end, keeping only its last STDERR_TAIL bytes."""
+        kept = bytearray()
+        while True:
+            chunk = await stream.read(READ_CHUNK)
+            if not chunk:
+                return bytes(kept)
+            kept.extend(chunk)
+            del kept[:-STDERR_TAIL]
+
+    async def _levels(self, path: Path) -> "np.ndarray":
+        levels = []
+        pending = bytearray()
+
+        async def analyse(chunk: bytes) -> None:
+            pending.extend(chunk)
+            whole = len(pending) - len(pending) % (FRAME_SAMPLES * 2)
+            if whole:
+                levels.append(frame_levels(bytes(pending[:whole])))
+                del pending[:whole]
+
+        await self._run("-i", str(path), "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1", output=analyse)
+        return np.concatenate(levels) if levels else np.empty(0, dtype=np.float32)
+
+    async def _encode(self, path: Path, kept: List[Interval]) -> SpooledMedia:
+        select = "+".join(f"between(t,{start:.3f},{end:.3f})" for start, end in kept)
+        spool = SpooledMedia(self.spool_threshold, self.spool_dir)
+        try:
+            await self._run(
+                "-i", str(path), "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-af", f"aselect='{select}',asetpts=N/SR/TB",
+                "-c:a", "libopus", "-b:a", OPUS_BITRATE, "-compression_level", OPUS_COMPRESSION_LEVEL, "-f", "ogg", "pipe:1",
+                output=spool.awrite,
+            )
+        except BaseException:
+            await spool.aclose()
+            raise
+        await asyncio.to_thread(spool.finish)
+        return spool
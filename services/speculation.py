@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from services.style_cache import StyleCache
+
+try:
+    from loguru import logger
+except ImportError:  # pragma: no cover
+    import logging
+    logger = logging.getLogger(__name__)
+
+
+class StyleSpeculator:
+    """Precompute the most likely style for a fresh transcript in the background.
+
+    The style is predicted from the user's recent button presses (kept in
+    memory only) or, for new users, from the global llm_calls counters in
+    MetricsService. Results land in the StyleCache, so the real button press
+    is answered from the cache or by joining the in-flight job.
+
+    Speculation is bounded by an hourly token budget and a concurrency limit,
+    never starts while the LLM queue is saturated, and running speculative
+    jobs are cancelled when real requests need the capacity.
+    """
+
+    def __init__(
+        self,
+        anthropic_service,
+        metrics_service,
+        cache: StyleCache,
+        enabled: bool = False,
+        tokens_per_hour: int = 50000,
+        max_concurrent: int = 2,
+        max_users: int = 10000,
+    ):
+        self.anthropic_service = anthropic_service
+        self.metrics_service = metrics_service
+        self.cache = cache
+        self.enabled = enabled
+        self.tokens_per_hour = tokens_per_hour
+        self.max_concurrent = max_concurrent
+        self.max_users = max_users
+
+        self._tasks: Dict[Tuple[str, str], Tuple[asyncio.Task, int]] = {}
+        self._spent: deque = deque()  # (spent_at, tokens)
+        self._unclaimed: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._user_styles: "OrderedDict[str, Counter]" = OrderedDict()
+        self._global_style: Optional[str] = None
+        self._global_style_at = 0.0
+        self.stats = {
+            "speculated": 0,
+            "hits": 0,
+            "misses": 0,
+            "cancelled": 0,
+            "speculative_tokens": 0,
+            "wasted_tokens": 0,
+        }
+
+    def hit_rate(self) -> float:
+        resolved = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / resolved if resolved else 0.0
+
+    def predict_style(self, user_id: str) -> Optional[str]:
+        counts = self._user_styles.get(user_id)
+        if counts:
+            return counts.most_common(1)[0][0]
+
+        # Global favourite, refreshed every few minutes to avoid re-reading metrics
+        now = time.monotonic()
+        if now - self._global_style_at > 300:
+            self._global_style_at = now
+            stats = self.metrics_service.get_month_stats()
+            llm_calls = stats.llm_calls if stats else {}
+            self._global_style = max(llm_calls, key=llm_calls.get) if any(llm_calls.values()) else None
+        return self._global_style
+
+    def _budget_left(self, now: float) -> int:
+        while self._spent and self._spent[0][0] < now - 3600:
+            self._spent.popleft()
+        return self.tokens_per_hour - sum(tokens for _, tokens in self._spent)
+
+    def _expire_unclaimed(self, now: float) -> None:
+        while self._unclaimed:
+            digest, (finished_at, _, tokens) = next(iter(self._unclaimed.items()))
+            if finished_at > now - self.cache.ttl_seconds:
+                break
+            del self._unclaimed[digest]
+            self.stats["wasted_tokens"] += tokens
+
+    def speculate(self, user_id: str, text: str) -> None:
+        """Start the predicted style for a new transcript if the budget allows."""
+        if not self.enabled or not text or self.anthropic_service.under_pressure:
+            return
+        if len(self._tasks) >= self.max_concurrent:
+            return
+
+        style = self.predict_style(user_id)
+        if not style or self.cache.contains(text, style):
+            return
+        key = self.cache.key(text, style)
+        if key in self._tasks:
+            return
+
+        now = time.monotonic()
+        self._expire_unclaimed(now)
+        cost = self.anthropic_service.estimate_tokens(text) * 2
+        if cost > self._budget_left(now):
+            logger.debug("Speculative style budget exhausted")
+            return
+
+        self._spent.append((now, cost))
+        self.stats["speculated"] += 1
+        self.stats["speculative_tokens"] += cost
+        task = asyncio.create_task(self._run(text, style, key, cost))
+        self._tasks[key] = (task, cost)
+
+    async def _run(self, text: str, style: str, key: Tuple[str, str], cost: int) -> None:
+        try:
+            results = [result async for result in self.anthropic_service.process_long_text(text, style)]
+            self.cache.put(text, style, results)
+            self._unclaimed[key[0]] = (time.monotonic(), style, cost)
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            self.stats["wasted_tokens"] += cost
+            raise
+        except Exception as e:
+            logger.debug("Speculative {} failed: {}", style, e)
+            self.stats["wasted_tokens"] += cost
+        finally:
+            self._tasks.pop(key, None)
+
+    def cancel_all(self, keep: Optional[Tuple[str, str]] = None) -> None:
+        for key, (task, _) in list(self._tasks.items()):
+            if key != keep:
+                task.cancel()
+
+    def _remember_choice(self, user_id: str, style: str) -> None:
+        counts = self._user_styles.pop(user_id, None) or Counter()
+        counts[style] += 1
+        self._user_styles[user_id] = counts
+        while len(self._user_styles) > self.max_users:
+            self._user_styles.popitem(last=False)
+
+    async def take(self, user_id: str, text: str, style: str) -> Optional[List[str]]:
+        """Result for a real button press from the cache or a running job, if any."""
+        self._remember_choice(user_id, style)
+        key = self.cache.key(text, style)
+
+        # Real work takes priority over guesses about other messages
+        if self.anthropic_service.under_pressure:
+            self.cancel_all(keep=key)
+
+        entry = self._tasks.get(key)
+        if entry is not None:
+            task = entry[0]
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+            except Exception:
+                pass
+
+        unclaimed = self._unclaimed.pop(key[0], None)
+        if unclaimed is not None:
+            _, speculated_style, tokens = unclaimed
+            if speculated_style == style:
+                self.stats["hits"] += 1
+            else:
+                self.stats["misses"] += 1
+                self.stats["wasted_tokens"] += tokens
+
+        return self.cache.get(text, style)
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Union
+
+try:
+    from loguru import logger
+except ImportError:  # pragma: no cover
+    import logging
+    logger = logging.getLogger(__name__)
+
+SPOOL_PREFIX = "d-buddy-spool-"
+_WIPE_CHUNK = 1024 * 1024
+
+
+def secure_delete(path: Path) -> None:
+    """Overwrite a file with zeros before unlinking it."""
+    try:
+        size = path.stat().st_size
+        with open(path, "r+b") as spool_file:
+            while spool_file.tell() < size:
+                spool_file.write(b"\0" * min(_WIPE_CHUNK, size - spool_file.tell()))
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+    except OSError as e:
+        logger.warning(f"Could not wipe spool file {path.name}: {e}")
+    path.unlink(missing_ok=True)
+
+
+class SpooledMedia:
+    """Media payload kept in memory up to `threshold` bytes and spilled to a temp file above it.
+
+    The spill file is private to this process (mode 0600) and is wiped and
+    deleted by `close()`, which the pipeline calls right after the upload, so
+    recordings never outlive their job on disk. `reader()` can be opened any
+    number of times, so upload retries reuse the payload without downloading
+    it again. On the event loop use `awrite` and `aclose`, which do the disk
+    writes and the wipe in a worker thread.
+    """
+
+    def __init__(self, threshold: int, directory: Optional[str] = None):
+        self.threshold = threshold
+        self.directory = directory or None
+        self.size = 0
+        self.path: Optional[Path] = None
+        self._memory = bytearray()
+        self._file: Optional[BinaryIO] = None
+
+    @property
+    def on_disk(self) -> bool:
+        return self.path is not None
+
+    def write(self, chunk: bytes) -> None:
+        if self.path is None and self.size + len(chunk) > self.threshold:
+            self._spill()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._memory += chunk
+        self.size += len(chunk)
+
+    async def awrite(self, chunk: bytes) -> None:
+        """`write` for the event loop: chunks kept in memory are appended right away."""
+        if self.path is None and self.size + len(chunk) <= self.threshold:
+            self.write(chunk)
+        else:
+            await asyncio.to_thread(self.write, chunk)
+
+    def _spill(self) -> None:
+        fd, path = tempfile.mkstemp(prefix=SPOOL_PREFIX, dir=self.directory)
+        self.path = Path(path)
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(self._memory)
+        self._memory = bytearray()
+
+    def finish(self) -> None:
+        """Mark the payload complete; flushes a spilled file to disk."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @contextmanager
+    def reader(self) -> Iterator[Union[bytearray, BinaryIO]]:
+        """The payload for an upload: the in-memory buffer or a fresh handle on the spill file."""
+        if self.path is None:
+            yield self._memory
+            return
+        with open(self.path, "rb") as spool_file:
+            yield spool_file
+
+    def close(self) -> None:
+        self.finish()
+        if self.path is not None:
+            secure_delete(self.path)
+            self.path = None
+        self._memory = bytearray()
+
+    async def aclose(self) -> None:
+        """`close` for the event loop: a spill file is wiped in a worker thread."""
+        if self.path is None:
+            self.close()
+        else:
+            await asyncio.to_thread(self.close)
+
+    @staticmethod
+    def purge_stale(directory: Optional[str] = None, max_age: float = 3600) -> int:
+        """Delete spill files left behind by a crashed process; returns how many were removed.
+
+        Only files older than `max_age` seconds are touched, so jobs of another
+        process sharing the directory are not affected.
+        """
+        removed = 0
+        cutoff = time.time() - max_age
+        for path in Path(directory or tempfile.gettempdir()).glob(f"{SPOOL_PREFIX}*"):
+            try:
+                if path.stat().st_mtime > cutoff:
+                    continue
+            except OSError:
+                continue
+            secure_delete(path)
+            removed += 1
+        return removed
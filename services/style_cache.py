@@ -0,0 +1,51 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from services.telemetry import CACHE_REQUESTS
+
+
+class StyleCache:
+    """Short-lived in-memory cache of styled results, keyed by text and style.
+
+    Only a digest of the source text is used as the key; results live in RAM
+    until they expire and are never written to disk.
+    """
+
+    def __init__(self, ttl_seconds: float = 3600, max_entries: int = 500):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._items: "OrderedDict[Tuple[str, str], Tuple[float, List[str]]]" = OrderedDict()
+
+    @staticmethod
+    def key(text: str, style: str) -> Tuple[str, str]:
+        # Telegram may trim or reflow whitespace, so hash the normalized text
+        normalized = " ".join(text.split())
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest(), style
+
+    def put(self, text: str, style: str, results: List[str]) -> None:
+        key = self.key(text, style)
+        self._items[key] = (time.monotonic() + self.ttl_seconds, list(results))
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def contains(self, text: str, style: str) -> bool:
+        """Check for a live entry without counting it as a cache lookup."""
+        item = self._items.get(self.key(text, style))
+        return item is not None and item[0] >= time.monotonic()
+
+    def get(self, text: str, style: str) -> Optional[List[str]]:
+        key = self.key(text, style)
+        item = self._items.get(key)
+        if item is None:
+            CACHE_REQUESTS.inc(cache="style", result="miss")
+            return None
+        expires_at, results = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            CACHE_REQUESTS.inc(cache="style", result="miss")
+            return None
+        CACHE_REQUESTS.inc(cache="style", result="hit")
+        return results
@@ -0,0 +1,261 @@
+"""In-process Prometheus-format metrics with an optional HTTP exporter."""
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = tuple(2 ** power for power in range(14, 30, 2))  # 16 KiB .. 256 MiB
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Exposition lines for every labelled series of the metric."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels: str) -> None:
+        """Compute the value at scrape time instead of on the hot path."""
+        self._functions[self._key(labels)] = function
+
+    def value(self, **labels: str) -> float:
+        key = self._key(labels)
+        if key in self._functions:
+            return float(self._functions[key]())
+        return self._values.get(key, 0.0)
+
+    @contextmanager
+    def track_inprogress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self) -> List[str]:
+        values = dict(self._values)
+        for key, function in self._functions.items():
+            try:
+                values[key] = float(function())
+            except Exception:
+                continue
+        return [f"{self.name}{self._labels(key)} {value}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # Per label set: bucket counts (last one is +Inf), sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def series(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """Observation count and sum per label set, in `labelnames` order."""
+        return {key: (sum(counts), total[0]) for key, (counts, total) in self._values.items()}
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{self._labels(key, le)} {cumulative}")
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{self._labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {total[0]}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "bot_stage_latency_seconds",
+    "Latency of each processing stage (get_file, download, transcribe, llm, send)",
+    ("stage", "media_type", "style"),
+))
+BYTES_DOWNLOADED = REGISTRY.register(Counter(
+    "bot_media_downloaded_bytes_total", "Media bytes downloaded from Telegram", ("media_type",),
+))
+BYTES_UPLOADED = REGISTRY.register(Counter(
+    "bot_media_uploaded_bytes_total", "Media bytes uploaded for transcription", ("media_type",),
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "bot_queue_depth", "Requests waiting for capacity", ("queue", "bot"),
+))
+JOBS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "bot_jobs_in_flight", "Jobs currently being processed", ("media_type",),
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "bot_cache_requests_total", "Cache lookups by result", ("cache", "result"),
+))
+RATE_LIMIT_REJECTIONS = REGISTRY.register(Counter(
+    "bot_rate_limit_rejections_total", "Requests rejected by the rate limiter", ("media_type",),
+))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    "bot_upstream_errors_total", "Errors returned by upstream APIs", ("upstream", "code"),
+))
+SILENCE_TRIMMED_SECONDS = REGISTRY.register(Counter(
+    "bot_silence_trimmed_seconds_total", "Seconds of pauses cut from media before upload", ("media_type",),
+))
+TRANSCRIBER_REQUESTS = REGISTRY.register(Counter(
+    "bot_transcriber_requests_total", "Transcription attempts by backend and result", ("backend", "result"),
+))
+ADMISSION_REJECTIONS = REGISTRY.register(Counter(
+    "bot_admission_rejections_total", "Media rejected before download", ("media_type", "reason"),
+))
+MEDIA_BYTES_IN_FLIGHT = REGISTRY.register(Gauge(
+    "bot_media_bytes_in_flight", "Media bytes reserved by jobs being processed", (),
+))
+LOG_RECORDS_DROPPED = REGISTRY.register(Counter(
+    "bot_log_records_dropped_total", "Log records sampled out or dropped on a full log queue", ("reason",),
+))
+PIPELINE_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "bot_pipeline_queue_wait_seconds", "Time jobs wait in a pipeline stage queue", ("pipeline", "stage"),
+))
+LOOP_LAG = REGISTRY.register(Histogram(
+    "bot_event_loop_lag_seconds", "How late the event loop runs a timer",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+))
+LOOP_STALLS = REGISTRY.register(Counter(
+    "bot_event_loop_stalls_total", "Times the event loop was blocked past the stall threshold",
+))
+JOB_BUFFERED_BYTES = REGISTRY.register(Histogram(
+    "bot_job_buffered_bytes", "Bytes a media job holds in memory (media, transcript, reply) after each stage",
+    ("media_type", "stage"), buckets=BYTES_BUCKETS,
+))
+JOB_PEAK_BYTES = REGISTRY.register(Histogram(
+    "bot_job_peak_buffered_bytes", "Most bytes a media job held in memory at once", ("media_type",),
+    buckets=BYTES_BUCKETS,
+))
+
+
+async def start_metrics_server(
+    host: str,
+    port: int,
+    registry: Optional[Registry] = None,
+    health: Optional[Callable[[], Dict[str, Any]]] = None,
+) -> web.AppRunner:
+    """Serve the registry at /metrics and `health()` at /health; returns the runner for cleanup.
+
+    /health answers 503 when the returned dict has a false "ready".
+    """
+    registry = registry or REGISTRY
+
+    async def handle_metrics(_request: web.Request) -> web.Response:
+        return web.Response(
+            body=registry.render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    async def handle_health(_request: web.Request) -> web.Response:
+        report = health() if health else {"ready": True}
+        return web.json_response(report, status=200 if report.get("ready", True) else 503)
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/health", handle_health)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,41 @@
+from typing import Any, Awaitable, Callable, Dict, List
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config.config import Config
+from services.container import ServiceContainer
+
+
+def build_tenants(config: Config) -> List[ServiceContainer]:
+    """Containers for the main bot (first, the root) and every bot in BOTS."""
+    root = ServiceContainer(config)
+    tenants = [root] + [ServiceContainer(config.for_bot(bot), root=root) for bot in config.BOTS]
+    tokens = [tenant.config.BOT_TOKEN for tenant in tenants]
+    if len(set(tokens)) != len(tokens):
+        raise ValueError("BOTS repeats a bot token")
+    names = [tenant.config.BOT_NAME for tenant in tenants]
+    if len(set(names)) != len(names):
+        raise ValueError("BOTS repeats a bot name or uses the main bot's BOT_NAME")
+    data_dirs = [tenant.config.DATA_DIR for tenant in tenants]
+    if len(set(data_dirs)) != len(data_dirs):
+        raise ValueError("BOTS entries need distinct names or data_dir values")
+    return tenants
+
+
+class TenantMiddleware(BaseMiddleware):
+    """Hand handlers the service container of the bot that received the update."""
+
+    def __init__(self, containers: Dict[int, ServiceContainer]):
+        self.containers = containers
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        services = self.containers.get(data["bot"].id)
+        if services is not None:
+            data["services"] = services
+        return await handler(event, data)
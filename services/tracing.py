@@ -0,0 +1,238 @@
+"""Lightweight request tracing with an in-memory span ring buffer."""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import ClientSession, ClientTimeout
+
+try:
+    from loguru import logger
+except ImportError:  # pragma: no cover
+    import logging
+    logger = logging.getLogger(__name__)
+
+MAX_SPANS_PER_TRACE = 100
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "start_wall", "duration", "attributes")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.start_wall = time.time()
+        self.duration = 0.0
+        self.attributes = attributes
+
+
+class Trace:
+    __slots__ = ("trace_id", "root", "spans")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.trace_id = os.urandom(16).hex()
+        self.root = Span(self.trace_id, None, name, attributes)
+        self.spans: List[Span] = []
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+def _percentile(sorted_values: List[float], quantile: float) -> float:
+    # Nearest-rank percentile
+    rank = max(1, math.ceil(quantile * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Tracer:
+    """Record timed spans per update into bounded ring buffers."""
+
+    def __init__(self, max_spans: int = 5000, max_traces: int = 500):
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+        self.traces: Deque[Trace] = deque(maxlen=max_traces)
+        self._exporters: List["OtlpExporter"] = []
+
+    def add_exporter(self, exporter: "OtlpExporter") -> None:
+        self._exporters.append(exporter)
+
+    def _finish(self, span: Span) -> None:
+        span.duration = time.perf_counter() - span.start
+        self.spans.append(span)
+        for exporter in self._exporters:
+            exporter.enqueue(span)
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[Trace]:
+        """Start a new trace for one update."""
+        trace = Trace(name, attributes)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root)
+        try:
+            yield trace
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            self._finish(trace.root)
+            self.traces.append(trace)
+
+    @contextmanager
+    def resume(self, trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+        """Attach spans to a trace started elsewhere, e.g. in a pipeline worker task."""
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root if trace else None)
+        try:
+            yield trace
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Time a block as a child of the current span (or as an orphan span)."""
+        trace = _current_trace.get()
+        parent = _current_span.get()
+        span = Span(trace.trace_id if trace else "", parent.span_id if parent else None, name, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+            if trace is not None and len(trace.spans) < MAX_SPANS_PER_TRACE:
+                trace.spans.append(span)
+
+    def stage_percentiles(self, window_seconds: float) -> Dict[str, Dict[str, float]]:
+        """p50/p95/p99 durations per span name over the recent window."""
+        cutoff = time.time() - window_seconds
+        durations: Dict[str, List[float]] = {}
+        for span in self.spans:
+            if span.start_wall >= cutoff:
+                durations.setdefault(span.name, []).append(span.duration)
+
+        report = {}
+        for name, values in durations.items():
+            values.sort()
+            report[name] = {
+                "count": len(values),
+                "p50": _percentile(values, 0.50),
+                "p95": _percentile(values, 0.95),
+                "p99": _percentile(values, 0.99),
+            }
+        return report
+
+    def slowest_traces(self, limit: int = 5, window_seconds: float = 3600) -> List[Trace]:
+        cutoff = time.time() - window_seconds
+        recent = [trace for trace in self.traces if trace.root.start_wall >= cutoff]
+        return sorted(recent, key=lambda trace: trace.root.duration, reverse=True)[:limit]
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Outer middleware that assigns a trace ID to every update."""
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        update_type = getattr(event, "event_type", type(event).__name__)
+        with self.tracer.trace("update", update_type=update_type) as trace:
+            data["trace_id"] = trace.trace_id
+            return await handler(event, data)
+
+
+class OtlpExporter:
+    """Batch spans to a local OTLP/HTTP collector (JSON encoding).
+
+    Spans are buffered in a bounded queue and dropped if the collector is
+    slow or down, so tracing never applies back-pressure to the bot.
+    """
+
+    def __init__(self, endpoint: str, service_name: str = "d-buddy", interval: float = 5.0, max_queue: int = 2048):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.interval = interval
+        self._queue: Deque[Span] = deque(maxlen=max_queue)
+        self._task: Optional[asyncio.Task] = None
+
+    def enqueue(self, span: Span) -> None:
+        if span.trace_id:
+            self._queue.append(span)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def _encode(self, spans: List[Span]) -> Dict[str, Any]:
+        def value(item: Any) -> Dict[str, Any]:
+            if isinstance(item, bool):
+                return {"boolValue": item}
+            if isinstance(item, int):
+                return {"intValue": str(item)}
+            if isinstance(item, float):
+                return {"doubleValue": item}
+            return {"stringValue": str(item)}
+
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": "d-buddy.tracing"},
+                "spans": [{
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                    "name": span.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(int(span.start_wall * 1e9)),
+                    "endTimeUnixNano": str(int((span.start_wall + span.duration) * 1e9)),
+                    "attributes": [{"key": k, "value": value(v)} for k, v in span.attributes.items()],
+                } for span in spans],
+            }],
+        }]}
+
+    async def flush(self) -> None:
+        if not self._queue:
+            return
+        spans = list(self._queue)
+        self._queue.clear()
+        try:
+            async with ClientSession(timeout=ClientTimeout(total=5)) as session:
+                async with session.post(self.url, json=self._encode(spans)) as response:
+                    if response.status >= 300:
+                        logger.debug(f"OTLP export failed with status {response.status}")
+        except Exception as e:
+            logger.debug(f"OTLP export failed: {e}")
+
+
+tracer = Tracer()
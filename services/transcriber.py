@@ -0,0 +1,252 @@
+import asyncio
+import io
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+from models.transcription import TranscriptionResult, Word
+from services.model_router import ModelStats
+from services.spool import SpooledMedia
+from services.telemetry import STAGE_LATENCY, TRANSCRIBER_REQUESTS
+from services.tracing import tracer
+
+try:
+    from loguru import logger
+except ImportError:  # pragma: no cover
+    import logging
+    logger = logging.getLogger(__name__)
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:
+    WhisperModel = None
+
+
+class Transcriber(ABC):
+    """A speech recognition backend; every backend returns a TranscriptionResult.
+
+    `max_seconds` is the longest media the backend is offered; None takes
+    any length, including media whose duration Telegram did not report.
+    """
+
+    name = ""
+    max_seconds: Optional[float] = None
+
+    def accepts(self, duration: Optional[float]) -> bool:
+        if self.max_seconds is None:
+            return True
+        return duration is not None and duration <= self.max_seconds
+
+    @abstractmethod
+    async def transcribe_file(self, path: Path, media_type: str = "") -> TranscriptionResult:
+        """Transcribe media stored at `path`."""
+
+    @abstractmethod
+    async def transcribe_spool(self, spool: SpooledMedia, media_type: str = "") -> TranscriptionResult:
+        """Transcribe media buffered in `spool`; it can be read more than once."""
+
+
+class LocalTranscriber(Transcriber):
+    """faster-whisper on the CPU (requirements-local.txt), for Deepgram outages and short clips.
+
+    The model is loaded on first use, in a worker thread like the recognition
+    itself, so the event loop never waits for it. At most `max_concurrency`
+    files are recognized at once; each uses `threads` CPU threads.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        model: str = "small",
+        language: str = "ru",
+        threads: int = 2,
+        max_seconds: Optional[float] = 300,
+        max_concurrency: int = 1,
+    ):
+        if WhisperModel is None:
+            raise RuntimeError("faster-whisper is not installed (pip install -r requirements-local.txt)")
+        self.model_name = model
+        self.language = language
+        self.threads = threads
+        self.max_seconds = max_seconds
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+
+    def _load(self):
+        with self._model_lock:
+            if self._model is None:
+                started = time.perf_counter()
+                self._model = WhisperModel(self.model_name, device="cpu", compute_type="int8", cpu_threads=self.threads)
+                logger.info(f"Local transcription model {self.model_name} loaded in {time.perf_counter() - started:.1f} s")
+            return self._model
+
+    def _recognize(self, audio: Union[str, io.IOBase]) -> TranscriptionResult:
+        segments, info = self._load().transcribe(audio, language=self.language, word_timestamps=True, vad_filter=True)
+        texts = []
+        words = []
+        for segment in segments:
+            texts.append(segment.text.strip())
+            for word in segment.words or []:
+                words.append(Word(word=word.word.strip(), start=word.start, end=word.end, confidence=word.probability))
+        return TranscriptionResult(
+            text=" ".join(text for text in texts if text),
+            confidence=sum(word.confidence for word in words) / len(words) if words else 0.0,
+            words=words,
+            language=info.language,
+        )
+
+    async def _run(self, audio: Union[str, io.IOBase], media_type: str) -> TranscriptionResult:
+        async with self._slots:
+            with STAGE_LATENCY.time(stage="transcribe_local", media_type=media_type), \
+                    tracer.span("transcribe_local", media_type=media_type):
+                return await asyncio.to_thread(self._recognize, audio)
+
+    async def transcribe_file(self, path: Path, media_type: str = "") -> TranscriptionResult:
+        return await self._run(str(path), media_type)
+
+    async def transcribe_spool(self, spool: SpooledMedia, media_type: str = "") -> TranscriptionResult:
+        with spool.reader() as payload:
+            audio = io.BytesIO(payload) if isinstance(payload, bytearray) else payload
+            return await self._run(audio, media_type)
+
+
+class FakeTranscriber(Transcriber):
+    """Deterministic backend for tests and load tests: the transcript depends only on the payload size.
+
+    One word per `bytes_per_word` bytes (at least one), after `latency`
+    seconds. With `error` set every call raises it instead.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        bytes_per_word: int = 1000,
+        error: Optional[Exception] = None,
+        max_seconds: Optional[float] = None,
+    ):
+        self.latency = latency
+        self.bytes_per_word = bytes_per_word
+        self.error = error
+        self.max_seconds = max_seconds
+        self.calls = 0
+
+    async def _result(self, size: int) -> TranscriptionResult:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        words = [
+            Word(word=f"слово{index + 1}", start=index * 0.4, end=index * 0.4 + 0.3, confidence=0.9)
+            for index in range(max(1, size // self.bytes_per_word))
+        ]
+        return TranscriptionResult(
+            text=" ".join(word.word for word in words), confidence=0.9, words=words, language="ru"
+        )
+
+    async def transcribe_file(self, path: Path, media_type: str = "") -> TranscriptionResult:
+        return await self._result(path.stat().st_size)
+
+    async def transcribe_spool(self, spool: SpooledMedia, media_type: str = "") -> TranscriptionResult:
+        return await self._result(spool.size)
+
+
+class TranscriberRouter:
+    """Run each job on the first backend that succeeds, in an order picked per job.
+
+    The order starts from the tenant's TRANSCRIBER_BACKENDS, keeping only
+    backends that take media of the job's duration. Clips up to
+    `short_clip_seconds` go to the healthy backend with the lowest median
+    latency on recent short clips; a backend with no recent short clips is
+    tried first so it gets measured (about once per `ModelStats.max_age`
+    while it is slower). Backends failing more than `max_error_rate` of
+    recent jobs are tried last, so during a Deepgram outage jobs go straight
+    to the next backend instead of waiting on retries first.
+
+    The router is shared by all bots of the process: upstream health does
+    not depend on which bot received the file.
+    """
+
+    def __init__(self, backends: Dict[str, Transcriber], max_error_rate: float = 0.5, short_clip_seconds: float = 30.0):
+        self.backends = backends
+        self.max_error_rate = max_error_rate
+        self.short_clip_seconds = short_clip_seconds
+        self.stats: Dict[str, ModelStats] = {}
+        self.short_stats: Dict[str, ModelStats] = {}
+
+    @staticmethod
+    def _get(stats: Dict[str, ModelStats], name: str) -> ModelStats:
+        if name not in stats:
+            stats[name] = ModelStats()
+        return stats[name]
+
+    def _is_short(self, duration: Optional[float]) -> bool:
+        return duration is not None and duration <= self.short_clip_seconds
+
+    def candidates(self, order: List[str], duration: Optional[float]) -> List[str]:
+        """Backends to try in order for media of `duration` seconds."""
+        names = [name for name in dict.fromkeys(order) if name in self.backends]
+        # Media too long for every configured backend is still tried rather than refused
+        names = [name for name in names if self.backends[name].accepts(duration)] or names
+        healthy = [name for name in names if self._get(self.stats, name).error_rate() <= self.max_error_rate]
+        unhealthy = [name for name in names if name not in healthy]
+        if self._is_short(duration):
+            # Unmeasured backends sort first; sort() is stable, so ties keep the configured order
+            healthy.sort(key=lambda name: self._get(self.short_stats, name).latency() or 0.0)
+        return healthy + unhealthy
+
+    def record(self, name: str, duration: Optional[float], latency: float, ok: bool) -> None:
+        self._get(self.stats, name).record(latency, ok)
+        if self._is_short(duration):
+            self._get(self.short_stats, name).record(latency, ok)
+        TRANSCRIBER_REQUESTS.inc(backend=name, result="ok" if ok else "error")
+
+    async def _run(
+        self,
+        order: List[str],
+        duration: Optional[float],
+        call: Callable[[Transcriber], Awaitable[TranscriptionResult]],
+    ) -> TranscriptionResult:
+        names = self.candidates(order, duration)
+        if not names:
+            raise RuntimeError(f"No transcription backend available among {', '.join(order) or 'none'}")
+        for attempt, name in enumerate(names, 1):
+            started = time.perf_counter()
+            try:
+                with tracer.span("transcribe_backend", backend=name):
+                    result = await call(self.backends[name])
+            except Exception as e:
+                self.record(name, duration, time.perf_counter() - started, ok=False)
+                if attempt == len(names):
+                    raise
+                logger.warning(f"Transcription backend {name} failed, trying {names[attempt]}: {e}")
+                continue
+            self.record(name, duration, time.perf_counter() - started, ok=True)
+            return result
+
+    async def transcribe_file(
+        self, path: Path, media_type: str, duration: Optional[float], order: List[str]
+    ) -> TranscriptionResult:
+        return await self._run(order, duration, lambda backend: backend.transcribe_file(path, media_type))
+
+    async def transcribe_spool(
+        self, spool: SpooledMedia, media_type: str, duration: Optional[float], order: List[str]
+    ) -> TranscriptionResult:
+        return await self._run(order, duration, lambda backend: backend.transcribe_spool(spool, media_type))
+
+    def snapshot(self) -> Dict[str, Dict[str, Optional[float]]]:
+        return {
+            name: {
+                "error_rate": stats.error_rate(),
+                "p50": stats.latency(0.5),
+                "p95": stats.latency(0.95),
+                "short_p50": self._get(self.short_stats, name).latency(0.5),
+            }
+            for name, stats in self.stats.items()
+        }
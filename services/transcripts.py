@@ -0,0 +1,43 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from services.telemetry import CACHE_REQUESTS
+
+
+class TranscriptStore:
+    """Short-lived in-memory map from a transcript's keyboard message to its full text.
+
+    Style buttons sit on the last part of a long transcript, so the callback
+    only sees that part. The full text is kept here, in RAM only and never on
+    disk, until it expires or is evicted by newer transcripts.
+
+    One store serves every bot of the process. A user's private chat has the
+    same id with each bot, so entries are keyed by bot name as well.
+    """
+
+    def __init__(self, ttl_seconds: float = 3600, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._items: "OrderedDict[Tuple[str, int, int], Tuple[float, str]]" = OrderedDict()
+
+    def put(self, bot: str, chat_id: int, message_id: int, text: str) -> None:
+        key = (bot, chat_id, message_id)
+        self._items[key] = (time.monotonic() + self.ttl_seconds, text)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def get(self, bot: str, chat_id: int, message_id: int) -> Optional[str]:
+        key = (bot, chat_id, message_id)
+        item = self._items.get(key)
+        if item is None:
+            CACHE_REQUESTS.inc(cache="transcript", result="miss")
+            return None
+        expires_at, text = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            CACHE_REQUESTS.inc(cache="transcript", result="miss")
+            return None
+        CACHE_REQUESTS.inc(cache="transcript", result="hit")
+        return text
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for the VIP whitelist
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.access_control import AccessControlService
+
+
+def test_whitelist_is_int_keyed_and_written_atomically():
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "unlimited_users.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(["42", " 7 ", "not-an-id"], f)
+
+        service = AccessControlService(whitelist_file=path, initial_users=["1"])
+        assert service.is_unlimited(42) and service.is_unlimited("7") and service.is_unlimited("1")
+        assert not service.is_unlimited("not-an-id")
+        assert not service.add_user("abc") and not service.add_user(42)
+        assert service.add_user("100") and service.remove_user(7)
+        assert service.list_users() == ["1", "42", "100"]
+
+        with open(path, encoding="utf-8") as f:
+            assert json.load(f) == [1, 42, 100]
+        # Only the whitelist and its lock file remain, no half-written temp files
+        assert sorted(os.listdir(data_dir)) == ["unlimited_users.json", "unlimited_users.json.lock"]
+
+        assert service.import_users("5 6 42".split()) == 2
+        assert service.export_users().split() == ["1", "5", "6", "42", "100"]
+        service.import_users(["9"], replace=True)
+        assert service.list_users() == ["9"]
+
+
+def test_processes_sharing_the_file_stay_in_sync():
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "unlimited_users.json")
+        first = AccessControlService(whitelist_file=path, reload_interval=3600)
+        second = AccessControlService(whitelist_file=path, reload_interval=3600)
+
+        # Edits re-read the file first, so neither process loses the other's users
+        assert first.add_user(1) and second.add_user(2)
+        assert second.list_users() == ["1", "2"]
+        version = first.version
+
+        # Lookups rely on the periodic check instead of hitting the disk
+        assert not first.is_unlimited(2)
+        first.refresh(force=True)
+        assert first.is_unlimited(2) and first.version > version
+
+        # A corrupt file must not wipe the in-memory list
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("[1, 2")
+        first.refresh(force=True)
+        assert first.is_unlimited(1) and first.is_unlimited(2)
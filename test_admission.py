@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for media admission control and the in-flight byte budget
+"""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.admission import MB, AdmissionController, ByteBudget
+from services.pipeline import JobRejected
+
+
+def test_byte_budget_grants_in_order_and_clamps_large_requests():
+    async def main():
+        budget = ByteBudget(10)
+        granted = []
+
+        async def job(name, size, hold):
+            reserved = await budget.acquire(size)
+            granted.append(name)
+            await asyncio.sleep(hold)
+            budget.release(reserved)
+            return reserved
+
+        results = await asyncio.gather(
+            job("a", 6, 0.02), job("b", 6, 0.01), job("c", 2, 0.01), job("huge", 50, 0.01)
+        )
+        return granted, results, budget.in_use
+
+    granted, results, in_use = asyncio.run(main())
+    # "c" would fit next to "a" but must not overtake "b"
+    assert granted == ["a", "b", "c", "huge"]
+    assert results[3] == 10 and in_use == 0
+
+
+def test_cancelled_waiter_does_not_leak_budget():
+    async def main():
+        budget = ByteBudget(10)
+        await budget.acquire(8)
+        waiter = asyncio.create_task(budget.acquire(5))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        budget.release(8)
+        return budget.in_use, budget.waiting
+
+    assert asyncio.run(main()) == (0, 0)
+
+
+def test_metadata_checks_before_download():
+    admission = AdmissionController(max_file_bytes=20 * MB, budget_bytes=128 * MB, min_cost_seconds=60)
+
+    try:
+        admission.check_size(SimpleNamespace(file_size=50 * MB, duration=60), "video")
+        assert False, "oversize media must be rejected"
+    except JobRejected as e:
+        assert "50.0 МБ" in e.reply
+
+    admission.check_size(SimpleNamespace(file_size=None, duration=60), "voice")
+    # Quota is charged in audio seconds, with a floor for short clips
+    assert admission.cost(SimpleNamespace(duration=2)) == 60
+    assert admission.cost(SimpleNamespace(duration=1500)) == 1500
+    assert admission.cost(SimpleNamespace(duration=None)) == 60
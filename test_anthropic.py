@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Tests for long-text (map-reduce) styling in AnthropicService
+"""
+
+import asyncio
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from anthropic import APIStatusError
+
+from config.config import ModelRoute
+from services.anthropic import AnthropicService
+from services.model_router import ModelRouter
+
+
+class FakeMessages:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompts = []
+
+    async def create(self, model, max_tokens, messages, **kwargs):
+        prompt = messages[0]["content"]
+        if not isinstance(prompt, str):
+            prompt = "".join(block["text"] for block in prompt)
+        self.prompts.append(prompt)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(random.uniform(0, 0.01))
+        self.in_flight -= 1
+        marker = prompt[prompt.find("PARA"):].split()[0] if "PARA" in prompt else "MERGED"
+        return SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=marker)],
+            usage=SimpleNamespace(input_tokens=1, output_tokens=1),
+        )
+
+
+def _service(max_concurrency=2):
+    service = AnthropicService("test", chunk_tokens=100, max_concurrency=max_concurrency)
+    service.client = SimpleNamespace(messages=FakeMessages())
+    return service
+
+
+def _transcript(paragraphs=12):
+    return "\n\n".join(f"PARA{i} " + "слово " * 40 for i in range(paragraphs))
+
+
+def test_chunks_follow_paragraphs_and_budget():
+    service = _service()
+    chunks = service.split_into_chunks(_transcript())
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= service.chunk_tokens * 3 for chunk in chunks)
+    assert all(chunk.startswith("PARA") for chunk in chunks)
+
+
+def test_long_text_results_are_ordered_and_capped():
+    service = _service(max_concurrency=2)
+
+    async def scenario():
+        return [result async for result in service.process_long_text(_transcript(), "proofread")]
+
+    results = asyncio.run(scenario())
+    chunks = service.split_into_chunks(_transcript())
+
+    assert results == [chunk.split()[0] for chunk in chunks]
+    assert service.client.messages.max_in_flight <= 2
+
+
+def test_brief_is_merged_into_one_result():
+    service = _service()
+
+    async def scenario():
+        return [result async for result in service.process_long_text(_transcript(), "brief")]
+
+    results = asyncio.run(scenario())
+
+    assert len(results) == 1
+    assert "partial_briefs" in service.client.messages.prompts[-1]
+
+
+def test_style_instructions_are_sent_as_system_prompt():
+    service = _service()
+    calls = []
+    create = service.client.messages.create
+
+    async def recording_create(**kwargs):
+        calls.append(kwargs)
+        return await create(**kwargs)
+
+    service.client.messages.create = recording_create
+    asyncio.run(service.process_text("PARA0 текст", "proofread"))
+
+    system = calls[0]["system"]
+    assert isinstance(system, str)
+    assert "{text}" not in system and "PARA0" not in system
+    assert calls[0]["messages"][0]["content"] == "<text>\nPARA0 текст\n</text>"
+    assert service.usage_totals == {"input_tokens": 1, "output_tokens": 1}
+
+
+class Overloaded(APIStatusError):
+    def __init__(self):
+        Exception.__init__(self, "Overloaded")
+        self.status_code = 529
+
+
+def test_routes_short_input_to_fast_tier():
+    router = ModelRouter([
+        ModelRoute(model="fast", styles=["proofread"], max_input_tokens=100, fallbacks=["main"]),
+        ModelRoute(model="main", fallbacks=["backup"]),
+    ])
+
+    assert router.candidates("proofread", 50)[0] == ["fast", "main"]
+    assert router.candidates("proofread", 500)[0] == ["main", "backup"]
+    assert router.candidates("brief", 50)[0] == ["main", "backup"]
+
+
+def test_overloaded_model_fails_over_and_is_deprioritized():
+    router = ModelRouter([ModelRoute(model="main", fallbacks=["backup"], timeout=1.0)])
+    service = _service()
+    service.router = router
+    create = service.client.messages.create
+    used = []
+
+    async def flaky_create(model, **kwargs):
+        used.append(model)
+        if model == "main":
+            raise Overloaded()
+        return await create(model=model, **kwargs)
+
+    service.client.messages.create = flaky_create
+    asyncio.run(service.process_text("PARA0 текст", "proofread"))
+    asyncio.run(service.process_text("PARA1 текст", "proofread"))
+
+    # Second request goes straight to the healthy fallback
+    assert used == ["main", "backup", "backup"]
+    assert router.snapshot()["main"]["error_rate"] == 1.0
+
+
+def test_fallback_output_budget_is_clamped_to_its_model():
+    router = ModelRouter(
+        [ModelRoute(model="main", fallbacks=["small"], timeout=1.0)],
+        max_output_tokens={"main": 8192, "small": 4096},
+    )
+    service = _service()
+    service.router = router
+    create = service.client.messages.create
+    budgets = []
+
+    async def flaky_create(model, max_tokens, **kwargs):
+        budgets.append((model, max_tokens))
+        if model == "main":
+            raise Overloaded()
+        return await create(model=model, max_tokens=max_tokens, **kwargs)
+
+    service.client.messages.create = flaky_create
+    # Long enough for the scaled budget to pass the small model's limit
+    text = "PARA0 " + "слово " * 3000
+    asyncio.run(service.process_text(text, "proofread"))
+
+    assert service._max_tokens_for(text) == 8192
+    assert budgets == [("main", 8192), ("small", 4096)]
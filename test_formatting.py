@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests for the Telegram message splitter
+"""
+
+import os
+import random
+import re
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.telegram_formatting import split_long_message, utf16_len
+
+
+def _plain(parts):
+    return re.sub(r'\s+', ' ', ' '.join(parts)).strip()
+
+
+def test_short_message_is_unchanged():
+    assert split_long_message("Привет, мир") == ["Привет, мир"]
+
+
+def test_prefers_paragraph_and_sentence_boundaries():
+    paragraph = "Первое предложение абзаца. " * 20
+    text = "\n\n".join([paragraph.strip()] * 10)
+    parts = split_long_message(text, limit=1200)
+
+    assert all(utf16_len(part) <= 1200 for part in parts)
+    assert all(part.endswith('.') for part in parts)
+    assert _plain(parts) == _plain([text])
+
+
+def test_counts_utf16_units():
+    text = ("слово 🎙️ " * 2000).strip()
+    parts = split_long_message(text, limit=500)
+
+    assert all(utf16_len(part) <= 500 for part in parts)
+    assert any(len(part) < utf16_len(part) for part in parts)
+    assert _plain(parts) == _plain([text])
+
+
+def test_never_breaks_markup():
+    text = ("<b>жирный текст &amp; ещё</b> обычный &lt;текст&gt; " * 400).strip()
+    parts = split_long_message(text, limit=333)
+
+    for part in parts:
+        assert utf16_len(part) <= 333
+        assert not re.search(r'<[^>]*$', part)
+        assert not re.search(r'&#?\w*$', part)
+        assert part.count('<b>') == part.count('</b>')
+
+
+def test_reopens_tags_across_parts():
+    text = "<i>" + "курсив " * 1000 + "</i>"
+    parts = split_long_message(text, limit=400)
+
+    assert len(parts) > 1
+    assert all(part.startswith('<i>') and part.endswith('</i>') for part in parts)
+
+
+def _nested_markup(rng: random.Random, depth: int = 0) -> str:
+    pieces = []
+    for _ in range(rng.randint(1, 6)):
+        roll = rng.random()
+        if roll < 0.3 and depth < 4:
+            tag = rng.choice(["b", "i", "u", "s", "code"])
+            pieces.append(f"<{tag}>{_nested_markup(rng, depth + 1)}</{tag}>")
+        elif roll < 0.4 and depth < 4:
+            url = "https://example.com/" + "x" * rng.randint(1, 120)
+            pieces.append(f'<a href="{url}">{_nested_markup(rng, depth + 1)}</a>')
+        else:
+            words = ["слово", "текст", "🎙️", "a&amp;b", "&lt;x&gt;", "длинноеслово" * 3]
+            pieces.append(" ".join(rng.choice(words) for _ in range(rng.randint(1, 30))))
+    return " ".join(pieces)
+
+
+def _text_only(markup: str) -> str:
+    return re.sub(r'\s+', '', re.sub(r'<[^>]*>', '', markup))
+
+
+def _balanced(part: str) -> bool:
+    stack = []
+    for match in re.finditer(r'<(/?)([a-z]+)[^>]*>', part):
+        if not match.group(1):
+            stack.append(match.group(2))
+        elif not stack or stack.pop() != match.group(2):
+            return False
+    return not stack
+
+
+def test_nested_markup_never_exceeds_the_limit():
+    # Deep nesting and long links can leave no room for text between the
+    # reopened and closing tags; such parts are sent without markup
+    for seed in range(500):
+        rng = random.Random(seed)
+        text = _nested_markup(rng)
+        limit = rng.choice([50, 100, 200])
+        parts = split_long_message(text, limit=limit)
+
+        for part in parts:
+            assert utf16_len(part) <= limit, (seed, part)
+            assert _balanced(part), (seed, part)
+        assert _text_only(''.join(parts)) == _text_only(text), seed
+
+
+def test_first_limit_reserves_room():
+    text = "слово " * 3000
+    parts = split_long_message(text, limit=4000, first_limit=3900)
+
+    assert utf16_len(parts[0]) <= 3900
+    assert all(utf16_len(part) <= 4000 for part in parts[1:])
+
+
+def test_small_limits_never_break_entities():
+    text = "<b>a&amp;b</b>&lt;&gt;cc&#128512;&amp;&amp;" * 3
+    for limit in range(1, 12):
+        parts = split_long_message(text, limit=limit)
+
+        for part in parts:
+            assert re.sub(r'&(#\d+|\w+);', '', part).count('&') == 0, (limit, part)
+            assert _text_only(part), (limit, part)
+            assert utf16_len(part) <= limit or re.fullmatch(r'&(#\d+|\w+);', part), (limit, part)
+        assert _text_only(''.join(parts)) == _text_only(text)
+
+
+def test_large_transcript_parts_fit():
+    # Time scaling is measured by benchmarks/bench_split.py, not asserted here
+    sentence = "Это предложение из очень длинной транскрипции. "
+    large = (sentence * 25000)[:1_000_000]
+    parts = split_long_message(large)
+
+    assert all(utf16_len(part) <= 4000 for part in parts)
+    assert _plain(parts) == _plain([large])
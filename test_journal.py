@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the durable job journal
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from handlers.style import process_style_selection
+from services.journal import JobJournal
+
+
+def test_unfinished_jobs_are_pending_after_a_restart():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "jobs.journal")
+        journal = JobJournal(path)
+        journal.begin("media:1:10", {"kind": "media", "chat_id": 1})
+        journal.advance("media:1:10", "transcribe")
+        journal.begin("media:1:11", {"kind": "media", "chat_id": 1})
+        journal.finish("media:1:11")
+        journal.close()
+
+        journal = JobJournal(path)
+        pending = journal.pending()
+        assert [entry["id"] for entry in pending] == ["media:1:10"]
+        assert pending[0]["stage"] == "transcribe"
+
+        # A redelivered update for the finished job is a duplicate
+        assert journal.begin("media:1:11", {"kind": "media"}) is None
+        # Beginning the pending job again resumes it from its last stage
+        entry = journal.begin("media:1:10", {"kind": "media"})
+        assert entry["stage"] == "transcribe" and entry["chat_id"] == 1
+        assert journal.begin("media:1:10", {"kind": "media"}) is None
+        assert not journal.is_pending("media:1:10")
+        journal.finish("media:1:10")
+        journal.close()
+
+        assert JobJournal(path).pending() == []
+
+
+def test_compaction_and_torn_lines():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "jobs.journal")
+        journal = JobJournal(path, compact_every=10, remember_done=5)
+        for i in range(20):
+            journal.begin(f"job:{i}", {"n": i})
+            journal.finish(f"job:{i}")
+        journal.begin("job:live", {"n": -1})
+        journal.close()
+        with open(path) as f:
+            lines = f.readlines()
+        # Only recent done ids and live entries survive compaction
+        assert len(lines) < 20
+
+        with open(path, "a") as f:
+            f.write('{"op": "begin", "id": "job:torn", "ent')
+        journal = JobJournal(path, remember_done=5)
+        assert [entry["id"] for entry in journal.pending()] == ["job:live"]
+        assert journal.begin("job:19", {}) is None
+        journal.close()
+
+
+def test_style_request_is_finished_when_the_error_reply_fails():
+    async def no_answer(*args, **kwargs):
+        raise RuntimeError("Telegram is down")
+
+    async def failing_take(*args):
+        raise ValueError("LLM is down")
+
+    async def acknowledge(*args):
+        pass
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "jobs.journal")
+        journal = JobJournal(path)
+        services = SimpleNamespace(
+            job_journal=journal,
+            track=lambda task: None,
+            config=SimpleNamespace(BOT_NAME="main"),
+            transcript_store=SimpleNamespace(get=lambda *args: "текст"),
+            style_speculator=SimpleNamespace(take=failing_take),
+            outbound_sender=SimpleNamespace(answer=no_answer),
+        )
+        callback = SimpleNamespace(
+            id="1", data="style_brief", answer=acknowledge, from_user=SimpleNamespace(id=7),
+            message=SimpleNamespace(chat=SimpleNamespace(id=7, type="private"), message_id=10, text="текст"),
+        )
+        try:
+            asyncio.run(process_style_selection(callback, services))
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("the failed error reply was swallowed")
+        journal.close()
+
+        # Nothing is left for the next start to send a "press again" note about
+        assert JobJournal(path).pending() == []
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared JSON codec and its orjson fallback
+"""
+
+import os
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import json_codec
+
+STATE = {"2024-05": {"unique_users": ["1", "2"], "llm_calls": {"brief": 3}}, "name": "Пётр"}
+
+
+def test_backends_read_each_others_files():
+    try:
+        assert json_codec.use_orjson(False) is False
+        plain = json_codec.dumps(STATE, indent=True)
+        assert "Пётр" in plain
+        enabled = json_codec.use_orjson(True)
+        # Without orjson installed the codec stays on the json module
+        assert json_codec.backend() == ("orjson" if enabled else "json")
+        fast = json_codec.dumps(STATE, indent=True)
+        assert "Пётр" in fast
+        assert json_codec.loads(plain) == json_codec.loads(fast.encode()) == STATE
+    finally:
+        json_codec.use_orjson(False)
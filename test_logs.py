@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the background JSON log sink
+"""
+
+import json
+import logging
+import os
+import sys
+import tempfile
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loguru import logger
+
+from services.logs import setup_logging, stop_logging
+from services.tracing import Tracer
+
+
+def test_records_are_json_with_trace_ids_and_debug_is_sampled():
+    with tempfile.TemporaryDirectory() as directory:
+        log_file = os.path.join(directory, "bot.log")
+        setup_logging(level="DEBUG", log_file=log_file, console=False, debug_per_second=2)
+        try:
+            with Tracer().trace("update") as trace:
+                logger.info("Processing {} message", "voice")
+                for i in range(5):
+                    logger.debug("Chunk {}", i)
+                try:
+                    raise ValueError("boom")
+                except ValueError as e:
+                    logger.opt(exception=e).error("Failed")
+            # Stdlib loggers (aiogram, aiohttp, SDKs) end up in the same file
+            logging.getLogger("aiogram.test").warning("from %s", "stdlib")
+        finally:
+            stop_logging()
+            logger.remove()
+            logger.add(sys.stderr)
+
+        with open(log_file, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+
+    messages = [record["msg"] for record in records]
+    assert messages == ["Processing voice message", "Chunk 0", "Chunk 1", "Failed", "from stdlib"]
+    assert all(record["trace_id"] == trace.trace_id for record in records[:4])
+    assert "ValueError: boom" in records[3]["exc"]
+    assert records[4]["level"] == "WARNING" and "trace_id" not in records[4]
+    # Records point at the calling module, including those forwarded from stdlib
+    assert {record["logger"] for record in records} == {__name__}
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for the event loop stall detector
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.loop_monitor import LoopMonitor
+
+
+def blocking_call():
+    time.sleep(0.4)
+
+
+def test_stall_is_reported_with_the_blocking_stack():
+    async def main():
+        monitor = LoopMonitor(interval=0.02, threshold=0.1, ready_window=1.0)
+        monitor.start()
+        await asyncio.sleep(0.2)
+        assert monitor.ready() and not monitor.stalls
+
+        blocking_call()
+        assert monitor.stalled and not monitor.ready()
+        await asyncio.sleep(0.1)
+
+        health = monitor.health()
+        await monitor.stop()
+        return monitor, health
+
+    monitor, health = asyncio.run(main())
+    assert len(monitor.stalls) == 1
+    stall = monitor.stalls[0]
+    assert "blocking_call" in stall.stack
+    assert stall.duration >= 0.3
+    assert not monitor.stalled
+    # Still not ready right after the stall, and it shows in the percentiles
+    assert health["ready"] is False
+    assert health["lag_ms"]["max"] >= 300
+
+
+def test_health_answers_while_the_loop_is_blocked():
+    statuses = []
+
+    def probe(port):
+        time.sleep(0.2)
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                statuses.append(response.status)
+        except urllib.error.HTTPError as e:
+            statuses.append(e.code)
+
+    async def main():
+        monitor = LoopMonitor(interval=0.02, threshold=0.1, ready_window=1.0)
+        monitor.start()
+        port = monitor.serve_health("127.0.0.1", 0)
+        await asyncio.sleep(0.1)
+        prober = threading.Thread(target=probe, args=(port,))
+        prober.start()
+        # The loop cannot serve anything while this runs
+        time.sleep(0.5)
+        prober.join()
+        await monitor.stop()
+
+    asyncio.run(main())
+    assert statuses == [503]
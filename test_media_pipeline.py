@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for the media pipeline stages
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiogram.client.telegram import TelegramAPIServer
+
+from config.config import RateTier, config
+from services.container import ServiceContainer
+from services.media_pipeline import MediaJob, _rate_limit_reply
+from services.transcriber import Transcriber
+
+
+def test_local_bot_api_files_are_streamed_from_disk_and_deleted():
+    uploads = []
+
+    class FakeDeepgram(Transcriber):
+        async def download_audio(self, file_url, media_type=""):
+            raise AssertionError("local files must not be downloaded over HTTP")
+
+        async def transcribe_file(self, path, media_type=""):
+            uploads.append(path.read_bytes())
+            return SimpleNamespace(confidence=0.9)
+
+        async def transcribe_spool(self, spool, media_type=""):
+            raise AssertionError("local files must be uploaded from disk")
+
+    async def main(local_path: Path):
+        async def get_file(file_id):
+            return SimpleNamespace(file_path=str(local_path))
+
+        bot = SimpleNamespace(
+            session=SimpleNamespace(api=TelegramAPIServer.from_base("http://127.0.0.1:8081", is_local=True)),
+            token="123456:test",
+            get_file=get_file,
+        )
+        message = SimpleNamespace(bot=bot, from_user=SimpleNamespace(id=1), chat=SimpleNamespace(id=1))
+        services = ServiceContainer(config)
+        services.deepgram_service = FakeDeepgram()
+        pipeline = services.media_pipeline
+
+        job = MediaJob(message, "voice", SimpleNamespace(file_id="f", file_size=4, duration=1))
+        job.reserved_bytes = await services.admission_controller.reserve(job.media)
+        await pipeline._fetch(job)
+        # Streaming from disk needs no memory budget
+        assert services.admission_controller.budget.in_use == 0
+        await pipeline._prepare(job)
+        await pipeline._transcribe(job)
+        return job
+
+    with tempfile.TemporaryDirectory() as directory:
+        local_path = Path(directory) / "voice" / "file_1.oga"
+        local_path.parent.mkdir()
+        local_path.write_bytes(b"opus")
+        job = asyncio.run(main(local_path))
+        assert uploads == [b"opus"]
+        assert job.result.confidence == 0.9
+        assert not local_path.exists()
+
+
+def test_rate_limit_reply_names_the_minimum_charge():
+    reply = _rate_limit_reply(RateTier(name="hour", period=3600, limit=3000), wait=720, min_cost=600)
+    # Five 10-second notes fill the hour; the user is told why, not "50 minutes of audio" alone
+    assert "50 мин аудио в час" in reply
+    assert "как минимум 10 мин" in reply and "5 файлов в час" in reply
+    assert "через 12 мин" in reply
+    assert "минимум" not in _rate_limit_reply(RateTier(name="hour", period=3600, limit=3000), wait=60, min_cost=0)
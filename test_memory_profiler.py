@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for allocation tracing and per-job memory accounting
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from handlers.health import handle_memory
+from models.transcription import TranscriptionResult, Word
+from services.media_pipeline import WORD_BYTES, MediaJob, buffered_bytes
+from services.memory_profiler import MemoryProfiler
+from services.spool import SpooledMedia
+
+
+def allocate_blocks():
+    return [bytearray(1024) for _ in range(2000)]
+
+
+def test_report_shows_top_sites_and_growth_only_while_tracing():
+    profiler = MemoryProfiler()
+    assert profiler.report() is None
+    profiler.start()
+    try:
+        assert profiler.report().growth == []
+        blocks = allocate_blocks()
+        report = profiler.report()
+    finally:
+        profiler.stop()
+    assert not profiler.active
+    site, size, count = report.growth[0]
+    # Project files are named relative to the checkout
+    assert site.startswith("test_memory_profiler.py:") and size >= 2000 * 1024
+    assert any("test_memory_profiler.py" in top_site for top_site, _, _ in report.top)
+    del blocks
+
+
+def test_buffered_bytes_counts_media_in_memory_and_the_transcript():
+    message = SimpleNamespace(from_user=SimpleNamespace(id=1), chat=SimpleNamespace(id=1))
+    job = MediaJob(message, "voice", SimpleNamespace(file_id="f", duration=1))
+    assert buffered_bytes(job) == 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        job.spool = SpooledMedia(threshold=100, directory=directory)
+        job.spool.write(b"x" * 50)
+        assert buffered_bytes(job) == 50
+        # Spilled to disk: no longer held in memory
+        job.spool.write(b"x" * 100)
+        assert buffered_bytes(job) == 0
+        job.spool.close()
+        job.spool = None
+
+    words = [Word(word="слово", start=0, end=1, confidence=1) for _ in range(10)]
+    job.result = TranscriptionResult(text="слово " * 10, confidence=1, words=words)
+    assert buffered_bytes(job) > 10 * WORD_BYTES
+
+
+def test_mem_start_rejects_an_out_of_range_depth():
+    replies = []
+
+    async def answer(message, text):
+        replies.append(text)
+
+    profiler = MemoryProfiler()
+    services = SimpleNamespace(
+        is_admin=lambda user_id: True,
+        memory_profiler=profiler,
+        outbound_sender=SimpleNamespace(answer=answer),
+    )
+    for text in ("/mem start 70000", "/mem start 0", "/mem start deep"):
+        message = SimpleNamespace(text=text, from_user=SimpleNamespace(id=1))
+        asyncio.run(handle_memory(message, services))
+    assert not profiler.active
+    assert len(replies) == 3 and all(reply.startswith("Использование: /mem start") for reply in replies)
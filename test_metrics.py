@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for the metrics rollup and cached /stats rendering
+"""
+
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from handlers.stats import get_stats_message
+from models.metrics import MetricsEvent
+from services.metrics import MetricsService
+
+
+def test_rollup_tracks_totals_and_versions():
+    with tempfile.TemporaryDirectory() as data_dir:
+        metrics = MetricsService(data_dir=data_dir)
+        for month, user in ((1, "a"), (1, "b"), (2, "a")):
+            metrics.track_event(MetricsEvent(user_id=user, event_type="transcription", timestamp=datetime(2024, month, 5)))
+        metrics.track_event(MetricsEvent(user_id="c", event_type="llm_call", event_subtype="brief", timestamp=datetime(2024, 2, 5)))
+
+        totals = metrics.get_all_time_stats()
+        assert (totals.unique_users, totals.transcriptions, totals.llm_calls["brief"], totals.months) == (3, 3, 1, 2)
+        assert metrics.month_keys() == ["2024-02", "2024-01"]
+        assert metrics.get_month_stats("2024-01").unique_users == {"a", "b"}
+
+        # Rendered messages are reused until their month changes
+        january = get_stats_message(metrics, "2024-01")
+        assert get_stats_message(metrics, "2024-01") is january
+        metrics.track_event(MetricsEvent(user_id="d", event_type="transcription", timestamp=datetime(2024, 2, 6)))
+        assert get_stats_message(metrics, "2024-01") is january
+        assert "Всего транскрипций: 4" in get_stats_message(metrics, "all")
+
+        # The file persists the same format, and a fresh service sees the same totals
+        with open(os.path.join(data_dir, "metrics.json"), encoding="utf-8") as f:
+            assert sorted(json.load(f)["2024-01"]["unique_users"]) == ["a", "b"]
+        assert MetricsService(data_dir=data_dir).get_all_time_stats() == metrics.get_all_time_stats()
+
+
+def test_rollup_reloads_when_another_process_rewrites_the_file():
+    with tempfile.TemporaryDirectory() as data_dir:
+        metrics = MetricsService(data_dir=data_dir)
+        metrics.track_event(MetricsEvent(user_id="a", event_type="transcription", timestamp=datetime(2024, 1, 5)))
+        version = metrics.version
+
+        other = MetricsService(data_dir=data_dir)
+        other.track_event(MetricsEvent(user_id="b", event_type="transcription", timestamp=datetime(2024, 3, 5)))
+        os.utime(other.metrics_file, ns=(0, os.stat(other.metrics_file).st_mtime_ns + 1))
+
+        assert metrics.month_keys() == ["2024-03", "2024-01"]
+        assert metrics.version > version
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests for the flood-control-aware OutboundSender
+"""
+
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from services.outbound import OutboundSender, TokenBucket
+
+
+class FakeMessage:
+    def __init__(self, chat_id: int, sent: list, fail_first: int = 0, retry_after: int = 0):
+        self.chat = SimpleNamespace(id=chat_id)
+        self.sent = sent
+        self.fail_first = fail_first
+        self.retry_after = retry_after
+
+    async def answer(self, text, reply_markup=None, **kwargs):
+        if self.fail_first:
+            self.fail_first -= 1
+            raise TelegramRetryAfter(
+                method=SendMessage(chat_id=self.chat.id, text=text),
+                message="Too Many Requests",
+                retry_after=self.retry_after,
+            )
+        await asyncio.sleep(0)
+        self.sent.append((self.chat.id, text, reply_markup))
+        return text
+
+
+def test_token_bucket_enforces_rate():
+    async def scenario():
+        bucket = TokenBucket(rate=50, burst=5)
+        started = time.monotonic()
+        for _ in range(15):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # 5 from the burst, 10 more at 50/s
+    assert asyncio.run(scenario()) >= 0.18
+
+
+def test_retry_after_is_retried():
+    async def scenario():
+        sender = OutboundSender(per_chat_rate=1000, per_chat_burst=10, global_rate=1000, global_burst=10)
+        sent = []
+        await sender.answer(FakeMessage(1, sent, fail_first=2), "hello")
+        return sender, sent
+
+    sender, sent = asyncio.run(scenario())
+    assert sent == [(1, "hello", None)]
+    assert sender.retry_after_count == 2
+
+
+def test_private_chat_retry_after_pauses_every_chat():
+    async def scenario(flooded_chat):
+        sender = OutboundSender(per_chat_rate=1000, per_chat_burst=10, global_rate=1000, global_burst=10)
+        sent = []
+        flooded = asyncio.create_task(
+            sender.answer(FakeMessage(flooded_chat, sent, fail_first=1, retry_after=1), "flooded")
+        )
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        await sender.answer(FakeMessage(2, sent), "other")
+        waited = time.monotonic() - started
+        await flooded
+        return waited
+
+    # The bot-wide limit holds back other chats too
+    assert asyncio.run(scenario(1)) >= 0.8
+    # A group's own limit does not
+    assert asyncio.run(scenario(-100)) < 0.5
+
+
+def test_send_parts_merges_header_and_keeps_order():
+    async def scenario():
+        sender = OutboundSender(per_chat_rate=1000, per_chat_burst=10, global_rate=1000, global_burst=10)
+        sent = []
+        first, second = FakeMessage(1, sent), FakeMessage(1, sent)
+        await asyncio.gather(
+            sender.send_parts(first, ["a1", "a2", "a3"], header="H\n\n", reply_markup="kb"),
+            sender.send_parts(second, ["b1", "b2"], header="H\n\n", reply_markup="kb"),
+        )
+        return sent
+
+    sent = asyncio.run(scenario())
+    assert [text for _, text, _ in sent] == ["H\n\na1", "a2", "a3", "H\n\nb1", "b2"]
+    assert [markup for _, _, markup in sent] == [None, None, "kb", None, "kb"]
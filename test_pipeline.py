@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for the staged job pipeline
+"""
+
+import asyncio
+import os
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.pipeline import Job, JobRejected, Pipeline, Stage, StageTimeout
+
+
+class NumberJob(Job):
+    def __init__(self, number: int):
+        super().__init__()
+        self.number = number
+        self.steps = []
+
+
+def test_stages_overlap_across_jobs():
+    events = []
+
+    async def fetch(job):
+        events.append(("fetch start", job.number))
+        await asyncio.sleep(0.05)
+        job.steps.append("fetch")
+
+    async def transcribe(job):
+        events.append(("transcribe start", job.number))
+        await asyncio.sleep(0.05)
+        job.steps.append("transcribe")
+
+    async def main():
+        pipeline = Pipeline("test", [Stage("fetch", fetch), Stage("transcribe", transcribe)])
+        jobs = [NumberJob(i) for i in range(3)]
+        started = asyncio.get_running_loop().time()
+        await asyncio.gather(*(pipeline.submit(job) for job in jobs))
+        elapsed = asyncio.get_running_loop().time() - started
+        await pipeline.stop()
+        return jobs, elapsed
+
+    jobs, elapsed = asyncio.run(main())
+    assert all(job.steps == ["fetch", "transcribe"] for job in jobs)
+    # One worker per stage: fetching job 1 overlaps with transcribing job 0
+    assert events.index(("fetch start", 1)) < events.index(("transcribe start", 1))
+    assert elapsed < 0.25
+
+
+def test_rejections_timeouts_and_errors_reach_the_submitter():
+    async def admit(job):
+        if job.number == 0:
+            raise JobRejected("limit")
+        if job.number == 1:
+            await asyncio.sleep(1)
+        if job.number == 2:
+            raise ValueError("boom")
+
+    async def main():
+        pipeline = Pipeline("test", [Stage("admit", admit, concurrency=3, timeout=0.05)])
+        results = await asyncio.gather(
+            *(pipeline.submit(NumberJob(i)) for i in range(4)), return_exceptions=True
+        )
+        await pipeline.stop()
+        return results
+
+    rejected, timed_out, failed, ok = asyncio.run(main())
+    assert isinstance(rejected, JobRejected) and rejected.reply == "limit"
+    assert isinstance(timed_out, StageTimeout)
+    assert isinstance(failed, ValueError)
+    assert ok is None
+
+
+def test_stop_cancels_queued_and_running_jobs():
+    cancelled = []
+
+    async def slow(job):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(job.number)
+            raise
+
+    async def main():
+        pipeline = Pipeline("test", [Stage("slow", slow)])
+        submits = [asyncio.create_task(pipeline.submit(NumberJob(i))) for i in range(3)]
+        await asyncio.sleep(0.05)
+        await pipeline.stop()
+        # Every submitter is released, none is left waiting forever
+        return await asyncio.wait_for(asyncio.gather(*submits, return_exceptions=True), 1)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    # Only the first job had started; the queued ones never ran
+    assert cancelled == [0]
+
+
+def test_cancelled_submitter_stops_its_job():
+    started = []
+    finished = []
+
+    async def slow(job):
+        started.append(job.number)
+        try:
+            await asyncio.sleep(10 if job.number == 0 else 0)
+        finally:
+            finished.append(job.number)
+
+    async def main():
+        pipeline = Pipeline("test", [Stage("slow", slow)])
+        running = asyncio.create_task(pipeline.submit(NumberJob(0)))
+        queued = asyncio.create_task(pipeline.submit(NumberJob(1)))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        running.cancel()
+        await asyncio.gather(running, queued, return_exceptions=True)
+        # The stage has let go of the job by the time submit returns
+        stopped_in_time = finished == [0]
+        await asyncio.wait_for(pipeline.submit(NumberJob(2)), 1)
+        await pipeline.stop()
+        return stopped_in_time
+
+    stopped_in_time = asyncio.run(main())
+    assert stopped_in_time
+    assert started == [0, 2]
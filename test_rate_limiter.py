@@ -8,10 +8,13 @@ import sys
 import tempfile
 import shutil
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 
 # Add the project root to the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from config.config import Config, RateTier
+from services.admission import AdmissionController
 from services.rate_limiter import RateLimiterService
 
 def test_rate_limiter():
@@ -68,5 +71,64 @@ def test_rate_limiter():
         # Clean up temporary directory
         shutil.rmtree(temp_dir)
 
+def test_gcra_tiers_weighted_by_audio_seconds():
+    """Several tiers at once, charged by duration, with exact retry times"""
+    now = [1_000_000.0]
+    tiers = [
+        RateTier(name="minute", period=60, limit=600),
+        RateTier(name="hour", period=3600, limit=1800),
+    ]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        limiter = RateLimiterService(data_dir=temp_dir, tiers=tiers, clock=lambda: now[0])
+
+        # A 10-minute file uses the whole minute tier; a short clip must wait for it to drain
+        assert limiter.can_make_request("1", cost=600)
+        limiter.record_request("1", cost=600)
+        wait, tier = limiter.check("1", cost=60)
+        assert tier.name == "minute" and abs(wait - 6) < 1e-6
+        assert limiter.can_make_request("2", cost=60)
+
+        # After the burst window the hourly budget is what remains
+        now[0] += 60
+        limiter.record_request("1", cost=600)
+        now[0] += 60
+        limiter.record_request("1", cost=600)
+        assert limiter.get_remaining_requests("1") == 0
+        wait, tier = limiter.check("1", cost=300)
+        # 1800 s charged in two minutes, of which 60 s have drained (0.5 per second)
+        assert tier.name == "hour" and abs(wait - 480) < 1e-6
+        assert limiter.get_time_until_next_request("1", cost=300) == timedelta(seconds=wait)
+
+        # Files longer than a tier are clamped so they can run on an empty quota
+        assert limiter.can_make_request("3", cost=10_000)
+
+        # State survives a restart
+        restarted = RateLimiterService(data_dir=temp_dir, tiers=tiers, clock=lambda: now[0])
+        assert restarted.check("1", cost=300) == (wait, tiers[1])
+
+def test_default_quota_keeps_five_short_clips_per_hour():
+    """With the default settings short voice notes count like the old 5-per-hour limit"""
+    overrides = ("RATE_LIMIT_PER_HOUR", "RATE_LIMIT_SECONDS_PER_REQUEST", "RATE_LIMIT_MIN_SECONDS", "RATE_LIMIT_TIERS")
+    if any(os.getenv(name) for name in overrides):
+        # Not the defaults this test pins
+        return
+    config = Config(BOT_TOKEN="100:main")
+    now = [1_000_000.0]
+    admission = AdmissionController(max_file_bytes=1, budget_bytes=1, min_cost_seconds=config.RATE_LIMIT_MIN_SECONDS)
+    cost = admission.cost(SimpleNamespace(duration=10))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Only the old hourly limit; no daily cap unless configured
+        assert [tier.name for tier in config.RATE_LIMIT_TIERS] == ["hour"]
+        limiter = RateLimiterService(data_dir=temp_dir, tiers=config.RATE_LIMIT_TIERS, clock=lambda: now[0])
+        for _ in range(5):
+            assert limiter.can_make_request("1", cost=cost)
+            limiter.record_request("1", cost=cost)
+        wait, tier = limiter.check("1", cost=cost)
+        # The sixth waits for a fifth of the hour to drain back
+        assert tier.name == "hour" and abs(wait - 720) < 1e-6
+
+
 if __name__ == "__main__":
-    test_rate_limiter()
\ No newline at end of file
+    test_rate_limiter()
+    test_gcra_tiers_weighted_by_audio_seconds()
+    test_default_quota_keeps_five_short_clips_per_hour()
\ No newline at end of file
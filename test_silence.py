@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for silence trimming and mapping word times back to the original media
+"""
+
+import asyncio
+import os
+import stat
+import sys
+import tempfile
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.transcription import Paragraph, TranscriptionResult, Word
+from services import silence
+from services.silence import FRAME_SECONDS, TimeMap, speech_intervals
+
+
+def test_time_map_points_words_at_the_original_timeline():
+    # Kept 1-3 s and 10-12 s of the original: 4 s of trimmed media
+    time_map = TimeMap([(1.0, 3.0), (10.0, 12.0)])
+    assert time_map.duration == 4.0
+    assert time_map.to_original(0.5) == 1.5
+    assert time_map.to_original(2.5) == 10.5
+    assert time_map.to_original(9.0) == 12.0
+
+    words = [Word(word="раз", start=0.5, end=1.0, confidence=0.9), Word(word="два", start=2.2, end=2.6, confidence=0.9)]
+    result = TranscriptionResult(
+        text="раз два", confidence=0.9, words=words,
+        paragraphs=[Paragraph(text="раз два", start=0.5, end=2.6, words=words)],
+    )
+    mapped = time_map.apply(result)
+    assert [(word.start, word.end) for word in mapped.words] == [(1.5, 2.0), (10.2, 10.6)]
+    assert (mapped.paragraphs[0].start, mapped.paragraphs[0].end) == (1.5, 10.6)
+    assert mapped.paragraphs[0].words == mapped.words
+    # The transcript itself is untouched
+    assert result.words[0].start == 0.5
+
+
+def test_long_pauses_are_shortened_and_short_ones_kept():
+    if silence.np is None:
+        # Without NumPy the trimmer is not built and media is uploaded as is
+        try:
+            silence.SilenceTrimmer()
+        except RuntimeError:
+            return
+        raise AssertionError("the trimmer was built without NumPy")
+
+    np = silence.np
+    frames = lambda seconds, level: np.full(int(round(seconds / FRAME_SECONDS)), level, dtype=np.float32)
+    # 3 s of dead air, 1.5 s speech, 0.3 s pause, 1.5 s speech, 6 s pause, 1.5 s speech, 3 s of dead air
+    levels = np.concatenate([
+        frames(3, -70), frames(1.5, -20), frames(0.3, -70), frames(1.5, -20),
+        frames(6, -70), frames(1.5, -20), frames(3, -70),
+    ])
+    kept = speech_intervals(levels, margin_db=10, max_pause=0.7)
+    assert len(kept) == 2
+    (first_start, first_end), (second_start, second_end) = kept
+    # Half of max_pause is kept around speech; the short pause stays inside the first interval
+    assert abs(first_start - 2.65) < 0.05 and abs(first_end - 6.65) < 0.05
+    assert abs(second_start - 11.95) < 0.05 and abs(second_end - 14.15) < 0.05
+    assert abs(TimeMap(kept).duration - 6.2) < 0.1
+
+    # A recording without quieter stretches is kept whole
+    assert speech_intervals(frames(10, -20)) == [(0.0, len(frames(10, -20)) * FRAME_SECONDS)]
+
+
+def test_chatty_ffmpeg_stderr_does_not_block_the_output():
+    if silence.np is None:
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        # Stands in for ffmpeg: far more stderr than a pipe holds, then the output
+        fake = os.path.join(directory, "ffmpeg")
+        with open(fake, "w") as script:
+            script.write("#!/bin/sh\nhead -c 1000000 /dev/zero | tr '\\0' w >&2\nprintf output\nexit \"${FAKE_EXIT:-0}\"\n")
+        os.chmod(fake, os.stat(fake).st_mode | stat.S_IEXEC)
+        trimmer = silence.SilenceTrimmer(ffmpeg=fake)
+
+        chunks = []
+
+        async def collect(chunk):
+            chunks.append(chunk)
+
+        asyncio.run(asyncio.wait_for(trimmer._run("-i", "x", output=collect), 10))
+        assert b"".join(chunks) == b"output"
+
+        os.environ["FAKE_EXIT"] = "1"
+        try:
+            asyncio.run(asyncio.wait_for(trimmer._run("-i", "x", output=collect), 10))
+        except RuntimeError as e:
+            assert str(e).startswith("ffmpeg exited with 1: www")
+        else:
+            raise AssertionError("a failing ffmpeg was not reported")
+        finally:
+            del os.environ["FAKE_EXIT"]
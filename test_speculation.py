@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for speculative style precomputation
+"""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.speculation import StyleSpeculator
+from services.style_cache import StyleCache
+
+
+class FakeAnthropic:
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.calls = []
+        self.under_pressure = False
+
+    @staticmethod
+    def estimate_tokens(text):
+        return len(text) // 3 + 1
+
+    async def process_long_text(self, text, style):
+        self.calls.append(style)
+        await asyncio.sleep(self.delay)
+        yield f"{style}:{text}"
+
+
+class FakeMetrics:
+    def get_month_stats(self):
+        return SimpleNamespace(llm_calls={"proofread": 1, "my": 0, "business": 0, "brief": 5})
+
+
+def _speculator(**kwargs):
+    anthropic = FakeAnthropic()
+    speculator = StyleSpeculator(anthropic, FakeMetrics(), StyleCache(), enabled=True, **kwargs)
+    return speculator, anthropic
+
+
+def test_global_favourite_is_precomputed_and_hit():
+    speculator, anthropic = _speculator()
+
+    async def scenario():
+        speculator.speculate("1", "текст транскрипции")
+        return await speculator.take("1", "текст  транскрипции\n", "brief")
+
+    assert asyncio.run(scenario()) == ["brief:текст транскрипции"]
+    assert anthropic.calls == ["brief"]
+    assert speculator.stats["hits"] == 1
+
+
+def test_user_preference_wins_and_misses_are_wasted():
+    speculator, anthropic = _speculator()
+
+    async def scenario():
+        await speculator.take("1", "первый", "my")
+        speculator.speculate("1", "второй")
+        await asyncio.sleep(0.05)
+        await speculator.take("1", "второй", "proofread")
+
+    asyncio.run(scenario())
+    assert anthropic.calls == ["my"]
+    assert speculator.stats["misses"] == 1
+    assert speculator.stats["wasted_tokens"] == speculator.stats["speculative_tokens"]
+
+
+def test_budget_and_pressure_limit_speculation():
+    speculator, anthropic = _speculator(tokens_per_hour=10)
+
+    async def scenario():
+        speculator.speculate("1", "очень длинный текст " * 10)
+        anthropic.under_pressure = True
+        speculator.speculate("2", "коротко")
+
+    asyncio.run(scenario())
+    assert speculator.stats["speculated"] == 0
+
+
+def test_pending_speculation_is_cancelled_under_pressure():
+    speculator, anthropic = _speculator()
+    anthropic.delay = 1
+
+    async def scenario():
+        speculator.speculate("1", "другой текст")
+        await asyncio.sleep(0)
+        anthropic.under_pressure = True
+        await speculator.take("2", "свой текст", "proofread")
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert speculator.stats["cancelled"] == 1
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for spooled media buffers and upload retries
+"""
+
+import asyncio
+import os
+import stat
+import sys
+import tempfile
+import threading
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiohttp import web
+
+from services.deepgram import DeepgramService
+from services.spool import SpooledMedia
+
+
+def test_large_media_spills_to_a_private_file_that_is_deleted():
+    with tempfile.TemporaryDirectory() as directory:
+        small = SpooledMedia(threshold=10, directory=directory)
+        small.write(b"12345")
+        small.finish()
+        assert not small.on_disk
+
+        large = SpooledMedia(threshold=10, directory=directory)
+        for _ in range(4):
+            large.write(b"abcd")
+        large.finish()
+        assert large.on_disk and large.size == 16
+        assert stat.S_IMODE(os.stat(large.path).st_mode) == 0o600
+        # Readers can be reopened, e.g. for a retry
+        for _ in range(2):
+            with large.reader() as payload:
+                assert payload.read() == b"abcd" * 4
+
+        path = large.path
+        large.close()
+        assert not path.exists() and os.listdir(directory) == []
+
+
+def test_event_loop_writes_and_wipe_run_off_the_loop():
+    async def main(directory):
+        loop_thread = threading.get_ident()
+        threads = set()
+        spool = SpooledMedia(threshold=10, directory=directory)
+        write = spool.write
+
+        def recording_write(chunk):
+            threads.add(threading.get_ident())
+            write(chunk)
+
+        spool.write = recording_write
+        for _ in range(4):
+            await spool.awrite(b"abcd")
+        spool.finish()
+        path = spool.path
+        await spool.aclose()
+        return loop_thread, threads, path
+
+    with tempfile.TemporaryDirectory() as directory:
+        loop_thread, threads, path = asyncio.run(main(directory))
+        # The first two chunks stay in memory; the spill and later writes go to a worker thread
+        assert loop_thread in threads and len(threads) >= 2
+        assert not path.exists() and os.listdir(directory) == []
+
+
+def test_upload_retry_reuses_the_spooled_payload():
+    bodies = []
+    peers = []
+
+    async def listen(request):
+        bodies.append(await request.read())
+        peers.append(request.transport.get_extra_info("peername"))
+        if len(bodies) == 1:
+            return web.json_response({"err_msg": "busy"}, status=503)
+        return web.json_response({"results": {"channels": [{"alternatives": [
+            {"transcript": "привет", "confidence": 0.9, "words": []}
+        ]}]}})
+
+    async def main(directory):
+        app = web.Application()
+        app.router.add_post("/v1/listen", listen)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            service = DeepgramService("key", base_url=f"http://127.0.0.1:{port}/v1/listen", max_attempts=2)
+            spool = SpooledMedia(threshold=4, directory=directory)
+            spool.write(b"audio-bytes")
+            spool.finish()
+            result = await service.transcribe_spool(spool, "voice")
+            spool.close()
+            await service.close()
+            return result
+        finally:
+            await runner.cleanup()
+
+    with tempfile.TemporaryDirectory() as directory:
+        result = asyncio.run(main(directory))
+        assert result.text == "привет"
+        assert bodies == [b"audio-bytes", b"audio-bytes"]
+        # The retry went over the pooled connection of the first attempt
+        assert len(set(peers)) == 1
+        assert os.listdir(directory) == []
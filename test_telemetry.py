@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for the Prometheus-format metrics registry
+"""
+
+import os
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.telemetry import Counter, Gauge, Histogram, Registry, _Metric
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.register(Histogram("stage_seconds", "Stage latency", ("stage",), buckets=(0.1, 1)))
+    histogram.observe(0.05, stage="llm")
+    histogram.observe(0.5, stage="llm")
+    histogram.observe(5, stage="llm")
+
+    text = registry.render()
+    assert 'stage_seconds_bucket{stage="llm",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="llm",le="1"} 2' in text
+    assert 'stage_seconds_bucket{stage="llm",le="+Inf"} 3' in text
+    assert 'stage_seconds_count{stage="llm"} 3' in text
+
+
+def test_counters_and_gauge_functions_render_with_labels():
+    registry = Registry()
+    counter = registry.register(Counter("errors_total", "Errors", ("upstream", "code")))
+    gauge = registry.register(Gauge("queue_depth", "Queue depth", ("queue",)))
+    counter.inc(upstream="deepgram", code="503")
+    counter.inc(upstream="deepgram", code="503")
+    depth = [3]
+    gauge.set_function(lambda: depth[0], queue="llm")
+
+    text = registry.render()
+    assert "# TYPE errors_total counter" in text
+    assert 'errors_total{upstream="deepgram",code="503"} 2.0' in text
+    assert 'queue_depth{queue="llm"} 3.0' in text
+
+
+def test_metric_without_samples_fails_when_built():
+    class Summary(_Metric):
+        kind = "summary"
+
+    try:
+        Summary("latency", "A metric that forgot _samples")
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("a metric without _samples was built")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Tests for serving several bots from one process
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config.config import Config, TenantBot
+from services.telemetry import QUEUE_DEPTH, REGISTRY
+from services.tenants import TenantMiddleware, build_tenants
+
+
+def make_config(directory: str, bots) -> Config:
+    return Config(
+        BOT_TOKEN="100:main",
+        ADMIN_USER_ID=1,
+        DATA_DIR=directory,
+        UNLIMITED_USERS_FILE=os.path.join(directory, "unlimited_users.json"),
+        UNLIMITED_USERS=[],
+        JOURNAL_FILE=os.path.join(directory, "jobs.journal"),
+        BOTS=bots,
+    )
+
+
+def test_tenants_share_clients_but_keep_quotas_and_metrics_apart():
+    with tempfile.TemporaryDirectory() as directory:
+        config = make_config(directory, [TenantBot(
+            name="brand", token="200:brand", admin_user_id=2, unlimited_users=["7"], transcriber_backends=["fake"],
+        )])
+        main, brand = build_tenants(config)
+
+        assert brand.deepgram_service is main.deepgram_service
+        assert brand.style_cache is main.style_cache
+        # One transcript cache, with entries kept apart per bot
+        assert brand.transcript_store is main.transcript_store
+        main.transcript_store.put("main", 7, 1, "main text")
+        brand.transcript_store.put("brand", 7, 1, "brand text")
+        assert main.transcript_store.get("main", 7, 1) == "main text"
+        assert brand.transcript_store.get("brand", 7, 1) == "brand text"
+        assert brand.admission_controller is main.admission_controller
+        # One router for the process, built with the backends every bot asked for
+        assert brand.transcriber_router is main.transcriber_router
+        assert set(main.transcriber_router.backends) == {*config.TRANSCRIBER_BACKENDS, "fake"}
+        assert brand.config.TRANSCRIBER_BACKENDS == ["fake"]
+        assert brand.rate_limiter is not main.rate_limiter
+        assert brand.metrics_service is not main.metrics_service
+        assert brand.outbound_sender is not main.outbound_sender
+
+        assert brand.is_admin(2) and not brand.is_admin(1) and main.is_admin(1)
+        assert brand.access_control_service.is_unlimited(7)
+        assert not main.access_control_service.is_unlimited(7)
+        assert str(brand.metrics_service.data_dir) == os.path.join(directory, "brand")
+        assert brand.config.JOURNAL_FILE == os.path.join(directory, "brand", "jobs.journal")
+        main.job_journal.close()
+        brand.job_journal.close()
+
+
+def test_queue_depth_is_reported_per_bot():
+    async def main_task(main, brand):
+        main.media_pipeline.pipeline.start()
+        brand.media_pipeline.pipeline.start()
+        brand.outbound_sender.pending = 3
+        main.outbound_sender.pending = 1
+        try:
+            return (
+                QUEUE_DEPTH.value(queue="outbound", bot="main"),
+                QUEUE_DEPTH.value(queue="outbound", bot="brand"),
+                REGISTRY.render(),
+            )
+        finally:
+            await main.media_pipeline.stop()
+            await brand.media_pipeline.stop()
+
+    with tempfile.TemporaryDirectory() as directory:
+        main, brand = build_tenants(make_config(directory, [TenantBot(name="brand", token="200:brand")]))
+        main_depth, brand_depth, exposition = asyncio.run(main_task(main, brand))
+        main.job_journal.close()
+        brand.job_journal.close()
+
+    # The second bot built no longer replaces the first one's series
+    assert (main_depth, brand_depth) == (1, 3)
+    assert 'bot_queue_depth{queue="media_fetch",bot="main"}' in exposition
+    assert 'bot_queue_depth{queue="media_fetch",bot="brand"}' in exposition
+
+
+def test_duplicate_tokens_are_rejected():
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            build_tenants(make_config(directory, [TenantBot(name="copy", token="100:main")]))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("a repeated token was accepted")
+
+
+def test_middleware_picks_the_container_of_the_receiving_bot():
+    with tempfile.TemporaryDirectory() as directory:
+        main, brand = build_tenants(make_config(directory, [TenantBot(name="brand", token="200:brand")]))
+        middleware = TenantMiddleware({100: main, 200: brand})
+
+        async def handler(event, data):
+            return data["services"]
+
+        picked = asyncio.run(middleware(handler, None, {"bot": SimpleNamespace(id=200), "services": main}))
+        assert picked is brand
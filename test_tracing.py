@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for request tracing and the span ring buffer
+"""
+
+import asyncio
+import os
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.tracing import Tracer, TracingMiddleware, current_trace_id
+
+
+def test_spans_are_attached_to_the_update_trace():
+    tracer = Tracer()
+
+    async def handler(event, data):
+        with tracer.span("get_file"):
+            await asyncio.sleep(0.01)
+        # Child tasks inherit the trace through contextvars
+        await asyncio.create_task(child())
+        return data["trace_id"]
+
+    async def child():
+        with tracer.span("answer"):
+            assert current_trace_id() is not None
+
+    trace_id = asyncio.run(TracingMiddleware(tracer)(handler, object(), {}))
+
+    trace = tracer.traces[-1]
+    assert trace.trace_id == trace_id
+    assert [span.name for span in trace.spans] == ["get_file", "answer"]
+    assert all(span.parent_id == trace.root.span_id for span in trace.spans)
+    assert trace.root.duration >= trace.spans[0].duration >= 0.01
+
+
+def test_percentiles_and_ring_buffer_bounds():
+    tracer = Tracer(max_spans=100, max_traces=3)
+    for i in range(200):
+        with tracer.trace("update"):
+            with tracer.span("transcribe_audio") as span:
+                pass
+            span.duration = (i % 100 + 1) / 1000
+
+    stats = tracer.stage_percentiles(60)["transcribe_audio"]
+    assert len(tracer.spans) == 100 and len(tracer.traces) == 3
+    assert stats["count"] == 50
+    assert stats["p50"] <= stats["p95"] <= stats["p99"] == 0.1
+    assert len(tracer.slowest_traces(limit=2)) == 2
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for transcription backends and the router choosing between them
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.deepgram import DeepgramError
+from services.spool import SpooledMedia
+from services.transcriber import FakeTranscriber, Transcriber, TranscriberRouter
+
+
+def spool_of(size: int) -> SpooledMedia:
+    spool = SpooledMedia(threshold=1 << 20)
+    spool.write(b"\0" * size)
+    spool.finish()
+    return spool
+
+
+def test_fake_backend_is_deterministic():
+    backend = FakeTranscriber(bytes_per_word=100)
+    first = asyncio.run(backend.transcribe_spool(spool_of(350)))
+    second = asyncio.run(backend.transcribe_spool(spool_of(350)))
+    assert first == second
+    assert first.text == "слово1 слово2 слово3"
+    assert [word.start for word in first.words] == [0.0, 0.4, 0.8]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "voice.oga"
+        path.write_bytes(b"\0" * 350)
+        assert asyncio.run(backend.transcribe_file(path)) == first
+
+
+def test_long_media_skips_backends_with_a_duration_limit():
+    router = TranscriberRouter({"local": FakeTranscriber(max_seconds=300), "deepgram": FakeTranscriber()})
+    assert router.candidates(["local", "deepgram"], 60) == ["local", "deepgram"]
+    assert router.candidates(["local", "deepgram"], 3600) == ["deepgram"]
+    # Unknown duration only goes to backends without a limit
+    assert router.candidates(["local", "deepgram"], None) == ["deepgram"]
+    # Unknown or unavailable backends are ignored
+    assert router.candidates(["missing", "deepgram"], 60) == ["deepgram"]
+
+
+def test_failing_backend_falls_back_and_is_tried_last():
+    outage = FakeTranscriber(error=DeepgramError(503, "Deepgram API error: 503"))
+    local = FakeTranscriber()
+    router = TranscriberRouter({"deepgram": outage, "local": local}, short_clip_seconds=0)
+    order = ["deepgram", "local"]
+
+    result = asyncio.run(router.transcribe_spool(spool_of(2000), "voice", 60, order))
+    assert result.text == "слово1 слово2"
+    assert (outage.calls, local.calls) == (1, 1)
+    # Deepgram is now unhealthy, so the next job goes straight to the local backend
+    assert router.candidates(order, 60) == ["local", "deepgram"]
+    asyncio.run(router.transcribe_spool(spool_of(2000), "voice", 60, order))
+    assert (outage.calls, local.calls) == (1, 2)
+    assert router.snapshot()["deepgram"]["error_rate"] == 1.0
+
+    # With every backend failing the error of the one tried last reaches the caller
+    local.error = RuntimeError("model crashed")
+    try:
+        asyncio.run(router.transcribe_spool(spool_of(2000), "voice", 60, order))
+    except DeepgramError:
+        pass
+    else:
+        raise AssertionError("a job succeeded with every backend failing")
+
+
+def test_short_clips_go_to_the_fastest_backend():
+    router = TranscriberRouter({"deepgram": FakeTranscriber(), "local": FakeTranscriber()}, short_clip_seconds=30)
+    order = ["deepgram", "local"]
+    router.record("deepgram", 10, 2.0, ok=True)
+    # A backend without short-clip measurements is tried first so it gets one
+    assert router.candidates(order, 10) == ["local", "deepgram"]
+    router.record("local", 10, 0.5, ok=True)
+    assert router.candidates(order, 10) == ["local", "deepgram"]
+    # Longer media keeps the configured order
+    assert router.candidates(order, 120) == ["deepgram", "local"]
+    router.record("local", 10, 5.0, ok=True)
+    router.record("local", 10, 5.0, ok=True)
+    assert router.candidates(order, 10) == ["deepgram", "local"]
+
+
+def test_backend_missing_a_method_fails_when_built():
+    class FileOnly(Transcriber):
+        name = "file-only"
+
+        async def transcribe_file(self, path, media_type=""):
+            raise AssertionError("not called")
+
+    try:
+        FileOnly()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("a backend without transcribe_spool was built")
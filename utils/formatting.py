@@ -2,32 +2,28 @@ from models.transcription import TranscriptionResult
 from handlers.style import get_style_keyboard
 from aiogram.types import InlineKeyboardMarkup
 from typing import List, Tuple, Optional
+from utils.telegram_formatting import split_long_message, utf16_len
+import html
 
-def split_long_message(text: str, limit: int = 4000) -> List[str]:
-    """Split long message into parts that fit Telegram message limit."""
-    if len(text) <= limit:
-        return [text]
-    
-    parts = []
-    while text:
-        if len(text) <= limit:
-            parts.append(text)
-            break
-        
-        # Find the last space before limit
-        split_index = text.rfind(' ', 0, limit)
-        if split_index == -1:
-            split_index = limit
-        
-        parts.append(text[:split_index])
-        text = text[split_index:].lstrip()
-    
-    return parts
 
-def format_transcription(result: TranscriptionResult) -> Tuple[List[str], Optional[InlineKeyboardMarkup]]:
-    """Format transcription result into parts of messages with style buttons in the last one."""
+def transcription_text(result: TranscriptionResult) -> str:
+    """Transcript text with Deepgram paragraphs separated by blank lines."""
+    if result.paragraphs:
+        return '\n\n'.join(paragraph.text for paragraph in result.paragraphs)
+    return result.text
+
+
+def format_transcription(result: TranscriptionResult, header: str = "") -> Tuple[List[str], Optional[InlineKeyboardMarkup]]:
+    """Format transcription result into parts of messages with style buttons in the last one.
+
+    Room for ``header`` is reserved in the first part so the sender can merge them.
+    """
+    # Transcripts are plain text but messages are sent with ParseMode.HTML
+    text = html.escape(transcription_text(result), quote=False)
+
     # Split text into parts if needed
-    parts = split_long_message(result.text)
-    
+    limit = 4000
+    parts = split_long_message(text, limit=limit, first_limit=limit - utf16_len(header))
+
     # Return parts and keyboard for the last message
     return parts, get_style_keyboard()
@@ -0,0 +1,48 @@
+"""JSON codec shared by the Bot API session, the Deepgram client and the JSON state files.
+
+Backed by the standard library unless `use_orjson()` switched it to orjson
+(see utils/runtime.py). Both produce UTF-8 text without \\u escapes, so
+files written by one are read back by the other.
+"""
+
+import json
+from typing import IO, Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional, see requirements-perf.txt
+    orjson = None
+
+_orjson_enabled = False
+
+
+def use_orjson(enabled: bool = True) -> bool:
+    """Switch to orjson when it is installed; returns whether it is now in use."""
+    global _orjson_enabled
+    _orjson_enabled = enabled and orjson is not None
+    return _orjson_enabled
+
+
+def backend() -> str:
+    return "orjson" if _orjson_enabled else "json"
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    if _orjson_enabled:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None)
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    if _orjson_enabled:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump(obj: Any, f: IO[str], indent: bool = False) -> None:
+    f.write(dumps(obj, indent))
+
+
+def load(f: IO[str]) -> Any:
+    return loads(f.read())
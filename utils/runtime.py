@@ -0,0 +1,33 @@
+"""Opt-in performance runtime: uvloop for the event loop and orjson for JSON, when installed."""
+
+import asyncio
+from typing import Dict
+
+from utils import json_codec
+
+try:
+    from loguru import logger
+except ImportError:  # pragma: no cover
+    import logging
+    logger = logging.getLogger(__name__)
+
+
+def setup_runtime(enabled: bool) -> Dict[str, str]:
+    """Install the faster event loop and JSON codec if `enabled`; call before the loop starts.
+
+    Missing packages fall back to asyncio and the json module with a
+    warning. Returns the implementations in use, e.g. {"loop": "uvloop", "json": "orjson"}.
+    """
+    loop = "asyncio"
+    if enabled:
+        try:
+            import uvloop
+        except ImportError:
+            logger.warning("PERFORMANCE_RUNTIME is on but uvloop is not installed; using the asyncio event loop")
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            loop = "uvloop"
+    fast_json = json_codec.use_orjson(enabled)
+    if enabled and not fast_json:
+        logger.warning("PERFORMANCE_RUNTIME is on but orjson is not installed; using the json module")
+    return {"loop": loop, "json": json_codec.backend()}
@@ -1,5 +1,25 @@
 """Telegram message formatting utilities."""
+from bisect import bisect_left
+from typing import List, Optional, Tuple
 import html
+import re
+
+# Plain-text form of format_transcription_header as seen in message.text
+_TRANSCRIPTION_HEADER_RE = re.compile(r'^📝 Транскрипция\nУверенность: [^\n]*\n*')
+
+# Telegram counts message length in UTF-16 code units; characters outside
+# the BMP (most emoji) take two units.
+ASTRAL_RE = re.compile('[\U00010000-\U0010FFFF]')
+
+_TAG_RE = re.compile(r'<(/?)([a-zA-Z][\w-]*)[^>]*>')
+_ENTITY_TAIL_RE = re.compile(r'&#?\w*$')
+_ENTITY_RE = re.compile(r'&#?\w+;')
+_SENTENCE_END_RE = re.compile(r'[.!?…][»"\')\]]*\s')
+
+
+def utf16_len(text: str) -> int:
+    """Length of text as Telegram counts it (UTF-16 code units)."""
+    return len(text) + len(ASTRAL_RE.findall(text))
 
 
 def escape_html(text: str) -> str:
@@ -12,6 +32,11 @@ def format_transcription_header(confidence: float) -> str:
     return f"📝 <b>Транскрипция</b>\n<i>Уверенность: {confidence:.1%}</i>\n\n"
 
 
+def strip_transcription_header(text: str) -> str:
+    """Remove the transcription header from a message that starts with it."""
+    return _TRANSCRIPTION_HEADER_RE.sub('', text, count=1)
+
+
 def format_style_result(style: str, text: str) -> str:
     """Format styled text result without headers for clean copy-paste."""
     # Return just the processed text without any headers
@@ -25,3 +50,154 @@ def format_error_message(error: str) -> str:
     """Format error message."""
     escaped_error = escape_html(error)
     return f"❌ <b>Ошибка</b>\n<code>{escaped_error}</code>"
+
+
+class _Utf16Index:
+    """Constant-memory helper for UTF-16 lengths of slices of one string."""
+
+    def __init__(self, text: str):
+        self.astral = [m.start() for m in ASTRAL_RE.finditer(text)]
+
+    def units(self, start: int, end: int) -> int:
+        if not self.astral:
+            return end - start
+        return end - start + bisect_left(self.astral, end) - bisect_left(self.astral, start)
+
+    def end_for(self, start: int, limit: int, text_len: int) -> int:
+        """Largest end such that text[start:end] fits in limit units."""
+        end = min(start + limit, text_len)
+        while end > start:
+            over = self.units(start, end) - limit
+            if over <= 0:
+                break
+            end -= over
+        return end
+
+
+def _safe_cut(text: str, start: int, cut: int) -> int:
+    """Move a cut point back so it does not land inside a tag or entity."""
+    tag_open = text.rfind('<', start, cut)
+    if tag_open != -1 and text.rfind('>', tag_open, cut) == -1:
+        cut = tag_open
+    amp = text.rfind('&', start, cut)
+    if amp != -1 and _ENTITY_TAIL_RE.match(text, amp, cut):
+        cut = amp
+    return cut
+
+
+def _find_break(text: str, start: int, end: int) -> int:
+    """Pick the best break in text[start:end], preferring structural boundaries."""
+    half = start + (end - start) // 2
+
+    paragraph = text.rfind('\n\n', half, end)
+    if paragraph != -1:
+        return paragraph
+
+    sentence = -1
+    for match in _SENTENCE_END_RE.finditer(text, half, end):
+        sentence = match.end() - 1
+    if sentence != -1:
+        return sentence
+
+    for separator in ('\n', ' '):
+        index = text.rfind(separator, start + 1, end)
+        if index != -1:
+            return index
+
+    return end
+
+
+def _update_tag_stack(text: str, start: int, end: int, stack: List[Tuple[str, str]]) -> None:
+    for match in _TAG_RE.finditer(text, start, end):
+        closing, name = match.group(1), match.group(2).lower()
+        if not closing:
+            stack.append((name, match.group(0)))
+            continue
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i][0] == name:
+                del stack[i:]
+                break
+
+
+def split_long_message(text: str, limit: int = 4000, first_limit: Optional[int] = None) -> List[str]:
+    """Split long message into parts that fit Telegram message limit.
+
+    Limits are measured in UTF-16 code units. Breaks prefer paragraph, then
+    sentence, then line and word boundaries. The text may contain Telegram
+    HTML: cuts never land inside a tag or entity, and tags still open at a
+    cut are closed at the end of the part and reopened in the next one. A
+    part whose reopened and closing tags leave no room for text is sent
+    without markup, so no part exceeds its limit unless the limit is shorter
+    than a single entity, which is never broken.
+    ``first_limit`` reserves room in the first part (e.g. for a header).
+    """
+    first_limit = limit if first_limit is None else first_limit
+    if utf16_len(text) <= first_limit:
+        return [text]
+
+    index = _Utf16Index(text)
+    text_len = len(text)
+    has_markup = '<' in text or '&' in text
+    parts = []
+    stack: List[Tuple[str, str]] = []
+    start = 0
+
+    while start < text_len:
+        part_limit = first_limit if not parts else limit
+        prefix = ''.join(tag for _, tag in stack)
+        budget = part_limit - utf16_len(prefix)
+        # Set when the reopened and closing tags leave no room for text
+        flatten = budget <= 0
+
+        while True:
+            if flatten:
+                prefix = ''
+                budget = part_limit
+            end = index.end_for(start, budget, text_len)
+            if end >= text_len:
+                cut = text_len
+            else:
+                cut = _find_break(text, start, end)
+                if has_markup:
+                    cut = _safe_cut(text, start, cut)
+                if cut <= start:
+                    # A single tag longer than the budget; it is dropped by flattening
+                    tag_end = text.find('>', start) if text.startswith('<', start) else -1
+                    cut = tag_end + 1 if tag_end != -1 else max(end, start + 1)
+                    flatten = flatten or tag_end != -1
+                    if tag_end == -1 and has_markup and _safe_cut(text, start, cut) <= start:
+                        # An entity longer than the budget is sent whole rather than broken
+                        entity = _ENTITY_RE.match(text, start)
+                        if entity:
+                            cut = entity.end()
+
+            new_stack = list(stack)
+            if has_markup:
+                _update_tag_stack(text, start, cut, new_stack)
+            if flatten:
+                break
+            suffix = ''.join(f'</{name}>' for name, _ in reversed(new_stack))
+            overflow = index.units(start, cut) + utf16_len(suffix) - budget
+            if overflow <= 0:
+                break
+            if budget <= overflow:
+                flatten = True
+                continue
+            budget -= overflow
+
+        if flatten:
+            # The markup cannot fit in this part: send its text without tags, which
+            # is never longer than the raw slice; later parts reopen the tags again
+            part = _TAG_RE.sub('', text[start:cut]).strip()
+        else:
+            part = (prefix + text[start:cut]).rstrip() + suffix
+        # Parts left with nothing but tags would be sent as empty messages
+        if _TAG_RE.sub('', part).strip():
+            parts.append(part)
+        stack = new_stack
+
+        start = cut
+        while start < text_len and text[start].isspace():
+            start += 1
+
+    return parts